@@ -4,6 +4,12 @@ from .train import train_command
 from .market import market_command
 from .train_classifier import train_classifier_command
 from .forecast import forecast_command
+from .resample import resample_command
+from .benchmark import benchmark_command
+from .compact import compact_command
+from .export_features import export_features_command
+from .daemon import daemon_command
+from .scanner import scanner_command
 
 __all__ = [
     "dataset_command",
@@ -12,4 +18,10 @@ __all__ = [
     "market_command",
     "train_classifier_command",
     "forecast_command",
+    "resample_command",
+    "benchmark_command",
+    "compact_command",
+    "export_features_command",
+    "daemon_command",
+    "scanner_command",
 ]
@@ -3,12 +3,19 @@ import typer
 from service.kline_service import KlineService, KlineNotFoundError
 
 
-def analyze_command(crypto: str = typer.Option(..., "--crypto", "-c", help="Crypto name to analyze (e.g., BTC, ETH)")):
+def analyze_command(
+    crypto: str = typer.Option(..., "--crypto", "-c", help="Crypto name to analyze (e.g., BTC, ETH)"),
+    start: str = typer.Option(None, "--from", help="Only use klines opened at or after this time (ISO date/time in UTC, or epoch ms)"),
+    end: str = typer.Option(None, "--to", help="Only use klines opened at or before this time (ISO date/time in UTC, or epoch ms)"),
+):
     logger = logging.getLogger(__name__)
 
     try:
         kline_service = KlineService()
-        summary = kline_service.get_summary(crypto)
+        summary = kline_service.get_summary(crypto, start, end)
+        if not summary["kline_count"]:
+            logger.warning(f"No {crypto.upper()} klines between {start or 'the start'} and {end or 'the end'}")
+            return
 
         logger.info(f"Analysis for {summary['symbol']}")
         logger.info("=" * 50)
@@ -0,0 +1,59 @@
+import logging
+
+import typer
+
+from service.benchmark_service import BenchmarkService, BenchmarkError
+
+
+def benchmark_command(
+    sizes: str = typer.Option("1000,10000,100000", "--sizes", help="Comma-separated kline counts per symbol (e.g., 1000,100000,10000000)"),
+    symbols: int = typer.Option(1, "--symbols", help="Number of synthetic symbols per size"),
+    repeat: int = typer.Option(3, "--repeat", "-r", help="Runs per case; the median is reported"),
+    cases: str = typer.Option(None, "--cases", help="Comma-separated subset of load,summary,features,cluster,inference,forecast,ingest_json,ingest_typed"),
+    seed: int = typer.Option(42, "--seed", help="Seed for the synthetic kline generator"),
+    output: str = typer.Option("benchmarks/results.json", "--output", "-o", help="Where to write the JSON results"),
+    baseline: str = typer.Option(None, "--baseline", help="Baseline JSON to compare against"),
+    tolerance: float = typer.Option(0.25, "--tolerance", help="Allowed slowdown vs baseline before flagging a regression"),
+    workdir: str = typer.Option("benchmarks/.work", "--workdir", help="Directory for generated datasets (reused between runs)"),
+    precision: bool = typer.Option(False, "--precision", help="Compare float32 with float64 training (peak memory and outcomes) instead of timing cases"),
+):
+    logger = logging.getLogger(__name__)
+    # Per-call INFO logs from the services would dominate small cases.
+    logging.getLogger("service").setLevel(logging.WARNING)
+    logging.getLogger("service.benchmark_service").setLevel(logging.INFO)
+
+    try:
+        service = BenchmarkService(workdir=workdir, seed=seed)
+        size_list = [int(size) for size in sizes.split(",") if size.strip()]
+        if precision:
+            report = service.compare_precision(size_list)
+            logger.info("Results written to %s", service.save(report, output))
+            if not all(item["within_tolerance"] for item in report["precision"]):
+                raise typer.Exit(code=1)
+            return
+
+        case_list = [case.strip() for case in cases.split(",")] if cases else None
+        report = service.run(size_list, symbols=symbols, repeat=repeat, cases=case_list)
+        path = service.save(report, output)
+        logger.info("Results written to %s", path)
+
+        if baseline:
+            comparison = service.compare(report, baseline, tolerance)
+            regressions = [item for item in comparison if item["regression"]]
+            for item in comparison:
+                logger.info(
+                    "%-12s size=%-10s %8.4fs -> %8.4fs (x%.2f)%s",
+                    item["case"],
+                    f"{item['size']:,}",
+                    item["baseline"],
+                    item["current"],
+                    item["ratio"],
+                    "  REGRESSION" if item["regression"] else "",
+                )
+            if regressions:
+                logger.error("%d case(s) slower than baseline by more than %.0f%%", len(regressions), tolerance * 100)
+                raise typer.Exit(code=1)
+
+    except (BenchmarkError, ValueError, FileNotFoundError) as exc:
+        logger.error(f"Benchmark failed: {exc}")
+        raise typer.Exit(code=1)
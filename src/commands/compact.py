@@ -0,0 +1,39 @@
+import logging
+from typing import List
+
+import typer
+
+from service.kline_service import KlineNotFoundError, KlineService
+from service.kline_store import CHUNK_ROWS, KlineStoreError
+
+
+def compact_command(
+    cryptos: List[str] = typer.Option(None, "--crypto", "-c", help="Crypto to convert; repeat for several (default: every stored dataset)"),
+    chunk_rows: int = typer.Option(CHUNK_ROWS, "--chunk-rows", help="Klines per compressed chunk (smaller chunks make range reads cheaper)"),
+    expand: bool = typer.Option(False, "--expand", help="Convert compacted datasets back to JSON instead"),
+):
+    logger = logging.getLogger(__name__)
+    kline_service = KlineService()
+
+    try:
+        names = [crypto.lower() for crypto in cryptos] if cryptos else [crypto.lower() for crypto in kline_service.list_available_cryptos()]
+        for crypto in names:
+            if expand:
+                if not kline_service.is_chunked(crypto):
+                    logger.info(f"{crypto.upper()} is already stored as JSON")
+                    continue
+                result = kline_service.expand(crypto)
+                logger.info(f"Expanded {crypto.upper()}: {result['klines']} klines, {result['json_bytes']:,} bytes -> {result['path']}")
+                continue
+
+            if kline_service.is_chunked(crypto):
+                logger.info(f"{crypto.upper()} is already compacted")
+                continue
+            result = kline_service.compact(crypto, chunk_rows)
+            ratio = result["json_bytes"] / result["chunked_bytes"] if result["chunked_bytes"] else 0.0
+            logger.info(f"Compacted {crypto.upper()}: {result['klines']} klines, {result['json_bytes']:,} -> {result['chunked_bytes']:,} bytes ({ratio:.1f}x) -> {result['path']}")
+
+    except (KlineNotFoundError, KlineStoreError) as exc:
+        logger.error(f"Compaction failed: {exc}")
+    except Exception as exc:
+        logger.error(f"Unexpected error: {exc}")
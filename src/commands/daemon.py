@@ -0,0 +1,29 @@
+import logging
+from typing import List
+
+import typer
+
+from service.kline_service import KlineNotFoundError, KlineService
+from service.scheduler_service import DEFAULT_FETCH_WORKERS, DEFAULT_SETTLE_SECONDS, SchedulerError, SchedulerService
+
+
+def daemon_command(
+    cryptos: List[str] = typer.Option(None, "--crypto", "-c", help="Crypto to keep up to date; repeat for several (default: every fetched dataset)"),
+    settle: float = typer.Option(DEFAULT_SETTLE_SECONDS, "--settle", help="Seconds to wait after each candle close before fetching it"),
+    fetch_workers: int = typer.Option(DEFAULT_FETCH_WORKERS, "--fetch-workers", help="Concurrent requests per fetch burst"),
+    workers: int = typer.Option(None, "--workers", "-w", help="Processes for features and forecasts (default: CPU count; 1 runs in-process)"),
+    no_forecast: bool = typer.Option(False, "--no-forecast", help="Only fetch and update the online market state"),
+    uncalibrated: bool = typer.Option(False, "--uncalibrated", help="Forecast with the raw forest probabilities"),
+    once: bool = typer.Option(False, "--once", help="Catch up once and exit instead of running on the candle schedule"),
+):
+    logger = logging.getLogger(__name__)
+
+    try:
+        names = list(cryptos) if cryptos else KlineService().list_available_cryptos()
+        scheduler = SchedulerService(names, settle, fetch_workers, workers, forecast=not no_forecast, calibrated=not uncalibrated)
+        scheduler.run(max_ticks=0 if once else None)
+
+    except (KlineNotFoundError, SchedulerError) as exc:
+        logger.error(f"Daemon failed: {exc}")
+    except Exception as exc:
+        logger.error(f"Unexpected error: {exc}")
@@ -1,6 +1,8 @@
 import logging
 import typer
 from service.binance_service import BinanceService
+from service.gap_service import GapService
+from service.intervals import INTERVAL_MS
 
 
 def dataset_command(
@@ -13,12 +15,31 @@ def dataset_command(
     ),
     limit: int = typer.Option(100, "--limit", "-l", help="Number of klines to retrieve (max 1000)"),
     days_ago: int = typer.Option(None, "--days", "-d", help="Number of days ago to start fetching data from"),
+    repair: bool = typer.Option(False, "--repair", help="Only fetch the windows missing from the stored series and merge them in"),
 ):
     logger = logging.getLogger(__name__)
 
     try:
         binance_service = BinanceService()
+        gap_service = GapService()
+        crypto_name = binance_service.crypto_name(symbol)
+
+        if repair:
+            if interval not in INTERVAL_MS:
+                logger.error(f"Cannot repair {interval} klines: gaps are only detected for fixed-length intervals")
+                return
+            report = gap_service.repair(crypto_name, interval)
+            logger.info(f"Repaired {report['symbol']} ({interval}): {report['gaps']} gaps, {report['filled']} klines filled")
+            logger.info(f"Remaining gaps: {report['remaining']} (known exchange outages: {report['known_gaps']})")
+            return
+
         result = binance_service.get_klines(symbol, interval, limit, days_ago)
+        if interval in INTERVAL_MS:
+            index = gap_service.index_klines(crypto_name, result)
+            if index["gaps"]:
+                logger.warning(f"Stored series has {len(index['gaps'])} gaps ({index['missing']} klines); run with --repair to fill them")
+        else:
+            logger.info(f"Skipping gap indexing: {interval} candles have no fixed length")
 
         time_info = f" starting from {days_ago} days ago" if days_ago else ""
         klines_count = len(result["klines"])
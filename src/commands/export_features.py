@@ -0,0 +1,37 @@
+import logging
+from typing import List
+
+import typer
+
+from service.feature_export_service import FeatureExportError, FeatureExportService
+from service.kline_service import KlineNotFoundError, KlineService
+from service.market_state_service import MarketModelNotFoundError
+
+
+def export_features_command(
+    cryptos: List[str] = typer.Option(None, "--crypto", "-c", help="Crypto to export; repeat for several (default: every dataset with a trained model)"),
+    output: str = typer.Option("data/features", "--output", "-o", help="Directory for the shards and manifest.json"),
+    shard_rows: int = typer.Option(100_000, "--shard-rows", help="Candles per shard; bounds the memory used while exporting"),
+    restart: bool = typer.Option(False, "--restart", help="Discard previous shards instead of resuming"),
+    uncompressed: bool = typer.Option(False, "--uncompressed", help="Write plain .npz shards (faster to write, larger on disk)"),
+):
+    logger = logging.getLogger(__name__)
+    export_service = FeatureExportService()
+
+    names = [crypto.lower() for crypto in cryptos] if cryptos else [crypto.lower() for crypto in KlineService().list_available_cryptos()]
+    try:
+        for crypto in names:
+            try:
+                result = export_service.export([crypto], output, shard_rows, restart=restart, compress=not uncompressed)
+            except MarketModelNotFoundError as exc:
+                if cryptos:
+                    raise
+                logger.warning(f"Skipping {crypto.upper()}: {exc}")
+                continue
+            for item in result["symbols"]:
+                logger.info(f"Exported {item['symbol']}: {item['rows']:,} rows in {item['shards']} shards ({item['written']} written, {item['skipped']} resumed) -> {result['manifest']}")
+
+    except (KlineNotFoundError, MarketModelNotFoundError, FeatureExportError) as exc:
+        logger.error(f"Feature export failed: {exc}")
+    except Exception as exc:
+        logger.error(f"Unexpected error: {exc}")
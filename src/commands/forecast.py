@@ -1,5 +1,8 @@
 import json
 import logging
+import time
+
+import numpy as np
 import typer
 
 from service.market_classifier_service import (
@@ -11,21 +14,41 @@ from service.market_state_service import MarketModelNotFoundError, ModelTraining
 from service.kline_service import KlineNotFoundError
 
 
-def forecast_command(crypto: str = typer.Option(..., "--crypto", "-c", help="Crypto symbol to forecast (e.g., BTC)")):
+def forecast_command(
+    crypto: str = typer.Option(..., "--crypto", "-c", help="Crypto symbol to forecast (e.g., BTC)"),
+    uncalibrated: bool = typer.Option(False, "--uncalibrated", help="Use the raw forest probabilities even if the model is calibrated"),
+    scenarios: int = typer.Option(0, "--scenarios", help="Also score this many randomly perturbed copies of the latest features"),
+    shock: float = typer.Option(0.01, "--shock", help="Std-dev of the relative feature perturbation per scenario"),
+    seed: int = typer.Option(42, "--seed", help="Random seed for the scenarios"),
+):
     logger = logging.getLogger(__name__)
 
     try:
         service = MarketClassifierService()
-        result = service.forecast_next_state(crypto)
+        context = service.latest_features(crypto)
+        result = service.forecast_next_state(crypto, calibrated=not uncalibrated, context=context)
 
         logger.info("Forecast for %s (%s)", result["symbol"], result["interval"])
         logger.info("=" * 50)
         logger.info("Prediction timestamp: %s", result["prediction_timestamp"])
         logger.info("Predicted next state: %s", result["predicted_state"])
         if result["state_probabilities"]:
-            logger.info("Probabilities:\n%s", json.dumps(result["state_probabilities"], indent=2))
+            label = "Calibrated probabilities" if result["calibrated"] else "Probabilities"
+            logger.info("%s:\n%s", label, json.dumps(result["state_probabilities"], indent=2))
         logger.info("Model: %s", result["model_path"])
 
+        if scenarios > 0:
+            shocks = np.random.default_rng(seed).normal(0.0, shock, size=(scenarios, len(result["latest_features"])))
+            started = time.perf_counter()
+            batch = service.scenario_forecast(crypto, shocks, calibrated=not uncalibrated, context=context)
+            elapsed = time.perf_counter() - started
+
+            logger.info("Scenario analysis: %d perturbations (relative std %.4f) in %.3fs", scenarios, shock, elapsed)
+            for position, label in enumerate(batch["classes"]):
+                share = float(np.mean(batch["predicted"] == label))
+                mean_proba = float(batch["probabilities"][:, position].mean())
+                logger.info("  %s: predicted in %.1f%% of scenarios, mean probability %.4f", label, share * 100, mean_proba)
+
     except (
         ClassifierModelNotFoundError,
         ClassifierTrainingError,
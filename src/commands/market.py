@@ -1,5 +1,7 @@
 import json
 import logging
+from typing import Any, Dict
+
 import typer
 
 from service.kline_service import KlineNotFoundError
@@ -11,12 +13,18 @@ def market_command(
     show_history: bool = typer.Option(
         False, "--show-history", help="Print cluster distribution in JSON for deeper analysis"
     ),
+    start: str = typer.Option(None, "--from", help="Only use klines opened at or after this time (ISO date/time in UTC, or epoch ms)"),
+    end: str = typer.Option(None, "--to", help="Only use klines opened at or before this time (ISO date/time in UTC, or epoch ms)"),
+    online: bool = typer.Option(False, "--online", help="Assign only candles added since the last run and report model drift"),
 ):
     logger = logging.getLogger(__name__)
 
     try:
         service = MarketStateService()
-        summary = service.predict_market_state(crypto)
+        if online:
+            _log_online_state(logger, service.update_online_state(crypto))
+            return
+        summary = service.predict_market_state(crypto, start, end)
 
         logger.info("Market state for %s (%s)", summary["symbol"], summary["interval"])
         logger.info("=" * 50)
@@ -40,3 +48,27 @@ def market_command(
         logger.error(f"Market analysis failed: {exc}")
     except Exception as exc:
         logger.error(f"Unexpected error: {exc}")
+
+
+def _log_online_state(logger: logging.Logger, result: Dict[str, Any]) -> None:
+    logger.info("Online market state for %s (%s): %d new candles", result["symbol"], result["interval"], result["new_candles"])
+    logger.info("=" * 50)
+    latest = result["latest_state"]
+    if latest:
+        logger.info("Latest timestamp: %s", latest["timestamp"])
+        logger.info("Closing price: $%s", f"{latest['close']:,.2f}")
+        logger.info("Cluster %d → %s", latest["cluster"], latest["state"])
+
+    logger.info("Assigned since training:")
+    for state, count in result["state_distribution"].items():
+        logger.info("  %s: %d", state, count)
+
+    drift = result["drift"]
+    if drift["distance_ratio"] is not None:
+        logger.info("Distance to centroids vs training: %.2fx", drift["distance_ratio"])
+    if drift["drifted"]:
+        for reason in drift["reasons"]:
+            logger.warning("Drift: %s", reason)
+        logger.warning("Model looks stale; retrain with: train -c <CRYPTO> --if-drift")
+    else:
+        logger.info("No drift detected (%s)", "; ".join(drift["reasons"]) or f"{drift['samples']} candles tracked")
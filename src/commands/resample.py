@@ -0,0 +1,34 @@
+import logging
+from typing import List
+
+import typer
+
+from service.kline_service import KlineNotFoundError
+from service.resample_service import ResampleService, ResampleError
+
+
+def resample_command(
+    crypto: str = typer.Option(..., "--crypto", "-c", help="Crypto name whose stored klines are resampled (e.g., BTC)"),
+    targets: List[str] = typer.Option(..., "--to-interval", "-t", help="Target interval; repeat for several (e.g., -t 1h -t 4h)"),
+    include_partial: bool = typer.Option(False, "--include-partial", help="Keep the trailing bucket even if it is not complete yet"),
+):
+    logger = logging.getLogger(__name__)
+
+    try:
+        service = ResampleService()
+        for target in targets:
+            result = service.resample_crypto(crypto, target, include_partial)
+            logger.info(
+                "Built %d %s klines for %s from %d %s klines",
+                len(result["klines"]),
+                target,
+                result["symbol"],
+                result["source"]["klines"],
+                result["source"]["interval"],
+            )
+            logger.info("Saved to: %s (use -c %s_%s with other commands)", result["path"], crypto.lower(), target)
+
+    except (ResampleError, KlineNotFoundError, ValueError) as exc:
+        logger.error(f"Resampling failed: {exc}")
+    except Exception as exc:
+        logger.error(f"Unexpected error: {exc}")
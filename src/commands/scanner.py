@@ -0,0 +1,52 @@
+import logging
+from typing import List
+
+import numpy as np
+import typer
+
+from service.feature_batch_service import FeatureBatchError
+from service.kline_service import KlineNotFoundError
+from service.scanner_service import DEFAULT_WINDOW, ScannerError, ScannerService
+
+
+def scanner_command(
+    cryptos: List[str] = typer.Option(None, "--crypto", "-c", help="Crypto to include; repeat for several (default: every stored dataset)"),
+    interval: str = typer.Option(None, "--interval", "-i", help="Interval to scan (default: the most common one among the datasets)"),
+    window: int = typer.Option(DEFAULT_WINDOW, "--window", help="Candles per rolling correlation window"),
+    step: int = typer.Option(None, "--step", help="Candles between stored correlation snapshots (default: the window)"),
+    workers: int = typer.Option(None, "--workers", "-w", help="Processes for per-symbol states (default: CPU count; 1 runs in-process)"),
+    top: int = typer.Option(5, "--top", help="Most and least correlated pairs to show"),
+    rebuild: bool = typer.Option(False, "--rebuild", help="Discard the stored scan and start over"),
+):
+    logger = logging.getLogger(__name__)
+
+    try:
+        result = ScannerService().scan(cryptos, interval, window, step, workers, rebuild, top)
+        latest = result["latest"]
+        history = result["mean_correlation_history"]["value"]
+
+        logger.info("Market scan: %d symbols (%s), %d-candle correlation window", len(result["symbols"]), result["interval"], result["window"])
+        logger.info("=" * 50)
+        logger.info("Latest candle: %s (%s new, %s in the scan)", latest["open_time"], f"{result['added']:,}", f"{result['rows']:,}")
+        if latest["covered"]:
+            logger.info("Breadth: Bullish %.1f%% | Bearish %.1f%% of %d symbols with a model", latest["bullish_share"] * 100, latest["bearish_share"] * 100, latest["covered"])
+        else:
+            logger.info("Breadth: no symbol has a trained model; run train first")
+        if np.isfinite(latest["mean_correlation"]):
+            logger.info("Mean pairwise correlation: %.3f", latest["mean_correlation"])
+        else:
+            logger.info("Mean pairwise correlation: n/a (no two symbols overlap enough in the latest window)")
+        if np.isfinite(history).any():
+            recent = history[np.isfinite(history)]
+            logger.info("  over %d snapshots: min %.3f, median %.3f, max %.3f", len(recent), recent.min(), np.median(recent), recent.max())
+        for title, key in (("Most correlated", "most"), ("Least correlated", "least")):
+            if result["pairs"][key]:
+                logger.info("%s pairs:", title)
+                for item in result["pairs"][key]:
+                    logger.info("  %s / %s: %.3f", item["pair"][0], item["pair"][1], item["correlation"])
+        logger.info("Scan: %s", result["scan_path"])
+
+    except (KlineNotFoundError, FeatureBatchError, ScannerError) as exc:
+        logger.error(f"Scan failed: {exc}")
+    except Exception as exc:
+        logger.error(f"Unexpected error: {exc}")
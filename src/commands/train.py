@@ -1,8 +1,11 @@
+import json
 import logging
 import typer
 
+from service.feature_pipeline import DEFAULT_FEATURE_SPECS, FeatureSpecError, htf_rsi_spec
 from service.kline_service import KlineNotFoundError
 from service.market_state_service import MarketStateService, ModelTrainingError
+from service.resample_service import ResampleError
 
 
 def train_command(
@@ -10,12 +13,32 @@ def train_command(
     clusters: int = typer.Option(None, "--clusters", "-k", help="Number of clusters (auto-select if omitted)"),
     min_clusters: int = typer.Option(2, "--min-clusters", help="Minimum clusters when auto-selecting"),
     max_clusters: int = typer.Option(6, "--max-clusters", help="Maximum clusters when auto-selecting"),
+    htf: str = typer.Option(None, "--htf", help="Add RSI from a higher interval (e.g., 1h) resampled from the stored klines"),
+    features: str = typer.Option(None, "--features", help="JSON file with a list of indicator specs (defaults to the built-in set)"),
+    start: str = typer.Option(None, "--from", help="Only use klines opened at or after this time (ISO date/time in UTC, or epoch ms)"),
+    end: str = typer.Option(None, "--to", help="Only use klines opened at or before this time (ISO date/time in UTC, or epoch ms)"),
+    if_drift: bool = typer.Option(False, "--if-drift", help="Retrain only if the online statistics show drift (or no model exists)"),
+    float32: bool = typer.Option(False, "--float32", help="Build the training matrix in float32 to halve its memory"),
 ):
     logger = logging.getLogger(__name__)
 
     try:
+        feature_specs = None
+        if features:
+            with open(features, "r", encoding="utf-8") as f:
+                feature_specs = json.load(f)
+        if htf:
+            feature_specs = list(DEFAULT_FEATURE_SPECS if feature_specs is None else feature_specs) + [htf_rsi_spec(htf)]
+
         service = MarketStateService()
-        result = service.train_model(crypto, clusters, min_clusters, max_clusters)
+        if if_drift:
+            check = service.check_drift(crypto)
+            if not check["retrain"]:
+                logger.info("No drift detected for %s; keeping the current model (%s)", crypto.upper(), "; ".join(check["reasons"]) or "all checks passed")
+                return
+            logger.info("Retraining %s: %s", crypto.upper(), "; ".join(check["reasons"]))
+
+        result = service.train_model(crypto, clusters, min_clusters, max_clusters, feature_specs, start, end, dtype="float32" if float32 else "float64")
 
         logger.info(
             "Trained KMeans model for %s (%s) using %d clusters on %d samples",
@@ -24,13 +47,15 @@ def train_command(
             result["n_clusters"],
             result["samples"],
         )
+        logger.info("Training window: %s -> %s", result["training_range"]["start"], result["training_range"]["end"])
         logger.info("Model saved to: %s", result["model_path"])
+        logger.info("Features (spec %s): %s", result["feature_spec_hash"], ", ".join(result["feature_columns"]))
         for cluster_id, label in result["cluster_labels"].items():
             ret = result["cluster_returns"].get(cluster_id)
             ret_value = float(ret) if ret is not None else float("nan")
             logger.info("  Cluster %d → %s (mean future return: %.4f)", cluster_id, label, ret_value)
 
-    except (ModelTrainingError, KlineNotFoundError, ValueError) as exc:
+    except (ModelTrainingError, FeatureSpecError, ResampleError, KlineNotFoundError, ValueError) as exc:
         logger.error(f"Training failed: {exc}")
     except Exception as exc:
         logger.error(f"Unexpected error: {exc}")
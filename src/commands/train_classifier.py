@@ -14,29 +14,60 @@ def train_classifier_command(
     test_size: float = typer.Option(0.2, "--test-size", help="Test size ratio for evaluation"),
     estimators: int = typer.Option(200, "--estimators", "-n", help="Number of trees in the RandomForest"),
     max_depth: int = typer.Option(None, "--max-depth", help="Max depth for each tree"),
+    warm_start: bool = typer.Option(False, "--warm-start", help="Add trees fitted on candles labeled since the last run and retire the oldest"),
+    new_trees: int = typer.Option(50, "--new-trees", help="Trees added per warm-start update"),
+    calibration: str = typer.Option("none", "--calibration", help="Probability calibration fitted on a held-out split: none, sigmoid or isotonic"),
+    float32: bool = typer.Option(False, "--float32", help="Build the training matrix in float32 to halve its memory"),
 ):
     logger = logging.getLogger(__name__)
 
     try:
         service = MarketClassifierService()
-        result = service.train_classifier(
-            crypto_name=crypto,
-            test_size=test_size,
-            n_estimators=estimators,
-            max_depth=max_depth,
-        )
+        if warm_start:
+            result = service.warm_start_classifier(
+                crypto_name=crypto,
+                test_size=test_size,
+                new_trees=new_trees,
+                max_trees=estimators,
+                max_depth=max_depth,
+            )
+        else:
+            result = service.train_classifier(
+                crypto_name=crypto,
+                test_size=test_size,
+                n_estimators=estimators,
+                max_depth=max_depth,
+                calibration=calibration,
+                dtype="float32" if float32 else "float64",
+            )
+
+        if result["mode"] == "skipped":
+            logger.info("Only %d new labeled candles for %s; classifier left unchanged", result["samples"], result["symbol"])
+            return
 
         logger.info(
-            "Trained classifier for %s (%s) on %d samples",
+            "Trained classifier for %s (%s) on %d samples (%s, %d trees)",
             result["symbol"],
             result["interval"],
             result["samples"],
+            result["mode"].replace("_", "-"),
+            result["trees"],
         )
         logger.info("Model saved to: %s", result["model_path"])
         logger.info("Train accuracy: %.4f", result["train_accuracy"])
-        logger.info("Test accuracy: %.4f", result["test_accuracy"])
+        logger.info("Test accuracy%s: %.4f", " (previous forest on the new candles)" if result["mode"] == "warm_start" else "", result["test_accuracy"])
         logger.info("Classification report:\n%s", result["classification_report"])
         logger.info("Confusion matrix: %s", result["confusion_matrix"])
+        calibration_report = result.get("calibration") or {}
+        if "log_loss_calibrated" in calibration_report:
+            logger.info(
+                "Calibration (%s) on the test split: log loss %.4f -> %.4f, Brier %.4f -> %.4f",
+                calibration_report["method"],
+                calibration_report["log_loss_raw"],
+                calibration_report["log_loss_calibrated"],
+                calibration_report["brier_raw"],
+                calibration_report["brier_calibrated"],
+            )
 
     except (
         ClassifierTrainingError,
@@ -0,0 +1,15 @@
+from functools import wraps
+
+from service.profiler_service import ProfilerService
+
+
+def timed(stage_name: str):
+    def decorate(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with ProfilerService().stage(stage_name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorate
@@ -2,6 +2,9 @@ import logging
 import sys
 import os
 import typer
+from service.http_cache import CACHE_MODES
+from service.profiler_service import ProfilerService
+from service.restful_service import RestfulService
 from commands import (
     dataset_command,
     analyze_command,
@@ -9,18 +12,47 @@ from commands import (
     market_command,
     train_classifier_command,
     forecast_command,
+    resample_command,
+    benchmark_command,
+    compact_command,
+    export_features_command,
+    daemon_command,
+    scanner_command,
 )
 
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 app = typer.Typer()
 
+
+@app.callback()
+def main(
+    ctx: typer.Context,
+    profile: bool = typer.Option(False, "--profile", help="Print a per-stage timing and memory breakdown after the command"),
+    profile_output: str = typer.Option(None, "--profile-output", help="Also dump cProfile stats (pstats format) to this file"),
+    http_cache: str = typer.Option("on", "--http-cache", help="Binance response cache: on, off, or replay (serve only recorded responses)"),
+    http_cache_size: int = typer.Option(256, "--http-cache-size", help="Evict least recently used responses beyond this many MB"),
+):
+    if http_cache not in CACHE_MODES:
+        raise typer.BadParameter(f"choose from {', '.join(CACHE_MODES)}", param_hint="--http-cache")
+    RestfulService().configure_cache(http_cache, http_cache_size * 1024 * 1024)
+    if profile or profile_output:
+        profiler = ProfilerService().enable(cprofile=profile_output is not None)
+        ctx.call_on_close(lambda: profiler.finish(profile_output))
+
+
 app.command(name="dataset")(dataset_command)
 app.command(name="analyze")(analyze_command)
 app.command(name="train")(train_command)
 app.command(name="market")(market_command)
 app.command(name="train-classifier")(train_classifier_command)
 app.command(name="forecast")(forecast_command)
+app.command(name="resample")(resample_command)
+app.command(name="benchmark")(benchmark_command)
+app.command(name="compact")(compact_command)
+app.command(name="export-features")(export_features_command)
+app.command(name="daemon")(daemon_command)
+app.command(name="scanner")(scanner_command)
 
 if __name__ == "__main__":
     logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
@@ -0,0 +1,276 @@
+import json
+import logging
+import os
+import platform
+import statistics
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import sklearn
+from joblib import load
+from sklearn.metrics import adjusted_rand_score
+
+from service.binance_service import BinanceService
+from service.kline_decoder import decode_kline_array
+from service.kline_service import KlineService
+from service.market_classifier_service import MarketClassifierService
+from service.market_state_service import MarketStateService
+from service.profiler_service import peak_rss_mb
+from service.synthetic_service import SyntheticKlineGenerator
+
+BENCHMARK_CASES = ["load", "summary", "features", "cluster", "inference", "forecast", "ingest_json", "ingest_typed"]
+# float32 training matches float64 when state assignments and classifier results agree at least this closely.
+PRECISION_MIN_STATE_AGREEMENT = 0.99
+PRECISION_MAX_ACCURACY_DELTA = 0.01
+
+
+class BenchmarkError(Exception):
+    """Raised when a benchmark run is misconfigured."""
+
+
+@contextmanager
+def _working_directory(path: Path) -> Iterator[None]:
+    previous = Path.cwd()
+    path.mkdir(parents=True, exist_ok=True)
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(previous)
+
+
+def _peak_allocation(func: Callable[[], Any]) -> Tuple[float, Any]:
+    """Run ``func`` and return the peak traced allocation (MB, NumPy buffers included) with its result."""
+    tracemalloc.start()
+    try:
+        result = func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak / 1024**2, result
+
+
+class BenchmarkService:
+    """Time the storage → summary → features → clustering → inference → forecast path on synthetic klines."""
+
+    def __init__(self, workdir: str = "benchmarks/.work", seed: int = 42, interval: str = "1m"):
+        self.workdir = Path(workdir).resolve()
+        self.seed = seed
+        self.interval = interval
+        self.logger = logging.getLogger(__name__)
+
+    @staticmethod
+    def symbol_names(symbols: int) -> List[str]:
+        return [f"SYN{index:03d}USDT" for index in range(symbols)]
+
+    def _prepare(self, size: int, symbols: int) -> Path:
+        """Generate (or reuse) one dataset per symbol; files are deterministic so they are cached by size."""
+        size_dir = self.workdir / f"{self.interval}_{size}_seed{self.seed}"
+        generator = SyntheticKlineGenerator(seed=self.seed, interval=self.interval)
+        for symbol in self.symbol_names(symbols):
+            path = size_dir / "data" / "kline" / f"{symbol[:-4].lower()}.json"
+            if not path.exists():
+                self.logger.info(f"Generating {size:,} synthetic klines for {symbol}")
+                generator.write_dataset(path, symbol, size)
+        (size_dir / "models").mkdir(parents=True, exist_ok=True)
+        return size_dir
+
+    def _cases(self) -> Dict[str, Callable[[str], Any]]:
+        kline_service = KlineService()
+        state_service = MarketStateService()
+        classifier_service = MarketClassifierService()
+        binance_service = BinanceService()
+        responses: Dict[Path, bytes] = {}
+
+        def response_body(crypto: str) -> bytes:
+            # Same bytes Binance would send for this series; built by the warm-up call, outside the timed runs.
+            key = Path.cwd() / crypto
+            if key not in responses:
+                responses[key] = json.dumps(kline_service.get_klines(crypto), separators=(",", ":")).encode("utf-8")
+            return responses[key]
+
+        return {
+            "ingest_json": lambda crypto: binance_service.parse_kline_data(json.loads(response_body(crypto))),
+            "ingest_typed": lambda crypto: decode_kline_array(response_body(crypto)),
+            "load": kline_service.get_kline_data,
+            "summary": kline_service.get_summary,
+            "features": state_service.prepare_feature_dataset,
+            "cluster": lambda crypto: state_service.train_model(crypto, n_clusters=3),
+            "inference": state_service.predict_market_state,
+            "forecast": classifier_service.forecast_next_state,
+        }
+
+    def run(self, sizes: List[int], symbols: int = 1, repeat: int = 3, cases: Optional[List[str]] = None) -> Dict[str, Any]:
+        cases = cases or BENCHMARK_CASES
+        unknown = [case for case in cases if case not in BENCHMARK_CASES]
+        if unknown:
+            raise BenchmarkError(f"Unknown benchmark cases: {', '.join(unknown)}; available: {', '.join(BENCHMARK_CASES)}")
+
+        results: List[Dict[str, Any]] = []
+        case_functions = self._cases()
+        kline_service = KlineService()
+        state_service = MarketStateService()
+        classifier_service = MarketClassifierService()
+        cryptos = [symbol[:-4].lower() for symbol in self.symbol_names(symbols)]
+
+        for size in sizes:
+            size_dir = self._prepare(size, symbols)
+            with _working_directory(size_dir):
+                if "forecast" in cases or ("inference" in cases and "cluster" not in cases):
+                    for crypto in cryptos:
+                        case_functions["cluster"](crypto)
+                if "forecast" in cases:
+                    # The classifier is trained once, outside the timed runs.
+                    for crypto in cryptos:
+                        classifier_service.train_classifier(crypto, n_estimators=50)
+                for case in [case for case in cases if case.startswith("ingest_")]:
+                    for crypto in cryptos:
+                        case_functions[case](crypto)
+
+                for case in cases:
+                    runs = []
+                    for _ in range(repeat):
+                        start = time.perf_counter()
+                        for crypto in cryptos:
+                            # Time the cold path a fresh CLI process would take.
+                            kline_service.invalidate(crypto)
+                            state_service.model_cache.invalidate()
+                            classifier_service.model_cache.invalidate()
+                            case_functions[case](crypto)
+                        runs.append(time.perf_counter() - start)
+                    result = {
+                        "case": case,
+                        "size": size,
+                        "symbols": symbols,
+                        "median": statistics.median(runs),
+                        "min": min(runs),
+                        "runs": runs,
+                        "rows_per_second": size * symbols / statistics.median(runs) if statistics.median(runs) else None,
+                        "peak_rss_mb": peak_rss_mb(),
+                    }
+                    results.append(result)
+                    self.logger.info(f"{case:<12} size={size:<10,} symbols={symbols:<4} median={result['median']:.4f}s min={result['min']:.4f}s")
+
+        return {"meta": self.environment(repeat), "results": results}
+
+    def compare_precision(self, sizes: List[int], n_clusters: int = 3, n_estimators: int = 100) -> Dict[str, Any]:
+        """Train the clustering model and classifier in float64 and float32; report peak memory and agreement.
+
+        Both cluster models assign states to the same float64 feature matrix, and both classifiers
+        predict its rows, so the agreement figures compare outcomes rather than training internals.
+        """
+        kline_service = KlineService()
+        state_service = MarketStateService()
+        classifier_service = MarketClassifierService()
+        crypto = self.symbol_names(1)[0][:-4].lower()
+        results: List[Dict[str, Any]] = []
+
+        for size in sizes:
+            size_dir = self._prepare(size, 1)
+            with _working_directory(size_dir):
+                kline_service.invalidate(crypto)
+                kline_service.get_kline_array(crypto)  # keep the dataset load out of the peaks
+                runs: Dict[str, Dict[str, Any]] = {}
+                for dtype in ("float64", "float32"):
+                    cluster_peak, cluster_result = _peak_allocation(lambda: state_service.train_model(crypto, n_clusters=n_clusters, dtype=dtype))
+                    classifier_peak, classifier_result = _peak_allocation(lambda: classifier_service.train_classifier(crypto, n_estimators=n_estimators, dtype=dtype))
+                    runs[dtype] = {
+                        "cluster_peak_mb": cluster_peak,
+                        "classifier_peak_mb": classifier_peak,
+                        "clusters": load(cluster_result["model_path"]),
+                        "classifier": load(classifier_result["model_path"]),
+                        "test_accuracy": classifier_result["test_accuracy"],
+                    }
+
+                X = state_service.prepare_training_matrix(crypto)["X"]
+                states, labels, predicted = {}, {}, {}
+                for dtype, run in runs.items():
+                    payload = run["clusters"]
+                    labels[dtype] = payload["model"].predict(payload["scaler"].transform(X))
+                    states[dtype] = np.array([payload["cluster_labels"].get(int(label), "Unknown") for label in labels[dtype]])
+                    predicted[dtype] = classifier_service.predict_proba_batch(run["classifier"], X, calibrated=False)["predicted"]
+
+            base, reduced = runs["float64"], runs["float32"]
+            result = {
+                "size": size,
+                "samples": len(X),
+                "cluster_peak_mb": {"float64": base["cluster_peak_mb"], "float32": reduced["cluster_peak_mb"]},
+                "classifier_peak_mb": {"float64": base["classifier_peak_mb"], "float32": reduced["classifier_peak_mb"]},
+                "cluster_peak_reduction": 1 - reduced["cluster_peak_mb"] / base["cluster_peak_mb"],
+                "classifier_peak_reduction": 1 - reduced["classifier_peak_mb"] / base["classifier_peak_mb"],
+                "state_agreement": float(np.mean(states["float64"] == states["float32"])),
+                "adjusted_rand_index": float(adjusted_rand_score(labels["float64"], labels["float32"])),
+                "test_accuracy": {"float64": base["test_accuracy"], "float32": reduced["test_accuracy"]},
+                "prediction_agreement": float(np.mean(predicted["float64"] == predicted["float32"])),
+            }
+            result["within_tolerance"] = (
+                result["state_agreement"] >= PRECISION_MIN_STATE_AGREEMENT and abs(base["test_accuracy"] - reduced["test_accuracy"]) <= PRECISION_MAX_ACCURACY_DELTA
+            )
+            results.append(result)
+            self.logger.info(
+                f"size={size:<10,} train peak {result['cluster_peak_mb']['float64']:.1f} -> {result['cluster_peak_mb']['float32']:.1f} MB "
+                f"({result['cluster_peak_reduction']:.0%} less), classifier peak {result['classifier_peak_mb']['float64']:.1f} -> "
+                f"{result['classifier_peak_mb']['float32']:.1f} MB ({result['classifier_peak_reduction']:.0%} less)"
+            )
+            self.logger.info(
+                f"size={size:<10,} state agreement {result['state_agreement']:.2%} (ARI {result['adjusted_rand_index']:.4f}), test accuracy "
+                f"{base['test_accuracy']:.4f} vs {reduced['test_accuracy']:.4f}, prediction agreement {result['prediction_agreement']:.2%}: "
+                f"{'within tolerance' if result['within_tolerance'] else 'OUTSIDE TOLERANCE'}"
+            )
+
+        return {"meta": self.environment(repeat=1), "precision": results}
+
+    def environment(self, repeat: int) -> Dict[str, Any]:
+        return {
+            "created_at": datetime.now().isoformat(),
+            "seed": self.seed,
+            "interval": self.interval,
+            "repeat": repeat,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "machine": platform.machine(),
+            "cpu_count": os.cpu_count(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "scikit_learn": sklearn.__version__,
+        }
+
+    @staticmethod
+    def save(report: Dict[str, Any], path: str) -> Path:
+        output = Path(path)
+        output.parent.mkdir(parents=True, exist_ok=True)
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        return output
+
+    @staticmethod
+    def compare(report: Dict[str, Any], baseline_path: str, tolerance: float = 0.25) -> List[Dict[str, Any]]:
+        """Compare medians with a stored baseline; a case regresses when it is slower by more than ``tolerance``."""
+        with open(baseline_path, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+
+        reference = {(item["case"], item["size"], item["symbols"]): item for item in baseline["results"]}
+        comparison = []
+        for item in report["results"]:
+            base = reference.get((item["case"], item["size"], item["symbols"]))
+            if base is None or not base["median"]:
+                continue
+            ratio = item["median"] / base["median"]
+            comparison.append(
+                {
+                    "case": item["case"],
+                    "size": item["size"],
+                    "symbols": item["symbols"],
+                    "baseline": base["median"],
+                    "current": item["median"],
+                    "ratio": ratio,
+                    "regression": ratio > 1 + tolerance,
+                }
+            )
+        return comparison
@@ -1,11 +1,23 @@
 import logging
-import json
-from typing import List, Dict, Any, Optional
+import time
+from typing import Callable, List, Dict, Any, Optional
 from datetime import datetime, timedelta
-from pathlib import Path
+from requests import Response
 from decorator.singleton import singleton
+from decorator.timed import timed
+from service.http_cache import FOREVER
+from service.intervals import INTERVAL_MS
+from service.kline_array import KlineArray
+from service.kline_decoder import decode_kline_array
+from service.kline_service import KlineService
+from service.profiler_service import ProfilerService
 from service.restful_service import RestfulService
 
+# Responses that may include a still-open candle are only reused briefly.
+RECENT_CACHE_TTL = 5.0
+# A candle is treated as final this long after its close, once Binance has settled it.
+SETTLED_AFTER_MS = 60_000
+
 
 @singleton
 class BinanceService:
@@ -13,6 +25,43 @@ class BinanceService:
         self.base_url = "https://api.binance.com"
         self.restful_service = RestfulService()
         self.logger = logging.getLogger(__name__)
+        self.profiler = ProfilerService()
+
+    @staticmethod
+    def kline_cache_ttl(interval: str, start_time: Optional[int] = None, end_time: Optional[int] = None) -> float:
+        """How long a kline response may be cached; 0 means not at all.
+
+        A window with an explicit ``end_time`` whose candles have all settled is cached forever. The
+        recurring "latest candles" request (no start or end) is reused briefly. Any other window reaches
+        the present and starts at a new time on every call, so caching it would only churn the cache;
+        requests with only a ``startTime`` use ``settled_page_ttl``.
+        """
+        if start_time is None and end_time is None:
+            return RECENT_CACHE_TTL
+        interval_ms = INTERVAL_MS.get(interval)
+        if interval_ms is None or end_time is None:
+            return 0
+        return FOREVER if end_time + interval_ms + SETTLED_AFTER_MS <= time.time() * 1000 else 0
+
+    @staticmethod
+    def settled_page_ttl(interval: str, limit: int) -> Callable[[Response], float]:
+        """TTL for a request with only a ``startTime``, decided from its response.
+
+        Binance returns the first ``limit`` candles from the start, so a full page whose last candle has
+        settled can never change. A shorter page reaches the present (or the symbol's listing moved it)
+        and is not cached.
+        """
+        interval_ms = INTERVAL_MS.get(interval)
+
+        def ttl(response: Response) -> float:
+            if interval_ms is None:
+                return 0
+            klines = decode_kline_array(response.content)
+            if len(klines) < limit:
+                return 0
+            return FOREVER if int(klines.open_time[-1]) + interval_ms + SETTLED_AFTER_MS <= time.time() * 1000 else 0
+
+        return ttl
 
     def get_klines(
         self,
@@ -31,6 +80,9 @@ class BinanceService:
         if days_ago is not None:
             start_date = datetime.now() - timedelta(days=days_ago)
             start_timestamp = int(start_date.timestamp() * 1000)
+            if interval in INTERVAL_MS:
+                # Round up to the next open time (the first candle Binance returns anyway) so the URL, and its cache key, is stable.
+                start_timestamp = -(-start_timestamp // INTERVAL_MS[interval]) * INTERVAL_MS[interval]
             params["startTime"] = start_timestamp
             date_str = start_date.strftime("%Y-%m-%d %H:%M:%S")
             self.logger.info(f"Fetching data starting from {days_ago} days ago ({date_str})")
@@ -40,10 +92,12 @@ class BinanceService:
         try:
             msg = f"Fetching klines for {symbol} with interval {interval} and limit {limit}"
             self.logger.info(msg)
-            response = self.restful_service.get(url)
+            response = self.restful_service.get(url, cache_ttl=self.kline_cache_ttl(interval) if days_ago is None else self.settled_page_ttl(interval, limit))
 
             if response.status_code == 200:
-                klines_data = response.json()
+                with self.profiler.stage("binance.decode_typed"):
+                    klines_data = decode_kline_array(response.content).to_rows()
+                self.profiler.count("binance.klines", len(klines_data))
                 self.logger.info(f"Successfully retrieved {len(klines_data)} klines")
 
                 result = {
@@ -65,6 +119,49 @@ class BinanceService:
             self.logger.error(f"Error fetching klines: {str(e)}")
             raise
 
+    def fetch_klines_range(self, symbol: str, interval: str, start_time: int, end_time: int) -> KlineArray:
+        """Fetch every kline whose open time lies in [start_time, end_time] without saving, paging 1000 at a time."""
+        pages: List[KlineArray] = []
+        cursor = start_time
+
+        while cursor <= end_time:
+            page = self.fetch_kline_array(symbol, interval, 1000, cursor, end_time)
+            pages.append(page)
+            if len(page) < 1000:
+                break
+            cursor = int(page.open_time[-1]) + 1
+
+        return KlineArray.concat(pages)
+
+    def fetch_kline_array(
+        self,
+        symbol: str,
+        interval: str,
+        limit: int = 1000,
+        start_time: Optional[int] = None,
+        end_time: Optional[int] = None,
+    ) -> KlineArray:
+        """Fetch klines without saving, decoding the response body straight into typed columns."""
+        limit = min(limit, 1000)
+        url = f"{self.base_url}/api/v3/klines?symbol={symbol.upper()}&interval={interval}&limit={limit}"
+        if start_time is not None:
+            url += f"&startTime={start_time}"
+        if end_time is not None:
+            url += f"&endTime={end_time}"
+
+        response = self.restful_service.get(
+            url,
+            cache_ttl=self.settled_page_ttl(interval, limit) if start_time is not None and end_time is None else self.kline_cache_ttl(interval, start_time, end_time),
+        )
+        if response.status_code != 200:
+            self.logger.error(f"Failed to fetch klines: {response.status_code} - {response.text}")
+            response.raise_for_status()
+
+        with self.profiler.stage("binance.decode_typed"):
+            klines = decode_kline_array(response.content)
+        self.profiler.count("binance.klines", len(klines))
+        return klines
+
     def parse_kline_data(self, klines: List[List[Any]]) -> List[Dict[str, Any]]:
         parsed_data = []
 
@@ -86,15 +183,15 @@ class BinanceService:
 
         return parsed_data
 
+    def parse_kline_array(self, klines: List[List[Any]]) -> KlineArray:
+        return KlineArray.from_rows(klines)
+
     def _get_current_timestamp(self) -> str:
         return datetime.now().isoformat()
 
-    def _save_klines_data(self, data: Dict[str, Any]) -> None:
-        data_dir = Path("data/kline")
-        data_dir.mkdir(parents=True, exist_ok=True)
-
-        symbol = data["symbol"].upper()
-        crypto_name = symbol
+    @staticmethod
+    def crypto_name(symbol: str) -> str:
+        crypto_name = symbol.upper()
         if crypto_name.endswith("USDT"):
             crypto_name = crypto_name[:-4]
         elif crypto_name.endswith("BUSD"):
@@ -103,11 +200,10 @@ class BinanceService:
             crypto_name = crypto_name[:-3]
         elif crypto_name.endswith("ETH"):
             crypto_name = crypto_name[:-3]
+        return crypto_name.lower()
 
-        filename = f"{crypto_name.lower()}.json"
-        filepath = data_dir / filename
-
-        with open(filepath, "w", encoding="utf-8") as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
+    @timed("binance.save")
+    def _save_klines_data(self, data: Dict[str, Any]) -> None:
+        filepath = KlineService().save_kline_data(self.crypto_name(data["symbol"]), data)
 
         self.logger.info(f"Data saved to: {filepath}")
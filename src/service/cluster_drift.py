@@ -0,0 +1,146 @@
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+# Statistics are exponentially weighted so they describe recent candles rather than everything since training.
+DRIFT_HALFLIFE = 500
+MIN_DRIFT_SAMPLES = 200
+# Limits are in training standard deviations (the scaler's units).
+FEATURE_SHIFT_LIMIT = 1.0
+VARIANCE_RATIO_LIMIT = 3.0
+CENTROID_SHIFT_LIMIT = 0.75
+DISTANCE_RATIO_LIMIT = 1.5
+
+
+def _ew_update(current: np.ndarray, rows: np.ndarray, alpha: float) -> np.ndarray:
+    """Fold ``rows`` (oldest first) into an exponentially weighted mean in one vectorized step."""
+    n = len(rows)
+    if n == 0:
+        return current
+    weights = alpha * (1 - alpha) ** np.arange(n - 1, -1, -1)
+    return (1 - alpha) ** n * current + weights @ rows
+
+
+class OnlineClusterStats:
+    """Running statistics of candles assigned by a deployed KMeans model, used to decide when to retrain.
+
+    Everything is tracked in the model's scaled feature space, where the training data has mean 0 and
+    variance 1 per feature, so shifts can be compared with the training-time scaler directly.
+    """
+
+    def __init__(
+        self,
+        trained_at: str,
+        feature_columns: List[str],
+        centroids: np.ndarray,
+        reference_distance: Optional[float] = None,
+        halflife: int = DRIFT_HALFLIFE,
+    ):
+        self.trained_at = trained_at
+        self.feature_columns = list(feature_columns)
+        self.reference_centroids = np.asarray(centroids, dtype=np.float64)
+        self.reference_distance = reference_distance
+        self.halflife = halflife
+
+        n_clusters, n_features = self.reference_centroids.shape
+        self.feature_mean = np.zeros(n_features)
+        self.feature_square = np.ones(n_features)
+        self.centroids = self.reference_centroids.copy()
+        self.distance = reference_distance
+        self.counts = np.zeros(n_clusters, dtype=np.int64)
+        self.samples = 0
+        self.last_open_time: Optional[int] = None
+        self.latest: Optional[Dict[str, Any]] = None
+
+    @property
+    def alpha(self) -> float:
+        return 1 - 0.5 ** (1 / self.halflife)
+
+    @classmethod
+    def from_model(cls, model_payload: Dict[str, Any]) -> "OnlineClusterStats":
+        training_stats = model_payload.get("training_stats", {})
+        return cls(
+            model_payload["trained_at"],
+            model_payload["feature_columns"],
+            model_payload["model"].cluster_centers_,
+            training_stats.get("mean_distance"),
+        )
+
+    def update(self, X_scaled: np.ndarray, labels: np.ndarray, distances: np.ndarray, open_times: np.ndarray) -> None:
+        """Fold a batch of newly assigned candles (in time order) into the running statistics."""
+        if len(X_scaled) == 0:
+            return
+        alpha = self.alpha
+        self.feature_mean = _ew_update(self.feature_mean, X_scaled, alpha)
+        self.feature_square = _ew_update(self.feature_square, X_scaled**2, alpha)
+        if self.distance is not None:
+            self.distance = float(_ew_update(np.float64(self.distance), distances, alpha))
+        for cluster in np.unique(labels):
+            members = X_scaled[labels == cluster]
+            self.centroids[cluster] = _ew_update(self.centroids[cluster], members, alpha)
+
+        self.counts += np.bincount(labels, minlength=len(self.counts))
+        self.samples += len(X_scaled)
+        self.last_open_time = int(open_times[-1])
+
+    def report(self) -> Dict[str, Any]:
+        variance = np.maximum(self.feature_square - self.feature_mean**2, 1e-12)
+        centroid_shift = np.sqrt(np.mean((self.centroids - self.reference_centroids) ** 2, axis=1))
+        distance_ratio = self.distance / self.reference_distance if self.distance is not None and self.reference_distance else None
+
+        shifted_features = [
+            name
+            for name, mean, var in zip(self.feature_columns, self.feature_mean, variance)
+            if abs(mean) > FEATURE_SHIFT_LIMIT or not 1 / VARIANCE_RATIO_LIMIT <= var <= VARIANCE_RATIO_LIMIT
+        ]
+        drifted_clusters = [int(cluster) for cluster in np.flatnonzero(centroid_shift > CENTROID_SHIFT_LIMIT) if self.counts[cluster]]
+
+        reasons = []
+        if shifted_features:
+            reasons.append(f"feature distribution shifted: {', '.join(shifted_features)}")
+        if drifted_clusters:
+            reasons.append(f"centroids moved for clusters {drifted_clusters}")
+        if distance_ratio is not None and distance_ratio > DISTANCE_RATIO_LIMIT:
+            reasons.append(f"candles sit {distance_ratio:.2f}x farther from their centroids than in training")
+        enough = self.samples >= MIN_DRIFT_SAMPLES
+
+        return {
+            "samples": self.samples,
+            "cluster_counts": {int(cluster): int(count) for cluster, count in enumerate(self.counts)},
+            "feature_shift": {name: float(mean) for name, mean in zip(self.feature_columns, self.feature_mean)},
+            "variance_ratio": {name: float(var) for name, var in zip(self.feature_columns, variance)},
+            "centroid_shift": {int(cluster): float(shift) for cluster, shift in enumerate(centroid_shift)},
+            "distance_ratio": distance_ratio,
+            "drifted": enough and bool(reasons),
+            "reasons": reasons if enough else [f"waiting for {MIN_DRIFT_SAMPLES - self.samples} more candles"],
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trained_at": self.trained_at,
+            "feature_columns": self.feature_columns,
+            "halflife": self.halflife,
+            "reference_centroids": self.reference_centroids.tolist(),
+            "reference_distance": self.reference_distance,
+            "feature_mean": self.feature_mean.tolist(),
+            "feature_square": self.feature_square.tolist(),
+            "centroids": self.centroids.tolist(),
+            "distance": self.distance,
+            "counts": self.counts.tolist(),
+            "samples": self.samples,
+            "last_open_time": self.last_open_time,
+            "latest": self.latest,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "OnlineClusterStats":
+        stats = cls(data["trained_at"], data["feature_columns"], np.array(data["reference_centroids"]), data["reference_distance"], data["halflife"])
+        stats.feature_mean = np.array(data["feature_mean"])
+        stats.feature_square = np.array(data["feature_square"])
+        stats.centroids = np.array(data["centroids"])
+        stats.distance = data["distance"]
+        stats.counts = np.array(data["counts"], dtype=np.int64)
+        stats.samples = data["samples"]
+        stats.last_open_time = data["last_open_time"]
+        stats.latest = data["latest"]
+        return stats
@@ -0,0 +1,172 @@
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from service.feature_pipeline import FeaturePipeline
+from service.intervals import INTERVAL_MS, TimeBound, to_epoch_ms
+from service.kline_service import KlineService
+from service.market_state_service import MarketStateService
+
+# Columns of ``prepare_feature_dataset`` that precede the features in the matrix.
+BASE_COLUMNS = ["close", "future_return_1"]
+
+
+class FeatureBatchError(Exception):
+    """Raised when features for a batch of symbols cannot be computed."""
+
+
+def _fill_symbol(task: Dict[str, Any]) -> Dict[str, Any]:
+    """Worker: compute one symbol's features and write them straight into its slice of the shared matrix."""
+    block = shared_memory.SharedMemory(name=task["shm_name"])
+    try:
+        matrix = np.ndarray(task["shape"], dtype=np.float64, buffer=block.buf)
+        dataset = MarketStateService().prepare_feature_dataset(task["crypto"], task["feature_specs"], task["start"], task["end"])
+        frame = dataset["frame"]
+
+        offsets = frame["open_time"].to_numpy("datetime64[ms]").astype(np.int64) - task["origin"]
+        rows = offsets // task["interval_ms"]
+        aligned = (offsets % task["interval_ms"] == 0) & (rows >= 0) & (rows < task["shape"][0])
+        matrix[rows[aligned], task["index"], :] = frame[task["columns"]].to_numpy(dtype=np.float64)[aligned]
+        del matrix
+    finally:
+        block.close()
+    return {"crypto": task["crypto"], "rows": int(aligned.sum()), "misaligned": int((~aligned).sum()), "feature_spec_hash": dataset["feature_spec_hash"]}
+
+
+class FeatureMatrix:
+    """Features of several symbols on one time grid, shaped ``(time, symbol, column)``, in shared memory.
+
+    Rows a symbol has no features for (before its history starts, gaps, warm-up) are NaN. The array is a
+    view of the shared block, so call ``close()`` (or use the matrix as a context manager) when done and
+    copy anything that must outlive it.
+    """
+
+    def __init__(self, block: shared_memory.SharedMemory, shape: tuple, open_time: np.ndarray, cryptos: List[str], columns: List[str], interval: str, feature_spec_hash: str):
+        self._block = block
+        self.values = np.ndarray(shape, dtype=np.float64, buffer=block.buf)
+        self.open_time = open_time
+        self.cryptos = cryptos
+        self.columns = columns
+        self.interval = interval
+        self.feature_spec_hash = feature_spec_hash
+
+    def __enter__(self) -> "FeatureMatrix":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def column(self, name: str) -> np.ndarray:
+        """``(time, symbol)`` view of one column."""
+        return self.values[:, :, self.columns.index(name)]
+
+    def frame(self, crypto_name: str) -> pd.DataFrame:
+        """One symbol's rows as a DataFrame shaped like ``prepare_feature_dataset``'s frame (copied)."""
+        values = self.values[:, self.cryptos.index(crypto_name.lower()), :]
+        present = ~np.isnan(values).any(axis=1)
+        frame = pd.DataFrame(values[present], columns=self.columns)
+        frame.insert(0, "open_time", pd.to_datetime(self.open_time[present], unit="ms"))
+        return frame
+
+    def close(self) -> None:
+        if self._block is None:
+            return
+        self.values = None
+        self._block.close()
+        self._block.unlink()
+        self._block = None
+
+
+class FeatureBatchService:
+    """Compute features for many symbols over a process pool into one shared-memory matrix.
+
+    The parent sizes a ``(time, symbol, column)`` block from the datasets' bounds before any work starts;
+    each worker attaches to it by name and writes its own symbol's slice, so only small task/result dicts
+    are pickled and the parent assembles nothing.
+    """
+
+    def __init__(self):
+        self.kline_service = KlineService()
+        self.logger = logging.getLogger(__name__)
+
+    def time_grid(self, cryptos: List[str], start: TimeBound = None, end: TimeBound = None) -> Dict[str, Any]:
+        """Shared interval, first open time (``origin``) and row count of a grid covering every symbol's klines."""
+        intervals = {self.kline_service.get_interval(crypto) for crypto in cryptos}
+        if len(intervals) != 1:
+            raise FeatureBatchError(f"All symbols must share one interval, got {', '.join(sorted(intervals))}")
+        interval = intervals.pop()
+        if interval not in INTERVAL_MS:
+            raise FeatureBatchError(f"Cannot build a time grid for {interval} klines; use a fixed-length interval")
+
+        start_ms, end_ms = to_epoch_ms(start), to_epoch_ms(end)
+        firsts, lasts = [], []
+        for crypto in cryptos:
+            bounds = self.kline_service.get_open_time_bounds(crypto)
+            if bounds is None:
+                continue
+            firsts.append(bounds[0] if start_ms is None else max(bounds[0], start_ms))
+            lasts.append(bounds[1] if end_ms is None else min(bounds[1], end_ms))
+        if not firsts or max(lasts) < min(firsts):
+            raise FeatureBatchError("No klines in the requested range")
+
+        interval_ms = INTERVAL_MS[interval]
+        origin = min(firsts)
+        return {"interval": interval, "interval_ms": interval_ms, "origin": origin, "rows": (max(lasts) - origin) // interval_ms + 1}
+
+    def prepare_feature_matrix(
+        self,
+        cryptos: List[str],
+        feature_specs: Optional[List[Dict[str, Any]]] = None,
+        start: TimeBound = None,
+        end: TimeBound = None,
+        workers: Optional[int] = None,
+    ) -> FeatureMatrix:
+        """Features for every symbol in ``cryptos`` on a shared time grid; ``workers=1`` runs in-process."""
+        cryptos = [crypto.lower() for crypto in cryptos]
+        if not cryptos:
+            raise FeatureBatchError("No symbols given")
+        pipeline = FeaturePipeline(feature_specs)
+        grid = self.time_grid(cryptos, start, end)
+        columns = BASE_COLUMNS + pipeline.columns
+        shape = (grid["rows"], len(cryptos), len(columns))
+
+        block = shared_memory.SharedMemory(create=True, size=max(1, int(np.prod(shape)) * 8))
+        matrix = FeatureMatrix(block, shape, grid["origin"] + np.arange(grid["rows"], dtype=np.int64) * grid["interval_ms"], cryptos, columns, grid["interval"], pipeline.spec_hash)
+        matrix.values.fill(np.nan)
+
+        tasks = [
+            {
+                "shm_name": block.name,
+                "shape": shape,
+                "index": index,
+                "crypto": crypto,
+                "columns": columns,
+                "feature_specs": pipeline.specs,
+                "start": start,
+                "end": end,
+                "origin": grid["origin"],
+                "interval_ms": grid["interval_ms"],
+            }
+            for index, crypto in enumerate(cryptos)
+        ]
+        workers = min(len(tasks), workers or os.cpu_count() or 1)
+        try:
+            if workers <= 1:
+                results = [_fill_symbol(task) for task in tasks]
+            else:
+                with ProcessPoolExecutor(max_workers=workers) as pool:
+                    results = list(pool.map(_fill_symbol, tasks))
+        except BaseException:
+            matrix.close()
+            raise
+
+        for result in results:
+            if result["misaligned"]:
+                self.logger.warning(f"{result['crypto'].upper()}: {result['misaligned']} klines are off the {grid['interval']} grid and were left out")
+        self.logger.info(f"Computed {len(columns)} columns for {len(cryptos)} symbols over {grid['rows']:,} {grid['interval']} candles with {workers} worker(s)")
+        return matrix
@@ -0,0 +1,186 @@
+import json
+import logging
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from decorator.singleton import singleton
+from service.feature_pipeline import FeaturePipeline
+from service.file_store import atomic_replace, atomic_write_json, file_lock
+from service.intervals import INTERVAL_MS
+from service.kline_service import KlineService
+from service.market_state_service import MarketStateService
+
+MANIFEST_VERSION = 1
+LABEL_COLUMNS = ["future_return_1", "cluster", "state", "next_state"]
+
+
+class FeatureExportError(Exception):
+    """Raised when a feature export cannot be produced."""
+
+
+@singleton
+class FeatureExportService:
+    """Stream features and market-state labels into sharded ``.npz`` column files with a resumable manifest.
+
+    Shards cover fixed, epoch-aligned time spans of ``shard_rows`` candles. Each shard is featurized from
+    its own klines plus the pipeline's warm-up history (and one candle after it for the labels), so memory
+    is bounded by the shard size; specs with cumulative features read from the first candle instead. The manifest is rewritten after every shard; a re-run skips shards that
+    are already complete and redoes the trailing one once more data arrived.
+    """
+
+    def __init__(self):
+        self.kline_service = KlineService()
+        self.state_service = MarketStateService()
+        self.logger = logging.getLogger(__name__)
+
+    @staticmethod
+    def _load_manifest(path: Path) -> Dict[str, Any]:
+        if path.exists():
+            with open(path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+            if manifest.get("version") == MANIFEST_VERSION:
+                return manifest
+        return {"version": MANIFEST_VERSION, "label_columns": LABEL_COLUMNS, "symbols": {}}
+
+    def export(self, cryptos: List[str], output_dir: str = "data/features", shard_rows: int = 100_000, restart: bool = False, compress: bool = True) -> Dict[str, Any]:
+        if shard_rows <= 0:
+            raise FeatureExportError("shard_rows must be positive")
+        output = Path(output_dir)
+        manifest_path = output / "manifest.json"
+
+        # Shards are only written while this lock is held, so they need no per-file lock or generation.
+        with file_lock(manifest_path):
+            manifest = self._load_manifest(manifest_path)
+            results = [self._export_symbol(crypto.lower(), output, manifest, manifest_path, shard_rows, restart, compress) for crypto in cryptos]
+        return {"manifest": str(manifest_path), "symbols": results}
+
+    def _export_symbol(
+        self,
+        crypto_name: str,
+        output: Path,
+        manifest: Dict[str, Any],
+        manifest_path: Path,
+        shard_rows: int,
+        restart: bool,
+        compress: bool,
+    ) -> Dict[str, Any]:
+        meta = self.kline_service.get_kline_meta(crypto_name)
+        if meta["interval"] not in INTERVAL_MS:
+            raise FeatureExportError(f"Cannot shard {meta['interval']} klines by time; use a fixed-length interval")
+        payload = self.state_service.load_model(meta["symbol"], meta["interval"])
+        bounds = self.kline_service.get_open_time_bounds(crypto_name)
+
+        span = shard_rows * INTERVAL_MS[meta["interval"]]
+        signature = {
+            "symbol": meta["symbol"],
+            "interval": meta["interval"],
+            "feature_spec_hash": payload.get("feature_spec_hash"),
+            "model_trained_at": payload["trained_at"],
+            "shard_span_ms": span,
+        }
+
+        entry = manifest["symbols"].get(crypto_name)
+        if entry is not None and (restart or entry["signature"] != signature):
+            self.logger.info(f"Discarding previous {crypto_name.upper()} export ({'restart requested' if restart else 'model, features or shard size changed'})")
+            for shard in entry["shards"]:
+                (output / shard["file"]).unlink(missing_ok=True)
+            entry = None
+        if entry is None:
+            entry = {"signature": signature, "feature_columns": payload["feature_columns"], "shards": []}
+            manifest["symbols"][crypto_name] = entry
+
+        done = {shard["start"] for shard in entry["shards"] if shard["complete"] and (output / shard["file"]).exists()}
+        written = skipped = 0
+        if bounds is not None:
+            for start in range(bounds[0] // span * span, bounds[1] + 1, span):
+                if start in done:
+                    skipped += 1
+                    continue
+                end = start + span
+                columns = self._label_shard(crypto_name, meta["interval"], payload, start, end)
+                if columns is None:
+                    continue
+
+                relative = f"{crypto_name}/part-{start}.npz"
+                self._write_shard(output / relative, columns, compress)
+                shard = {"file": relative, "start": start, "end": end, "rows": len(columns["open_time"]), "complete": bounds[1] >= end}
+                entry["shards"] = sorted([item for item in entry["shards"] if item["start"] != start] + [shard], key=lambda item: item["start"])
+                entry["updated_at"] = datetime.now().isoformat()
+                atomic_write_json(manifest_path, manifest)
+                written += 1
+
+        atomic_write_json(manifest_path, manifest)
+        rows = sum(shard["rows"] for shard in entry["shards"])
+        self.logger.info(f"{crypto_name.upper()}: {written} shards written, {skipped} already complete, {rows:,} rows in export")
+        return {"crypto": crypto_name, "symbol": meta["symbol"], "written": written, "skipped": skipped, "shards": len(entry["shards"]), "rows": rows}
+
+    def _label_shard(self, crypto_name: str, interval: str, payload: Dict[str, Any], start: int, end: int) -> Optional[Dict[str, np.ndarray]]:
+        """Features and labels for candles with ``start <= open_time < end``; None if the span has none.
+
+        Cumulative features (such as ``obv``) depend on every earlier candle, so for those specs each
+        shard is featurized from the first stored candle instead of from its warm-up window.
+        """
+        feature_specs = self.state_service._payload_feature_specs(payload)
+        pipeline = FeaturePipeline(feature_specs)
+        warmup_start = None if pipeline.history_dependence == "cumulative" else start - pipeline.warmup_rows(interval) * INTERVAL_MS[interval]
+        # ``end`` is inclusive here: the first candle of the next span supplies the last row's labels.
+        klines = self.kline_service.get_kline_array(crypto_name, warmup_start, end)
+        if not len(klines):
+            return None
+
+        frame = klines.to_frame()
+        rows = self.state_service._select_feature_rows(frame, interval, feature_specs, start, require_future_return=False)
+        featured = rows["valid"]
+        clusters = np.full(len(frame), -1, dtype=np.int64)
+        clusters[featured] = self.state_service.predict_clusters(payload, rows["columns"], featured)
+        cluster_labels = payload.get("cluster_labels", {})
+        states = pd.Series(clusters).map(lambda cluster: cluster_labels.get(cluster, "Unknown") if cluster >= 0 else None)
+
+        future_return = rows["future_return"]
+        next_state = states.shift(-1)
+        open_time = rows["open_time"]
+        keep = featured & (open_time < end) & ~np.isnan(future_return) & next_state.notna().to_numpy()
+        if not keep.any():
+            return None
+
+        columns = {"open_time": open_time[keep], "close": frame["close"].to_numpy()[keep]}
+        for name in payload["feature_columns"]:
+            columns[name] = np.asarray(rows["columns"][name], dtype=np.float64)[keep]
+        columns["future_return_1"] = future_return[keep]
+        columns["cluster"] = clusters[keep]
+        columns["state"] = states.to_numpy()[keep].astype(str)
+        columns["next_state"] = next_state.to_numpy()[keep].astype(str)
+        return columns
+
+    @staticmethod
+    def _write_shard(path: Path, columns: Dict[str, np.ndarray], compress: bool) -> None:
+        save = np.savez_compressed if compress else np.savez
+
+        def write(tmp_name: str) -> None:
+            # Pass a file object: given a name without ".npz", NumPy would append the suffix.
+            with open(tmp_name, "wb") as f:
+                save(f, **columns)
+
+        atomic_replace(path, write)
+
+    @staticmethod
+    def read(crypto_name: str, output_dir: str = "data/features") -> pd.DataFrame:
+        """Concatenate an exported symbol's shards into one frame (for inspection and small exports)."""
+        output = Path(output_dir)
+        with open(output / "manifest.json", "r", encoding="utf-8") as f:
+            entry = json.load(f)["symbols"].get(crypto_name.lower())
+        if entry is None:
+            raise FeatureExportError(f"{crypto_name.upper()} has not been exported to {output}")
+
+        frames = []
+        for shard in entry["shards"]:
+            with np.load(output / shard["file"]) as data:
+                frames.append(pd.DataFrame({name: data[name] for name in data.files}))
+        frame = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+        if not frame.empty:
+            frame["open_time"] = pd.to_datetime(frame["open_time"], unit="ms")
+        return frame
@@ -0,0 +1,258 @@
+import hashlib
+import json
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from service.intervals import interval_to_ms
+from service.resample_service import ResampleService
+
+
+class FeatureSpecError(Exception):
+    """Raised when a feature spec references an unknown indicator or is malformed."""
+
+
+INDICATORS: Dict[str, Callable[..., pd.Series]] = {}
+
+# EMAs never fully forget their seed; after this many spans the seed's weight is below ~0.1%.
+EWM_SETTLE_FACTOR = 4
+# Indicators that depend on more than a bounded window: EMAs settle within the warm-up (approximately),
+# cumulative sums never do, so their values on a range read differ from the full series.
+EWM_INDICATORS = {"ema", "macd", "macd_signal", "macd_hist"}
+CUMULATIVE_INDICATORS = {"obv"}
+
+DEFAULT_FEATURE_SPECS: List[Dict[str, Any]] = [
+    {"name": "return", "indicator": "return"},
+    {"name": "volatility_7", "indicator": "volatility", "params": {"window": 7}},
+    {"name": "volatility_14", "indicator": "volatility", "params": {"window": 14}},
+    {"name": "ma_7", "indicator": "ma", "params": {"window": 7}},
+    {"name": "ma_14", "indicator": "ma", "params": {"window": 14}},
+    {"name": "ma_50", "indicator": "ma", "params": {"window": 50}},
+    {"name": "ma_slope", "indicator": "ma_slope", "params": {"fast": 7, "slow": 14}},
+    {"name": "rsi_14", "indicator": "rsi", "params": {"window": 14}},
+    {"name": "macd", "indicator": "macd", "params": {"fast": 12, "slow": 26}},
+    {"name": "macd_signal", "indicator": "macd_signal", "params": {"fast": 12, "slow": 26, "signal": 9}},
+    {"name": "volume_change", "indicator": "volume_change"},
+]
+
+
+def indicator(name: str):
+    def register(func: Callable[..., pd.Series]) -> Callable[..., pd.Series]:
+        INDICATORS[name] = func
+        return func
+
+    return register
+
+
+def htf_rsi_spec(interval: str, window: int = 14) -> Dict[str, Any]:
+    return {"name": f"htf_{interval}_rsi_{window}", "indicator": "htf_rsi", "params": {"interval": interval, "window": window}}
+
+
+class FeatureContext:
+    """Per-frame memo of intermediates so indicators sharing a diff, rolling window or EMA compute it once."""
+
+    def __init__(self, frame: pd.DataFrame, source_interval: Optional[str] = None):
+        self.frame = frame
+        self.source_interval = source_interval
+        self._cache: Dict[tuple, Any] = {}
+
+    def cached(self, key: tuple, compute: Callable[[], Any]) -> Any:
+        if key not in self._cache:
+            self._cache[key] = compute()
+        return self._cache[key]
+
+    def diff(self, column: str) -> pd.Series:
+        return self.cached(("diff", column), lambda: self.frame[column].diff())
+
+    def pct_change(self, column: str) -> pd.Series:
+        return self.cached(("pct_change", column), lambda: self.frame[column].pct_change())
+
+    def rolling_mean(self, column: str, window: int) -> pd.Series:
+        return self.cached(("rolling_mean", column, window), lambda: self.frame[column].rolling(window).mean())
+
+    def rolling_std(self, column: str, window: int) -> pd.Series:
+        return self.cached(("rolling_std", column, window), lambda: self.frame[column].rolling(window).std())
+
+    def ewm(self, column: str, span: int) -> pd.Series:
+        return self.cached(("ewm", column, span), lambda: self.frame[column].ewm(span=span, adjust=False).mean())
+
+    def returns_std(self, window: int) -> pd.Series:
+        return self.cached(("returns_std", window), lambda: self.pct_change("close").rolling(window).std())
+
+    def macd(self, fast: int, slow: int) -> pd.Series:
+        return self.cached(("macd", fast, slow), lambda: self.ewm("close", fast) - self.ewm("close", slow))
+
+    def true_range(self) -> pd.Series:
+        def compute() -> pd.Series:
+            prev_close = self.frame["close"].shift(1)
+            ranges = np.column_stack(
+                [
+                    (self.frame["high"] - self.frame["low"]).to_numpy(),
+                    (self.frame["high"] - prev_close).abs().to_numpy(),
+                    (self.frame["low"] - prev_close).abs().to_numpy(),
+                ]
+            )
+            return pd.Series(np.nanmax(ranges, axis=1), index=self.frame.index)
+
+        return self.cached(("true_range",), compute)
+
+
+def _rsi_from_delta(delta: pd.Series, window: int) -> pd.Series:
+    avg_gain = delta.clip(lower=0).rolling(window).mean()
+    avg_loss = (-delta.clip(upper=0)).rolling(window).mean()
+    rs = avg_gain / avg_loss
+    return 100 - (100 / (1 + rs))
+
+
+@indicator("return")
+def _return(ctx: FeatureContext) -> pd.Series:
+    return ctx.pct_change("close")
+
+
+@indicator("volatility")
+def _volatility(ctx: FeatureContext, window: int) -> pd.Series:
+    return ctx.returns_std(window)
+
+
+@indicator("ma")
+def _ma(ctx: FeatureContext, window: int) -> pd.Series:
+    return ctx.rolling_mean("close", window)
+
+
+@indicator("ema")
+def _ema(ctx: FeatureContext, span: int) -> pd.Series:
+    return ctx.ewm("close", span)
+
+
+@indicator("ma_slope")
+def _ma_slope(ctx: FeatureContext, fast: int, slow: int) -> pd.Series:
+    return ctx.rolling_mean("close", fast) - ctx.rolling_mean("close", slow)
+
+
+@indicator("rsi")
+def _rsi(ctx: FeatureContext, window: int = 14) -> pd.Series:
+    return ctx.cached(("rsi", window), lambda: _rsi_from_delta(ctx.diff("close"), window))
+
+
+@indicator("macd")
+def _macd(ctx: FeatureContext, fast: int = 12, slow: int = 26) -> pd.Series:
+    return ctx.macd(fast, slow)
+
+
+@indicator("macd_signal")
+def _macd_signal(ctx: FeatureContext, fast: int = 12, slow: int = 26, signal: int = 9) -> pd.Series:
+    return ctx.cached(("macd_signal", fast, slow, signal), lambda: ctx.macd(fast, slow).ewm(span=signal, adjust=False).mean())
+
+
+@indicator("macd_hist")
+def _macd_hist(ctx: FeatureContext, fast: int = 12, slow: int = 26, signal: int = 9) -> pd.Series:
+    return ctx.macd(fast, slow) - _macd_signal(ctx, fast, slow, signal)
+
+
+@indicator("volume_change")
+def _volume_change(ctx: FeatureContext) -> pd.Series:
+    return ctx.pct_change("volume")
+
+
+@indicator("atr")
+def _atr(ctx: FeatureContext, window: int = 14) -> pd.Series:
+    return ctx.cached(("atr", window), lambda: ctx.true_range().rolling(window).mean())
+
+
+@indicator("bollinger_width")
+def _bollinger_width(ctx: FeatureContext, window: int = 20, k: float = 2.0) -> pd.Series:
+    return 2 * k * ctx.rolling_std("close", window) / ctx.rolling_mean("close", window)
+
+
+@indicator("bollinger_pctb")
+def _bollinger_pctb(ctx: FeatureContext, window: int = 20, k: float = 2.0) -> pd.Series:
+    mean = ctx.rolling_mean("close", window)
+    band = k * ctx.rolling_std("close", window)
+    return (ctx.frame["close"] - (mean - band)) / (2 * band)
+
+
+@indicator("obv")
+def _obv(ctx: FeatureContext) -> pd.Series:
+    return (np.sign(ctx.diff("close")).fillna(0) * ctx.frame["volume"]).cumsum()
+
+
+@indicator("taker_buy_ratio")
+def _taker_buy_ratio(ctx: FeatureContext) -> pd.Series:
+    return ctx.frame["taker_buy_base"] / ctx.frame["volume"].replace(0, np.nan)
+
+
+@indicator("htf_rsi")
+def _htf_rsi(ctx: FeatureContext, interval: str, window: int = 14) -> pd.Series:
+    # Join each row with the latest higher-interval candle that had already closed,
+    # so the feature never sees prices from the future.
+    frame = ctx.frame
+    higher = ResampleService().resample_frame(frame, ctx.source_interval, interval)
+    higher["value"] = _rsi_from_delta(higher["close"].diff(), window)
+    joined = pd.merge_asof(
+        frame[["close_time"]].astype("datetime64[ms]"),
+        higher[["close_time", "value"]].astype({"close_time": "datetime64[ms]"}),
+        on="close_time",
+        direction="backward",
+    )
+    return pd.Series(joined["value"].to_numpy(), index=frame.index)
+
+
+class FeaturePipeline:
+    """Compute a declarative list of indicator specs in one pass over a kline frame."""
+
+    def __init__(self, specs: Optional[List[Dict[str, Any]]] = None):
+        self.specs = self._normalize(DEFAULT_FEATURE_SPECS if specs is None else specs)
+        self.columns = [spec["name"] for spec in self.specs]
+
+    @staticmethod
+    def _normalize(specs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        normalized = []
+        for spec in specs:
+            if "indicator" not in spec or spec["indicator"] not in INDICATORS:
+                raise FeatureSpecError(f"Unknown indicator in spec {spec}; available: {', '.join(sorted(INDICATORS))}")
+            params = dict(spec.get("params") or {})
+            name = spec.get("name") or "_".join([spec["indicator"]] + [str(value) for value in params.values()])
+            normalized.append({"name": name, "indicator": spec["indicator"], "params": params})
+
+        names = [spec["name"] for spec in normalized]
+        if len(set(names)) != len(names):
+            raise FeatureSpecError(f"Duplicate feature names in spec: {names}")
+        return normalized
+
+    @property
+    def spec_hash(self) -> str:
+        encoded = json.dumps(self.specs, sort_keys=True).encode("utf-8")
+        return hashlib.sha256(encoded).hexdigest()[:16]
+
+    def warmup_rows(self, source_interval: Optional[str] = None) -> int:
+        """Rows of history to load before a query range so every feature is settled at its first row."""
+        rows = 1
+        for spec in self.specs:
+            lookback = sum(value for value in spec["params"].values() if isinstance(value, int) and not isinstance(value, bool))
+            if spec["indicator"] == "htf_rsi" and source_interval:
+                lookback *= max(1, interval_to_ms(spec["params"]["interval"]) // interval_to_ms(source_interval))
+            rows = max(rows, EWM_SETTLE_FACTOR * lookback + 1)
+        return rows
+
+    @property
+    def history_dependence(self) -> str:
+        """``"window"`` if a warm-up reproduces every feature exactly, ``"ewm"`` if only approximately, else ``"cumulative"``."""
+        indicators = {spec["indicator"] for spec in self.specs}
+        if indicators & CUMULATIVE_INDICATORS:
+            return "cumulative"
+        return "ewm" if indicators & EWM_INDICATORS else "window"
+
+    def compute_columns(self, frame: pd.DataFrame, source_interval: Optional[str] = None) -> Dict[str, pd.Series]:
+        """Feature columns as separate Series, skipping the copy ``compute`` makes to consolidate them."""
+        ctx = FeatureContext(frame, source_interval)
+        columns = {}
+        for spec in self.specs:
+            try:
+                columns[spec["name"]] = INDICATORS[spec["indicator"]](ctx, **spec["params"])
+            except TypeError as exc:
+                raise FeatureSpecError(f"Invalid parameters for {spec['name']}: {exc}") from exc
+        return columns
+
+    def compute(self, frame: pd.DataFrame, source_interval: Optional[str] = None) -> pd.DataFrame:
+        return pd.DataFrame(self.compute_columns(frame, source_interval), index=frame.index)
@@ -0,0 +1,182 @@
+import json
+import os
+import stat
+import tempfile
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, Tuple, Union
+
+from joblib import dump
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+PathLike = Union[str, Path]
+
+_registry_lock = threading.Lock()
+_thread_locks: Dict[str, threading.RLock] = {}
+_depth: Dict[str, int] = {}
+
+
+def _lock_file(handle) -> None:
+    if fcntl is not None:
+        fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+    else:
+        handle.seek(0)
+        msvcrt.locking(handle.fileno(), msvcrt.LK_LOCK, 1)
+
+
+def _unlock_file(handle) -> None:
+    if fcntl is not None:
+        fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+    else:
+        handle.seek(0)
+        msvcrt.locking(handle.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+@contextmanager
+def file_lock(path: PathLike) -> Iterator[None]:
+    """Exclusive advisory lock for writers of ``path`` (via ``<path>.lock``); re-entrant within a thread.
+
+    Readers never take it: writes are atomic renames, so a reader sees either the old or the new file.
+    """
+    target = Path(path).resolve()
+    key = str(target)
+    with _registry_lock:
+        thread_lock = _thread_locks.setdefault(key, threading.RLock())
+
+    with thread_lock:
+        if _depth.get(key, 0):
+            _depth[key] += 1
+            try:
+                yield
+            finally:
+                _depth[key] -= 1
+            return
+
+        target.parent.mkdir(parents=True, exist_ok=True)
+        with open(f"{target}.lock", "a+b") as handle:
+            _lock_file(handle)
+            _depth[key] = 1
+            try:
+                yield
+            finally:
+                _depth[key] = 0
+                _unlock_file(handle)
+
+
+def _generation_path(path: Path) -> Path:
+    return path.with_name(f"{path.name}.gen")
+
+
+def read_generation(path: PathLike) -> int:
+    """Generation counter of ``path``; bumped after every atomic write, 0 if never written through this module."""
+    try:
+        with open(_generation_path(Path(path)), "r", encoding="utf-8") as f:
+            return int(f.read().strip() or 0)
+    except (FileNotFoundError, ValueError):
+        return 0
+
+
+def file_version(path: PathLike) -> Tuple[int, int, int]:
+    """Cheap change token: (generation, mtime_ns, size). Also catches writers that bypass this module."""
+    info = os.stat(path)
+    return read_generation(path), info.st_mtime_ns, info.st_size
+
+
+def atomic_replace(path: PathLike, write: Callable[[str], None]) -> None:
+    """Run ``write(tmp_path)`` and rename the result over ``path``, without a lock or generation sidecar.
+
+    For files whose only writer already serializes access some other way (e.g. under a directory-level lock).
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    os.close(fd)
+    try:
+        os.chmod(tmp_name, stat.S_IMODE(os.stat(path).st_mode) if path.exists() else 0o644)
+        write(tmp_name)
+        with open(tmp_name, "rb") as f:
+            os.fsync(f.fileno())
+        os.replace(tmp_name, path)
+    except BaseException:
+        if os.path.exists(tmp_name):
+            os.remove(tmp_name)
+        raise
+
+
+def _bump_generation(path: Path) -> int:
+    generation = read_generation(path) + 1
+    gen_path = _generation_path(path)
+    tmp_name = f"{gen_path}.tmp"
+    with open(tmp_name, "w", encoding="utf-8") as f:
+        f.write(str(generation))
+    os.replace(tmp_name, gen_path)
+    return generation
+
+
+def atomic_write(path: PathLike, write: Callable[[str], None]) -> int:
+    """Run ``write(tmp_path)``, then rename the result over ``path`` under the writer lock. Returns the new generation."""
+    target = Path(path)
+    with file_lock(target):
+        atomic_replace(target, write)
+        return _bump_generation(target)
+
+
+def atomic_write_json(path: PathLike, data: Any, indent: int = 2) -> int:
+    def write(tmp_name: str) -> None:
+        with open(tmp_name, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=indent, ensure_ascii=False)
+
+    return atomic_write(path, write)
+
+
+def atomic_dump(obj: Any, path: PathLike) -> int:
+    """``joblib.dump`` through a temporary file so concurrent ``load`` never sees a partial model."""
+    return atomic_write(path, lambda tmp_name: dump(obj, tmp_name))
+
+
+def remove_file(path: PathLike) -> None:
+    """Delete ``path`` and its generation sidecar (the ``.lock`` file stays, other writers may hold it)."""
+    target = Path(path)
+    target.unlink()
+    _generation_path(target).unlink(missing_ok=True)
+
+
+class GenerationCache:
+    """Cache of loaded files that reloads once the file's generation (or mtime/size) changes."""
+
+    def __init__(self):
+        self._entries: Dict[str, Tuple[Tuple[int, int, int], Any]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, path: PathLike, loader: Callable[[Path], Any]) -> Any:
+        target = Path(path)
+        key = os.path.abspath(target)
+        version = file_version(target)
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None and entry[0] == version:
+            return entry[1]
+
+        value = loader(target)
+        with self._lock:
+            self._entries[key] = (version, value)
+        return value
+
+    def contains(self, path: PathLike) -> bool:
+        """True if a still-current value for ``path`` is cached."""
+        with self._lock:
+            entry = self._entries.get(os.path.abspath(path))
+        return entry is not None and os.path.exists(path) and entry[0] == file_version(path)
+
+    def invalidate(self, path: PathLike = None) -> None:
+        with self._lock:
+            if path is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(os.path.abspath(path), None)
@@ -0,0 +1,187 @@
+import json
+import logging
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from decorator.singleton import singleton
+from service.binance_service import BinanceService
+from service.file_store import atomic_write_json, file_lock
+from service.intervals import interval_to_ms
+from service.kline_array import KlineArray
+from service.kline_service import KlineService
+
+
+class KlineGapError(Exception):
+    """Raised when a stored series cannot be scanned or repaired."""
+
+
+@singleton
+class GapService:
+    """Keep a per-series index of covered time ranges and repair missing windows."""
+
+    def __init__(self):
+        self.index_dir = Path("data/index")
+        self.kline_service = KlineService()
+        self.binance_service = BinanceService()
+        self.logger = logging.getLogger(__name__)
+
+    def _index_path(self, crypto_name: str) -> Path:
+        return self.index_dir / f"{crypto_name.lower()}.json"
+
+    @staticmethod
+    def scan_open_times(open_times: np.ndarray, interval_ms: int) -> Dict[str, Any]:
+        """Return missing windows and covered ranges of a sorted open-time array in one vectorized pass.
+
+        Each gap is ``[first_missing_open_time, last_missing_open_time]``.
+        """
+        open_times = np.asarray(open_times, dtype=np.int64)
+        if len(open_times) == 0:
+            return {"gaps": [], "coverage": [], "duplicates": 0, "missing": 0}
+
+        steps = np.diff(open_times)
+        breaks = np.flatnonzero(steps > interval_ms)
+        gap_starts = open_times[breaks] + interval_ms
+        gap_ends = open_times[breaks + 1] - interval_ms
+        missing = int(((gap_ends - gap_starts) // interval_ms + 1).sum()) if len(breaks) else 0
+
+        run_starts = np.r_[open_times[0], open_times[breaks + 1]]
+        run_ends = np.r_[open_times[breaks], open_times[-1]]
+
+        return {
+            "gaps": np.column_stack([gap_starts, gap_ends]).tolist(),
+            "coverage": np.column_stack([run_starts, run_ends]).tolist(),
+            "duplicates": int(np.count_nonzero(steps <= 0)),
+            "missing": missing,
+        }
+
+    @staticmethod
+    def _subtract_known(gaps: List[List[int]], known_gaps: List[List[int]]) -> List[List[int]]:
+        known = {tuple(gap) for gap in known_gaps}
+        return [gap for gap in gaps if tuple(gap) not in known]
+
+    def load_index(self, crypto_name: str) -> Dict[str, Any]:
+        path = self._index_path(crypto_name)
+        if not path.exists():
+            return {}
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def index_klines(self, crypto_name: str, data: Dict[str, Any], known_gaps: Optional[List[List[int]]] = None) -> Dict[str, Any]:
+        """Scan a dataset payload and persist its coverage index."""
+        interval_ms = interval_to_ms(data["interval"])
+        open_times = np.fromiter((kline[0] for kline in data["klines"]), dtype=np.int64, count=len(data["klines"]))
+        scan = self.scan_open_times(open_times, interval_ms)
+
+        if known_gaps is None:
+            previous = self.load_index(crypto_name)
+            known_gaps = previous.get("known_gaps", []) if previous.get("interval") == data["interval"] else []
+
+        index = {
+            "symbol": data["symbol"],
+            "interval": data["interval"],
+            "interval_ms": interval_ms,
+            "klines": len(open_times),
+            "coverage": scan["coverage"],
+            "gaps": self._subtract_known(scan["gaps"], known_gaps),
+            "known_gaps": known_gaps,
+            "missing": scan["missing"],
+            "duplicates": scan["duplicates"],
+            "updated_at": datetime.now().isoformat(),
+        }
+
+        atomic_write_json(self._index_path(crypto_name), index)
+        return index
+
+    def extend_index(self, crypto_name: str, meta: Dict[str, Any], klines: KlineArray) -> Dict[str, Any]:
+        """Add klines appended after the indexed range to the stored index, scanning only those rows.
+
+        Falls back to a full ``index_klines`` rescan when there is no usable index for the interval.
+        """
+        index = self.load_index(crypto_name)
+        if index.get("interval") != meta["interval"] or not index.get("coverage"):
+            return self.index_klines(crypto_name, self.kline_service.get_kline_data(crypto_name))
+
+        last_open_time = index["coverage"][-1][1]
+        open_times = klines.open_time[klines.open_time > last_open_time]
+        if not len(open_times):
+            return index
+
+        # Seeding the scan with the last indexed open time makes its first run continue the stored one.
+        scan = self.scan_open_times(np.r_[last_open_time, open_times], index["interval_ms"])
+        index["coverage"][-1][1] = scan["coverage"][0][1]
+        index["coverage"].extend(scan["coverage"][1:])
+        index["gaps"].extend(self._subtract_known(scan["gaps"], index["known_gaps"]))
+        index["klines"] += len(open_times)
+        index["missing"] += scan["missing"]
+        index["duplicates"] += scan["duplicates"]
+        index["updated_at"] = datetime.now().isoformat()
+
+        atomic_write_json(self._index_path(crypto_name), index)
+        return index
+
+    def check(self, crypto_name: str) -> Dict[str, Any]:
+        data = self.kline_service.get_kline_data(crypto_name)
+        return self.index_klines(crypto_name, data)
+
+    @staticmethod
+    def _merge(existing: List[List[Any]], fetched: List[List[Any]]) -> List[List[Any]]:
+        by_open_time = {int(kline[0]): kline for kline in existing}
+        for kline in fetched:
+            by_open_time[int(kline[0])] = kline
+        return [by_open_time[key] for key in sorted(by_open_time)]
+
+    def repair(self, crypto_name: str, interval: str) -> Dict[str, Any]:
+        """Fetch only the windows listed as gaps in the index and merge them into the stored series.
+
+        Windows that Binance returns empty (exchange outages) are remembered as known gaps so later
+        repairs skip them. The dataset's writer lock is held from read to write so a concurrent
+        fetch cannot be overwritten by a stale merge.
+        """
+        with file_lock(self.kline_service.data_path(crypto_name)):
+            return self._repair_locked(crypto_name, interval)
+
+    def _repair_locked(self, crypto_name: str, interval: str) -> Dict[str, Any]:
+        data = dict(self.kline_service.get_kline_data(crypto_name))
+        if data["interval"] != interval:
+            raise KlineGapError(f"Stored {crypto_name.upper()} data uses {data['interval']}, not {interval}")
+        if self.binance_service.crypto_name(data["symbol"]) != crypto_name.lower():
+            raise KlineGapError(f"{crypto_name.upper()} is a derived dataset; repair its source and resample again")
+
+        index = self.index_klines(crypto_name, data)
+        if not index["gaps"]:
+            return {"symbol": data["symbol"], "interval": interval, "gaps": 0, "filled": 0, "remaining": 0, "known_gaps": len(index["known_gaps"])}
+
+        windows = []
+        for start, end in index["gaps"]:
+            self.logger.info(f"Repairing {data['symbol']} gap {datetime.fromtimestamp(start / 1000)} -> {datetime.fromtimestamp(end / 1000)}")
+            windows.append(self.binance_service.fetch_klines_range(data["symbol"], interval, start, end))
+        fetched = KlineArray.concat(windows)
+
+        if len(fetched):
+            data["klines"] = self._merge(data["klines"], fetched.to_rows())
+            data["limit"] = len(data["klines"])
+            data["timestamp"] = datetime.now().isoformat()
+            self.binance_service._save_klines_data(data)
+
+        # Whatever is still missing inside a window we just asked for does not exist on the exchange.
+        attempted = np.asarray(index["gaps"], dtype=np.int64)
+        remaining = self.scan_open_times(np.fromiter((kline[0] for kline in data["klines"]), dtype=np.int64), interval_to_ms(interval))["gaps"]
+        known_gaps = list(index["known_gaps"])
+        for start, end in remaining:
+            if np.any((attempted[:, 0] <= start) & (end <= attempted[:, 1])):
+                known_gaps.append([start, end])
+
+        gap_count = len(index["gaps"])
+        index = self.index_klines(crypto_name, data, known_gaps)
+
+        return {
+            "symbol": data["symbol"],
+            "interval": interval,
+            "gaps": gap_count,
+            "filled": len(fetched),
+            "remaining": len(index["gaps"]),
+            "known_gaps": len(known_gaps),
+        }
@@ -0,0 +1,134 @@
+import hashlib
+import json
+import math
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from service.file_store import atomic_replace
+
+CACHE_MODES = ["on", "off", "replay"]
+DEFAULT_CACHE_DIR = "data/http_cache"
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+FOREVER = math.inf
+
+
+class CacheMissError(Exception):
+    """Raised in replay mode when a request has no recorded response."""
+
+
+def normalize_url(url: str) -> str:
+    """Canonical form of a GET url: lower-case scheme/host and query parameters sorted by name."""
+    parts = urlsplit(url)
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path, query, ""))
+
+
+class ResponseCache:
+    """On-disk cache of HTTP response bodies, addressed by the SHA-256 of the normalized request.
+
+    Each entry is a ``<key>.body`` file plus a ``<key>.json`` header (url, status, headers, expiry) written
+    after it, so a half-written entry is never served. Callers choose the TTL per request: ``FOREVER`` for
+    content that cannot change. When the cache grows past ``max_bytes`` the least recently used entries are
+    evicted. In ``replay`` mode expiry is ignored and a miss raises ``CacheMissError`` instead of going to
+    the network, which makes runs offline and repeatable.
+    """
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES, mode: str = "on"):
+        if mode not in CACHE_MODES:
+            raise ValueError(f"Unknown cache mode {mode!r}; choose from {', '.join(CACHE_MODES)}")
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.mode = mode
+        self._lock = threading.Lock()
+        self._size: Optional[int] = None
+
+    @staticmethod
+    def key(method: str, url: str) -> str:
+        return hashlib.sha256(f"{method.upper()} {normalize_url(url)}".encode("utf-8")).hexdigest()
+
+    def _paths(self, key: str) -> Dict[str, Path]:
+        folder = self.cache_dir / key[:2]
+        return {"header": folder / f"{key}.json", "body": folder / f"{key}.body"}
+
+    def get(self, method: str, url: str) -> Optional[Dict[str, Any]]:
+        """Cached ``{"status", "headers", "body", "url"}`` for the request, or None when absent or expired."""
+        if self.mode == "off":
+            return None
+        paths = self._paths(self.key(method, url))
+        try:
+            with open(paths["header"], "r", encoding="utf-8") as f:
+                header = json.load(f)
+            if self.mode != "replay" and header["expires_at"] is not None and header["expires_at"] < time.time():
+                return None
+            body = paths["body"].read_bytes()
+        except (OSError, ValueError, KeyError):
+            return None
+
+        now = time.time()
+        os.utime(paths["header"], (now, now))  # mtime doubles as the LRU clock
+        return {**header, "body": body}
+
+    def put(self, method: str, url: str, status: int, headers: Dict[str, str], body: bytes, ttl: float) -> None:
+        if self.mode != "on" or ttl <= 0:
+            return
+        paths = self._paths(self.key(method, url))
+        previous = self._entry_size(paths)
+
+        def write_body(tmp_name: str) -> None:
+            with open(tmp_name, "wb") as f:
+                f.write(body)
+
+        header = {"url": normalize_url(url), "status": status, "headers": headers, "stored_at": time.time(), "expires_at": None if ttl == FOREVER else time.time() + ttl}
+        atomic_replace(paths["body"], write_body)
+        atomic_replace(paths["header"], lambda tmp_name: Path(tmp_name).write_text(json.dumps(header), encoding="utf-8"))
+
+        with self._lock:
+            self._size = self._scan_size() if self._size is None else self._size - previous + self._entry_size(paths)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    @staticmethod
+    def _entry_size(paths: Dict[str, Path]) -> int:
+        return sum(path.stat().st_size for path in paths.values() if path.exists())
+
+    def _entries(self) -> List[Path]:
+        return list(self.cache_dir.glob("*/*.json")) if self.cache_dir.exists() else []
+
+    def _scan_size(self) -> int:
+        return sum(self._entry_size({"header": header, "body": header.with_suffix(".body")}) for header in self._entries())
+
+    def _evict(self) -> None:
+        """Drop least recently used entries until the cache is back under 90% of ``max_bytes``."""
+        target = self.max_bytes * 0.9
+        entries = []
+        for header in self._entries():
+            try:
+                entries.append((header.stat().st_mtime, header))
+            except OSError:
+                continue
+        for _, header in sorted(entries):
+            if self._size <= target:
+                break
+            body = header.with_suffix(".body")
+            freed = self._entry_size({"header": header, "body": body})
+            header.unlink(missing_ok=True)
+            body.unlink(missing_ok=True)
+            self._size -= freed
+
+    def stats(self) -> Dict[str, Union[int, str]]:
+        entries = self._entries()
+        return {"mode": self.mode, "entries": len(entries), "bytes": self._scan_size(), "max_bytes": self.max_bytes, "path": str(self.cache_dir)}
+
+    def clear(self) -> int:
+        removed = 0
+        for header in self._entries():
+            header.unlink(missing_ok=True)
+            header.with_suffix(".body").unlink(missing_ok=True)
+            removed += 1
+        with self._lock:
+            self._size = 0
+        return removed
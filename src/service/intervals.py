@@ -0,0 +1,54 @@
+from datetime import datetime, timezone
+from typing import Optional, Union
+
+INTERVAL_MS = {
+    "1m": 60_000,
+    "3m": 3 * 60_000,
+    "5m": 5 * 60_000,
+    "15m": 15 * 60_000,
+    "30m": 30 * 60_000,
+    "1h": 3_600_000,
+    "2h": 2 * 3_600_000,
+    "4h": 4 * 3_600_000,
+    "6h": 6 * 3_600_000,
+    "8h": 8 * 3_600_000,
+    "12h": 12 * 3_600_000,
+    "1d": 86_400_000,
+    "3d": 3 * 86_400_000,
+    "1w": 7 * 86_400_000,
+}
+
+# Intervals whose buckets line up with epoch multiples, so they can be derived from finer data.
+RESAMPLE_INTERVALS = ["1m", "3m", "5m", "15m", "30m", "1h", "2h", "4h", "6h", "8h", "12h", "1d"]
+
+
+def interval_to_ms(interval: str) -> int:
+    if interval not in INTERVAL_MS:
+        raise ValueError(f"Unsupported fixed-length interval: {interval}")
+    return INTERVAL_MS[interval]
+
+
+TimeBound = Union[None, int, float, str, datetime]
+
+
+def to_epoch_ms(value: TimeBound) -> Optional[int]:
+    """Normalize a query bound to epoch milliseconds.
+
+    Accepts epoch ms, datetimes and ISO strings ("2024-05-01", "2024-05-01T12:00", ...). Naive values are
+    taken as UTC, the timezone of Binance open times.
+    """
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    if isinstance(value, str):
+        text = value.strip()
+        if text.isdigit():
+            return int(text)
+        try:
+            value = datetime.fromisoformat(text.replace("Z", "+00:00"))
+        except ValueError:
+            raise ValueError(f"Invalid time bound: {value!r} (use epoch ms or an ISO date such as 2024-05-01T12:00)")
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return int(value.timestamp() * 1000)
@@ -0,0 +1,160 @@
+from typing import Any, Dict, List, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+# Column name, dtype and position in a Binance kline row. The trailing "ignore" field is dropped.
+KLINE_FIELDS = [
+    ("open_time", np.int64),
+    ("open", np.float64),
+    ("high", np.float64),
+    ("low", np.float64),
+    ("close", np.float64),
+    ("volume", np.float64),
+    ("close_time", np.int64),
+    ("quote_asset_volume", np.float64),
+    ("trade_count", np.int64),
+    ("taker_buy_base", np.float64),
+    ("taker_buy_quote", np.float64),
+]
+KLINE_DTYPE = np.dtype(KLINE_FIELDS)
+KLINE_COLUMNS = [name for name, _ in KLINE_FIELDS]
+
+
+class KlineRow:
+    """Lightweight view of one candle; reads straight from the parent columns."""
+
+    __slots__ = ("_array", "_index")
+
+    def __init__(self, array: "KlineArray", index: int):
+        self._array = array
+        self._index = index
+
+    def __getattr__(self, name: str) -> Any:
+        if name in KLINE_DTYPE.names:
+            return self._array.columns[name][self._index].item()
+        raise AttributeError(name)
+
+    def __getitem__(self, position: int) -> Any:
+        return self._array.columns[KLINE_COLUMNS[position]][self._index].item()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {name: self._array.columns[name][self._index].item() for name in KLINE_COLUMNS}
+
+    def __repr__(self) -> str:
+        return f"KlineRow({self.to_dict()})"
+
+
+class KlineArray:
+    """Columnar kline container: one contiguous NumPy array per field (88 bytes per candle).
+
+    Slicing returns views, and ``to_frame`` wraps the same buffers in a DataFrame without copying.
+    Columns are kept separate rather than in one structured array because pandas can only share
+    contiguous buffers; ``to_records`` produces the structured form when needed.
+    """
+
+    __slots__ = ("columns",)
+
+    def __init__(self, columns: Dict[str, np.ndarray]):
+        self.columns = columns
+
+    @classmethod
+    def empty(cls) -> "KlineArray":
+        return cls({name: np.empty(0, dtype=dtype) for name, dtype in KLINE_FIELDS})
+
+    @classmethod
+    def from_matrix(cls, matrix: np.ndarray) -> "KlineArray":
+        """Build from an (n, >=11) numeric matrix in Binance column order, sorting by open time if needed."""
+        if len(matrix) == 0:
+            return cls.empty()
+        columns = {name: np.ascontiguousarray(matrix[:, position], dtype=dtype) for position, (name, dtype) in enumerate(KLINE_FIELDS)}
+        array = cls(columns)
+        open_time = columns["open_time"]
+        if np.any(open_time[1:] < open_time[:-1]):
+            order = np.argsort(open_time, kind="stable")
+            array = cls({name: column[order] for name, column in columns.items()})
+        return array
+
+    @classmethod
+    def from_rows(cls, rows: List[List[Any]]) -> "KlineArray":
+        """Parse raw Binance rows (numbers or decimal strings) in one NumPy conversion."""
+        if not rows:
+            return cls.empty()
+        return cls.from_matrix(np.array([row[:11] for row in rows], dtype=np.float64))
+
+    @classmethod
+    def concat(cls, arrays: List["KlineArray"]) -> "KlineArray":
+        """Join arrays end to end (callers keep them in open-time order)."""
+        arrays = [array for array in arrays if len(array)]
+        if not arrays:
+            return cls.empty()
+        if len(arrays) == 1:
+            return arrays[0]
+        return cls({name: np.concatenate([array.columns[name] for array in arrays]) for name in KLINE_COLUMNS})
+
+    @classmethod
+    def from_records(cls, records: np.ndarray) -> "KlineArray":
+        return cls({name: np.ascontiguousarray(records[name]) for name in KLINE_COLUMNS})
+
+    def to_records(self) -> np.ndarray:
+        records = np.empty(len(self), dtype=KLINE_DTYPE)
+        for name in KLINE_COLUMNS:
+            records[name] = self.columns[name]
+        return records
+
+    def to_rows(self) -> List[List[Any]]:
+        """Back to Binance row layout (decimal strings, trailing "0") for JSON storage."""
+        text = {name: np.char.mod("%.8f", self.columns[name]).tolist() for name, dtype in KLINE_FIELDS if dtype is np.float64}
+        ints = {name: self.columns[name].tolist() for name, dtype in KLINE_FIELDS if dtype is np.int64}
+        return [
+            [
+                ints["open_time"][i],
+                text["open"][i],
+                text["high"][i],
+                text["low"][i],
+                text["close"][i],
+                text["volume"][i],
+                ints["close_time"][i],
+                text["quote_asset_volume"][i],
+                ints["trade_count"][i],
+                text["taker_buy_base"][i],
+                text["taker_buy_quote"][i],
+                "0",
+            ]
+            for i in range(len(self))
+        ]
+
+    def to_frame(self, datetimes: bool = True) -> pd.DataFrame:
+        """Wrap the columns in a DataFrame sharing the same memory; timestamps become datetime64[ms] views."""
+        data = dict(self.columns)
+        if datetimes:
+            data["open_time"] = data["open_time"].view("datetime64[ms]")
+            data["close_time"] = data["close_time"].view("datetime64[ms]")
+        return pd.DataFrame(data, columns=KLINE_COLUMNS, copy=False)
+
+    def __len__(self) -> int:
+        return len(self.columns["open_time"])
+
+    def __getitem__(self, key: Union[int, slice]) -> Union[KlineRow, "KlineArray"]:
+        if isinstance(key, slice):
+            return KlineArray({name: column[key] for name, column in self.columns.items()})
+        if key < 0:
+            key += len(self)
+        if not 0 <= key < len(self):
+            raise IndexError("kline index out of range")
+        return KlineRow(self, key)
+
+    def __getattr__(self, name: str) -> np.ndarray:
+        if name in KLINE_DTYPE.names:
+            return self.columns[name]
+        raise AttributeError(name)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(column.nbytes for column in self.columns.values())
+
+    def first(self) -> Optional[KlineRow]:
+        return self[0] if len(self) else None
+
+    def last(self) -> Optional[KlineRow]:
+        return self[-1] if len(self) else None
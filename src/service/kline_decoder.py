@@ -0,0 +1,50 @@
+import json
+import warnings
+from typing import Any, Union
+
+import numpy as np
+
+from service.kline_array import KlineArray
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+KLINE_ROW_FIELDS = 12
+_STRUCTURAL = b'[]"'
+
+
+def loads(content: Union[bytes, str]) -> Any:
+    """Decode JSON with orjson when it is installed, else the standard library."""
+    if orjson is not None:
+        return orjson.loads(content)
+    return json.loads(content)
+
+
+def decode_kline_array(content: bytes) -> KlineArray:
+    """Decode a Binance kline array response straight into typed columns.
+
+    Every field of a kline response is a number, quoted or not, so dropping brackets and quotes
+    leaves a flat comma-separated list that NumPy parses in C in a single pass. Anything that does
+    not reshape into 12-field rows goes through the JSON decoder instead.
+    """
+    body = content.strip()
+    if body == b"[]":
+        return KlineArray.empty()
+
+    if body.startswith(b"[["):
+        # Malformed text makes NumPy warn (or raise, in newer releases) and return a partial parse.
+        with warnings.catch_warnings():
+            warnings.simplefilter("error", DeprecationWarning)
+            try:
+                values = np.fromstring(body.translate(None, _STRUCTURAL), dtype=np.float64, sep=",")
+            except (DeprecationWarning, ValueError):
+                values = np.empty(0)
+        if len(values) and len(values) % KLINE_ROW_FIELDS == 0 and body.count(b"[") == len(values) // KLINE_ROW_FIELDS + 1:
+            return KlineArray.from_matrix(values.reshape(-1, KLINE_ROW_FIELDS))
+
+    rows = loads(body.replace(b'"', b""))
+    if not isinstance(rows, list):
+        raise ValueError(f"Unexpected kline response: {content[:200]!r}")
+    return KlineArray.from_matrix(np.array(rows, dtype=np.float64).reshape(-1, KLINE_ROW_FIELDS))
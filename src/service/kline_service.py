@@ -1,9 +1,15 @@
 import json
 import logging
 from pathlib import Path
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Tuple
 from datetime import datetime
+import numpy as np
 from decorator.singleton import singleton
+from decorator.timed import timed
+from service.file_store import GenerationCache, atomic_write_json, file_lock, remove_file
+from service.intervals import TimeBound, to_epoch_ms
+from service.kline_array import KlineArray
+from service.kline_store import CHUNK_EXTENSION, CHUNK_ROWS, ChunkedKlineFile, append_chunked, write_chunked
 
 
 class KlineNotFoundError(Exception):
@@ -15,15 +21,50 @@ class KlineService:
     def __init__(self):
         self.data_dir = Path("data/kline")
         self.logger = logging.getLogger(__name__)
+        self._data_cache = GenerationCache()
+        self._array_cache = GenerationCache()
+        self._chunk_index_cache = GenerationCache()
+
+    def json_path(self, crypto_name: str) -> Path:
+        return self.data_dir / f"{crypto_name.lower()}.json"
+
+    def chunked_path(self, crypto_name: str) -> Path:
+        return self.data_dir / f"{crypto_name.lower()}{CHUNK_EXTENSION}"
+
+    def data_path(self, crypto_name: str) -> Path:
+        """Stored dataset file; a compacted ``.klc`` file takes precedence over JSON."""
+        chunked_path = self.chunked_path(crypto_name)
+        return chunked_path if chunked_path.exists() else self.json_path(crypto_name)
+
+    def is_chunked(self, crypto_name: str) -> bool:
+        return self.data_path(crypto_name).suffix == CHUNK_EXTENSION
+
+    def invalidate(self, crypto_name: Optional[str] = None) -> None:
+        for cache in (self._data_cache, self._array_cache, self._chunk_index_cache):
+            if crypto_name is None:
+                cache.invalidate()
+            else:
+                cache.invalidate(self.json_path(crypto_name))
+                cache.invalidate(self.chunked_path(crypto_name))
+
+    def _chunked_file(self, file_path: Path) -> ChunkedKlineFile:
+        return self._chunk_index_cache.get(file_path, ChunkedKlineFile)
 
     def get_kline_data(self, crypto_name: str) -> Dict[str, Any]:
+        """Parsed dataset file, cached until the file's generation changes. Treat the result as read-only."""
         crypto_name = crypto_name.lower()
-        file_path = self.data_dir / f"{crypto_name}.json"
+        file_path = self.data_path(crypto_name)
 
         if not file_path.exists():
             raise KlineNotFoundError(f"Kline data not found for {crypto_name.upper()}")
 
+        return self._data_cache.get(file_path, lambda path: self._read_kline_file(path, crypto_name))
+
+    @timed("kline.load")
+    def _read_kline_file(self, file_path: Path, crypto_name: str) -> Dict[str, Any]:
         try:
+            if file_path.suffix == CHUNK_EXTENSION:
+                return {**self._chunked_file(file_path).meta, "klines": self.get_kline_array(crypto_name).to_rows()}
             with open(file_path, "r", encoding="utf-8") as f:
                 data = json.load(f)
             self.logger.info(f"Loaded kline data for {crypto_name.upper()}")
@@ -36,83 +77,214 @@ class KlineService:
             raise
 
     def get_symbol(self, crypto_name: str) -> str:
-        data = self.get_kline_data(crypto_name)
+        data = self.get_kline_meta(crypto_name)
         return data["symbol"]
 
     def get_interval(self, crypto_name: str) -> str:
-        data = self.get_kline_data(crypto_name)
+        data = self.get_kline_meta(crypto_name)
         return data["interval"]
 
     def get_limit(self, crypto_name: str) -> int:
-        data = self.get_kline_data(crypto_name)
+        data = self.get_kline_meta(crypto_name)
         return data["limit"]
 
     def get_days_ago(self, crypto_name: str) -> Optional[int]:
-        data = self.get_kline_data(crypto_name)
+        data = self.get_kline_meta(crypto_name)
         return data.get("days_ago")
 
     def get_timestamp(self, crypto_name: str) -> str:
-        data = self.get_kline_data(crypto_name)
+        data = self.get_kline_meta(crypto_name)
         return data["timestamp"]
 
-    def get_klines(self, crypto_name: str) -> List[List[Any]]:
-        data = self.get_kline_data(crypto_name)
-        return data["klines"]
-
-    def get_kline_count(self, crypto_name: str) -> int:
-        klines = self.get_klines(crypto_name)
-        return len(klines)
+    def get_klines(self, crypto_name: str, start: TimeBound = None, end: TimeBound = None) -> List[List[Any]]:
+        """Raw kline rows, optionally limited to ``start <= open_time <= end``; see ``get_kline_array``."""
+        if start is None and end is None:
+            return self.get_kline_data(crypto_name)["klines"]
+        if self.is_chunked(crypto_name):
+            return self.get_kline_array(crypto_name, start, end).to_rows()
+
+        lo, hi = self._range_bounds(self.get_kline_array(crypto_name), start, end)
+        return self.get_kline_data(crypto_name)["klines"][lo:hi]
+
+    def get_kline_meta(self, crypto_name: str) -> Dict[str, Any]:
+        """Dataset header (symbol, interval, ...) without the klines; cheap for compacted files."""
+        file_path = self.data_path(crypto_name)
+        if file_path.suffix == CHUNK_EXTENSION:
+            return dict(self._chunked_file(file_path).meta)
+        return {key: value for key, value in self.get_kline_data(crypto_name).items() if key != "klines"}
+
+    @staticmethod
+    def _range_bounds(klines: KlineArray, start: TimeBound, end: TimeBound) -> Tuple[int, int]:
+        start_ms, end_ms = to_epoch_ms(start), to_epoch_ms(end)
+        lo = 0 if start_ms is None else int(np.searchsorted(klines.open_time, start_ms, side="left"))
+        hi = len(klines) if end_ms is None else int(np.searchsorted(klines.open_time, end_ms, side="right"))
+        return lo, max(lo, hi)
+
+    def get_kline_array(self, crypto_name: str, start: TimeBound = None, end: TimeBound = None) -> KlineArray:
+        """Columnar klines, optionally limited to ``start <= open_time <= end``.
+
+        Bounds are epoch ms, datetimes or ISO strings (naive = UTC). The range is found by binary search
+        over the sorted open times and returned as a view; for compacted files only the chunks
+        overlapping the range are decompressed.
+        """
+        file_path = self.data_path(crypto_name)
+        if not file_path.exists():
+            raise KlineNotFoundError(f"Kline data not found for {crypto_name.upper()}")
 
-    def get_price_range(self, crypto_name: str) -> Dict[str, float]:
-        klines = self.get_klines(crypto_name)
-        if not klines:
+        bounded = start is not None or end is not None
+        if file_path.suffix == CHUNK_EXTENSION:
+            if bounded and not self._array_cache.contains(file_path):
+                return self._chunked_file(file_path).read(to_epoch_ms(start), to_epoch_ms(end))
+            array = self._array_cache.get(file_path, lambda path: self._chunked_file(path).read())
+        else:
+            array = self._array_cache.get(file_path, lambda path: KlineArray.from_rows(self.get_klines(crypto_name)))
+
+        if not bounded:
+            return array
+        lo, hi = self._range_bounds(array, start, end)
+        return array[lo:hi]
+
+    def get_open_time_bounds(self, crypto_name: str) -> Optional[Tuple[int, int]]:
+        """First and last open time (epoch ms) without decompressing a compacted file; None when empty."""
+        file_path = self.data_path(crypto_name)
+        if not file_path.exists():
+            raise KlineNotFoundError(f"Kline data not found for {crypto_name.upper()}")
+        if file_path.suffix == CHUNK_EXTENSION:
+            chunks = self._chunked_file(file_path).chunks
+            return (chunks[0]["first_open_time"], chunks[-1]["last_open_time"]) if chunks else None
+        array = self.get_kline_array(crypto_name)
+        return (int(array.open_time[0]), int(array.open_time[-1])) if len(array) else None
+
+    def tail(self, crypto_name: str, n: int) -> KlineArray:
+        """The latest ``n`` klines; compacted files only decompress the trailing chunks."""
+        file_path = self.data_path(crypto_name)
+        if file_path.suffix == CHUNK_EXTENSION and not self._array_cache.contains(file_path):
+            return self._chunked_file(file_path).tail(n)
+        array = self.get_kline_array(crypto_name)
+        return array[max(0, len(array) - n) :]
+
+    def save_kline_data(self, crypto_name: str, data: Dict[str, Any]) -> Path:
+        """Write a dataset in the format it is already stored in (JSON unless it was compacted)."""
+        if self.is_chunked(crypto_name):
+            file_path = self.chunked_path(crypto_name)
+            write_chunked(file_path, data, KlineArray.from_rows(data["klines"]))
+        else:
+            file_path = self.json_path(crypto_name)
+            atomic_write_json(file_path, data)
+        return file_path
+
+    def append_klines(self, crypto_name: str, klines: KlineArray) -> Dict[str, Any]:
+        """Merge newer klines into a stored dataset and save it; returns the updated dataset header.
+
+        Stored rows from the first new open time on are replaced, so re-fetching a candle that was
+        still open when it was saved finalizes it. Holds the dataset's writer lock from read to write.
+        A JSON dataset is parsed and rewritten whole on every append, which grows with its history;
+        compacted datasets only re-encode their last chunk, so ``compact`` series that are appended
+        to continuously.
+        """
+        file_path = self.data_path(crypto_name)
+        with file_lock(file_path):
+            meta = self.get_kline_meta(crypto_name)
+            if not len(klines):
+                return meta
+            meta["timestamp"] = datetime.now().isoformat()
+            if file_path.suffix == CHUNK_EXTENSION:
+                stored = self._chunked_file(file_path)
+                meta["limit"] = len(stored) - len(stored.read(int(klines.open_time[0]))) + len(klines)
+                append_chunked(file_path, meta, klines)
+            else:
+                data = dict(self.get_kline_data(crypto_name))
+                cut = int(np.searchsorted(self.get_kline_array(crypto_name).open_time, int(klines.open_time[0]), side="left"))
+                data["klines"] = data["klines"][:cut] + klines.to_rows()
+                meta["limit"] = len(data["klines"])
+                atomic_write_json(file_path, {**data, **meta})
+        return meta
+
+    def compact(self, crypto_name: str, chunk_rows: int = CHUNK_ROWS) -> Dict[str, Any]:
+        """Convert a JSON dataset into the compressed chunked format and remove the JSON file."""
+        json_path = self.json_path(crypto_name)
+        chunked_path = self.chunked_path(crypto_name)
+        if not json_path.exists():
+            raise KlineNotFoundError(f"No JSON kline data to compact for {crypto_name.upper()}")
+
+        with file_lock(json_path):
+            json_size = json_path.stat().st_size
+            data = self._read_kline_file(json_path, crypto_name)
+            write_chunked(chunked_path, data, KlineArray.from_rows(data["klines"]), chunk_rows)
+            remove_file(json_path)
+        self.invalidate(crypto_name)
+
+        chunked_size = chunked_path.stat().st_size
+        return {"path": str(chunked_path), "klines": len(data["klines"]), "json_bytes": json_size, "chunked_bytes": chunked_size}
+
+    def expand(self, crypto_name: str) -> Dict[str, Any]:
+        """Convert a compacted dataset back to JSON."""
+        json_path = self.json_path(crypto_name)
+        chunked_path = self.chunked_path(crypto_name)
+        if not chunked_path.exists():
+            raise KlineNotFoundError(f"No compacted kline data for {crypto_name.upper()}")
+
+        with file_lock(chunked_path):
+            data = self.get_kline_data(crypto_name)
+            atomic_write_json(json_path, data)
+            remove_file(chunked_path)
+        self.invalidate(crypto_name)
+        return {"path": str(json_path), "klines": len(data["klines"]), "json_bytes": json_path.stat().st_size}
+
+    def get_kline_count(self, crypto_name: str, start: TimeBound = None, end: TimeBound = None) -> int:
+        return len(self.get_kline_array(crypto_name, start, end))
+
+    def get_price_range(self, crypto_name: str, start: TimeBound = None, end: TimeBound = None) -> Dict[str, float]:
+        return self._price_range(self.get_kline_array(crypto_name, start, end))
+
+    def get_volume_info(self, crypto_name: str, start: TimeBound = None, end: TimeBound = None) -> Dict[str, float]:
+        return self._volume_info(self.get_kline_array(crypto_name, start, end))
+
+    def get_latest_price(self, crypto_name: str, start: TimeBound = None, end: TimeBound = None) -> Dict[str, float]:
+        return self._price_at(self.get_kline_array(crypto_name, start, end), -1)
+
+    def get_first_price(self, crypto_name: str, start: TimeBound = None, end: TimeBound = None) -> Dict[str, float]:
+        return self._price_at(self.get_kline_array(crypto_name, start, end), 0)
+
+    def get_price_change(self, crypto_name: str, start: TimeBound = None, end: TimeBound = None) -> Dict[str, float]:
+        return self._price_change(self.get_kline_array(crypto_name, start, end))
+
+    def get_time_range(self, crypto_name: str, start: TimeBound = None, end: TimeBound = None) -> Dict[str, datetime]:
+        return self._time_range(self.get_kline_array(crypto_name, start, end))
+
+    @staticmethod
+    def _price_range(klines: KlineArray) -> Dict[str, float]:
+        if not len(klines):
             return {"high": 0.0, "low": 0.0}
 
-        highs = [float(kline[2]) for kline in klines]
-        lows = [float(kline[3]) for kline in klines]
+        return {"high": float(klines.high.max()), "low": float(klines.low.min())}
 
-        return {"high": max(highs), "low": min(lows)}
-
-    def get_volume_info(self, crypto_name: str) -> Dict[str, float]:
-        klines = self.get_klines(crypto_name)
-        if not klines:
+    @staticmethod
+    def _volume_info(klines: KlineArray) -> Dict[str, float]:
+        if not len(klines):
             return {"total": 0.0, "average": 0.0}
 
-        volumes = [float(kline[5]) for kline in klines]
-        total_volume = sum(volumes)
-        avg_volume = total_volume / len(volumes) if volumes else 0.0
+        total_volume = float(klines.volume.sum())
+        avg_volume = total_volume / len(klines)
 
         return {"total": total_volume, "average": avg_volume}
 
-    def get_latest_price(self, crypto_name: str) -> Dict[str, float]:
-        klines = self.get_klines(crypto_name)
-        if not klines:
-            return {"open": 0.0, "high": 0.0, "low": 0.0, "close": 0.0}
-
-        latest_kline = klines[-1]
-        return {
-            "open": float(latest_kline[1]),
-            "high": float(latest_kline[2]),
-            "low": float(latest_kline[3]),
-            "close": float(latest_kline[4]),
-        }
-
-    def get_first_price(self, crypto_name: str) -> Dict[str, float]:
-        klines = self.get_klines(crypto_name)
-        if not klines:
+    @staticmethod
+    def _price_at(klines: KlineArray, position: int) -> Dict[str, float]:
+        if not len(klines):
             return {"open": 0.0, "high": 0.0, "low": 0.0, "close": 0.0}
 
-        first_kline = klines[0]
+        kline = klines[position]
         return {
-            "open": float(first_kline[1]),
-            "high": float(first_kline[2]),
-            "low": float(first_kline[3]),
-            "close": float(first_kline[4]),
+            "open": kline.open,
+            "high": kline.high,
+            "low": kline.low,
+            "close": kline.close,
         }
 
-    def get_price_change(self, crypto_name: str) -> Dict[str, float]:
-        first_price = self.get_first_price(crypto_name)
-        latest_price = self.get_latest_price(crypto_name)
+    def _price_change(self, klines: KlineArray) -> Dict[str, float]:
+        first_price = self._price_at(klines, 0)
+        latest_price = self._price_at(klines, -1)
 
         if first_price["close"] == 0:
             return {"absolute": 0.0, "percentage": 0.0}
@@ -122,42 +294,40 @@ class KlineService:
 
         return {"absolute": absolute_change, "percentage": percentage_change}
 
-    def get_time_range(self, crypto_name: str) -> Dict[str, datetime]:
-        klines = self.get_klines(crypto_name)
-        if not klines:
+    @staticmethod
+    def _time_range(klines: KlineArray) -> Dict[str, datetime]:
+        if not len(klines):
             now = datetime.now()
             return {"start": now, "end": now}
 
-        start_timestamp = int(klines[0][0]) / 1000
-        end_timestamp = int(klines[-1][6]) / 1000
+        start_timestamp = klines[0].open_time / 1000
+        end_timestamp = klines[-1].close_time / 1000
 
         return {
             "start": datetime.fromtimestamp(start_timestamp),
             "end": datetime.fromtimestamp(end_timestamp),
         }
 
-    def get_summary(self, crypto_name: str) -> Dict[str, Any]:
-        data = self.get_kline_data(crypto_name)
-        price_range = self.get_price_range(crypto_name)
-        volume_info = self.get_volume_info(crypto_name)
-        latest_price = self.get_latest_price(crypto_name)
-        price_change = self.get_price_change(crypto_name)
-        time_range = self.get_time_range(crypto_name)
+    def get_summary(self, crypto_name: str, start: TimeBound = None, end: TimeBound = None) -> Dict[str, Any]:
+        """Summary statistics, over the whole series or only klines with ``start <= open_time <= end``."""
+        data = self.get_kline_meta(crypto_name)
+        klines = self.get_kline_array(crypto_name, start, end)
+        time_range = self._time_range(klines)
 
         return {
             "symbol": data["symbol"],
             "interval": data["interval"],
-            "kline_count": self.get_kline_count(crypto_name),
+            "kline_count": len(klines),
             "time_range": {
                 "start": time_range["start"].isoformat(),
                 "end": time_range["end"].isoformat(),
             },
             "price": {
-                "current": latest_price["close"],
-                "change": price_change,
-                "range": price_range,
+                "current": self._price_at(klines, -1)["close"],
+                "change": self._price_change(klines),
+                "range": self._price_range(klines),
             },
-            "volume": volume_info,
+            "volume": self._volume_info(klines),
             "data_timestamp": data["timestamp"],
         }
 
@@ -165,5 +335,5 @@ class KlineService:
         if not self.data_dir.exists():
             return []
 
-        crypto_files = list(self.data_dir.glob("*.json"))
-        return [f.stem.upper() for f in crypto_files]
+        crypto_files = list(self.data_dir.glob("*.json")) + list(self.data_dir.glob(f"*{CHUNK_EXTENSION}"))
+        return sorted({f.stem.upper() for f in crypto_files})
@@ -0,0 +1,188 @@
+import json
+import struct
+import zlib
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+import numpy as np
+
+from service.file_store import atomic_write
+from service.kline_array import KLINE_COLUMNS, KLINE_FIELDS, KlineArray
+
+# File layout: MAGIC | compressed chunk blocks ... | index JSON | index offset (<Q) | MAGIC
+MAGIC = b"KLC1"
+FOOTER = struct.Struct("<Q4s")
+CHUNK_EXTENSION = ".klc"
+CHUNK_ROWS = 16_384
+COMPRESSION_LEVEL = 6
+WORD = 8  # every kline column is a 64-bit value
+
+
+class KlineStoreError(Exception):
+    """Raised when a chunked kline file is malformed."""
+
+
+def _encode_chunk(array: KlineArray) -> bytes:
+    """Delta-encode timestamps, byte-shuffle the 64-bit words and zlib-compress the block.
+
+    Open times become deltas (a constant interval) and close times an offset from the open,
+    so both compress to almost nothing. Shuffling groups the n-th byte of every word together,
+    which lets zlib find the runs in sign/exponent bytes of prices and volumes.
+    """
+    columns = []
+    for name, dtype in KLINE_FIELDS:
+        column = array.columns[name]
+        if name == "open_time":
+            column = np.diff(column, prepend=np.int64(0))
+        elif name == "close_time":
+            column = column - array.columns["open_time"]
+        columns.append(np.ascontiguousarray(column, dtype=dtype).view(np.uint8))
+    words = np.concatenate(columns).reshape(-1, WORD)
+    return zlib.compress(np.ascontiguousarray(words.T).tobytes(), COMPRESSION_LEVEL)
+
+
+def _decode_chunk(block: bytes, rows: int) -> KlineArray:
+    raw = np.frombuffer(zlib.decompress(block), dtype=np.uint8)
+    words = np.ascontiguousarray(raw.reshape(WORD, -1).T)
+    if len(words) != rows * len(KLINE_FIELDS):
+        raise KlineStoreError(f"Chunk holds {len(words)} values, expected {rows * len(KLINE_FIELDS)}")
+
+    columns: Dict[str, np.ndarray] = {}
+    for position, (name, dtype) in enumerate(KLINE_FIELDS):
+        columns[name] = words[position * rows : (position + 1) * rows].reshape(-1).view(dtype)
+    columns["open_time"] = np.cumsum(columns["open_time"])
+    columns["close_time"] = columns["close_time"] + columns["open_time"]
+    return KlineArray(columns)
+
+
+def _write_file(
+    path: Union[str, Path],
+    meta: Dict[str, Any],
+    array: KlineArray,
+    chunk_rows: int,
+    source: Optional["ChunkedKlineFile"] = None,
+    keep_chunks: int = 0,
+) -> int:
+    """Write ``source``'s first ``keep_chunks`` blocks verbatim, then ``array`` as new chunks, plus the index."""
+    if chunk_rows <= 0:
+        raise KlineStoreError("chunk_rows must be positive")
+    meta = {key: value for key, value in meta.items() if key != "klines"}
+
+    def write(tmp_name: str) -> None:
+        chunks: List[Dict[str, Any]] = []
+        with open(tmp_name, "wb") as f:
+            f.write(MAGIC)
+            if keep_chunks:
+                with open(source.path, "rb") as src:
+                    for chunk in source.chunks[:keep_chunks]:
+                        src.seek(chunk["offset"])
+                        block = src.read(chunk["size"])
+                        chunks.append({**chunk, "offset": f.tell()})
+                        f.write(block)
+            for offset in range(0, len(array), chunk_rows):
+                chunk = array[offset : offset + chunk_rows]
+                block = _encode_chunk(chunk)
+                chunks.append(
+                    {
+                        "offset": f.tell(),
+                        "size": len(block),
+                        "rows": len(chunk),
+                        "first_open_time": int(chunk.open_time[0]),
+                        "last_open_time": int(chunk.open_time[-1]),
+                    }
+                )
+                f.write(block)
+
+            rows = sum(chunk["rows"] for chunk in chunks)
+            index = {"version": 1, "codec": "zlib+shuffle", "columns": KLINE_COLUMNS, "rows": rows, "chunk_rows": chunk_rows, "meta": meta, "chunks": chunks}
+            index_offset = f.tell()
+            f.write(json.dumps(index, separators=(",", ":")).encode("utf-8"))
+            f.write(FOOTER.pack(index_offset, MAGIC))
+
+    return atomic_write(path, write)
+
+
+def write_chunked(path: Union[str, Path], meta: Dict[str, Any], array: KlineArray, chunk_rows: int = CHUNK_ROWS) -> int:
+    """Atomically write ``array`` as compressed column chunks plus a chunk index. Returns the new generation."""
+    return _write_file(path, meta, array, chunk_rows)
+
+
+def append_chunked(path: Union[str, Path], meta: Dict[str, Any], array: KlineArray) -> int:
+    """Replace the stored rows from ``array``'s first open time on with ``array``. Returns the new generation.
+
+    Full chunks that end before that time are copied as compressed bytes; only the trailing partial
+    chunk and the new rows are decoded and re-encoded, so an append costs one chunk of compression
+    however long the history is.
+    """
+    source = ChunkedKlineFile(path)
+    first_open_time = int(array.open_time[0])
+    keep = int(np.searchsorted(source._last, first_open_time, side="left"))
+    while keep and source.chunks[keep - 1]["rows"] < source.chunk_rows:
+        keep -= 1
+    tail = source._read_chunks(range(keep, len(source.chunks)))
+    tail = tail[: int(np.searchsorted(tail.open_time, first_open_time, side="left"))]
+    return _write_file(path, meta, KlineArray.concat([tail, array]), source.chunk_rows, source, keep)
+
+
+class ChunkedKlineFile:
+    """Reader for ``.klc`` files: loads the chunk index once and decompresses only the chunks a query touches."""
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise KlineStoreError(f"{self.path} is not a chunked kline file")
+            f.seek(-FOOTER.size, 2)
+            index_offset, magic = FOOTER.unpack(f.read(FOOTER.size))
+            if magic != MAGIC:
+                raise KlineStoreError(f"{self.path} is truncated (missing footer)")
+            f.seek(index_offset)
+            index = json.loads(f.read()[: -FOOTER.size])
+
+        self.meta: Dict[str, Any] = index["meta"]
+        self.rows: int = index["rows"]
+        self.chunk_rows: int = index.get("chunk_rows", CHUNK_ROWS)
+        self.chunks: List[Dict[str, Any]] = index["chunks"]
+        self._first = np.array([chunk["first_open_time"] for chunk in self.chunks], dtype=np.int64)
+        self._last = np.array([chunk["last_open_time"] for chunk in self.chunks], dtype=np.int64)
+
+    def __len__(self) -> int:
+        return self.rows
+
+    def _chunk_span(self, start_time: Optional[int], end_time: Optional[int]) -> range:
+        first = 0 if start_time is None else int(np.searchsorted(self._last, start_time, side="left"))
+        last = len(self.chunks) if end_time is None else int(np.searchsorted(self._first, end_time, side="right"))
+        return range(first, max(first, last))
+
+    def _read_chunks(self, span: range) -> KlineArray:
+        if not len(span):
+            return KlineArray.empty()
+        parts = []
+        with open(self.path, "rb") as f:
+            for position in span:
+                chunk = self.chunks[position]
+                f.seek(chunk["offset"])
+                parts.append(_decode_chunk(f.read(chunk["size"]), chunk["rows"]))
+        if len(parts) == 1:
+            return parts[0]
+        return KlineArray({name: np.concatenate([part.columns[name] for part in parts]) for name in KLINE_COLUMNS})
+
+    def read(self, start_time: Optional[int] = None, end_time: Optional[int] = None) -> KlineArray:
+        """Klines with ``start_time <= open_time <= end_time`` (epoch ms, either bound optional)."""
+        array = self._read_chunks(self._chunk_span(start_time, end_time))
+        if start_time is None and end_time is None:
+            return array
+        lo = 0 if start_time is None else int(np.searchsorted(array.open_time, start_time, side="left"))
+        hi = len(array) if end_time is None else int(np.searchsorted(array.open_time, end_time, side="right"))
+        return array[lo:hi]
+
+    def tail(self, rows: int) -> KlineArray:
+        """Last ``rows`` klines, decompressing only the trailing chunks that hold them."""
+        if rows <= 0:
+            return KlineArray.empty()
+        covered, first = 0, len(self.chunks)
+        while first > 0 and covered < rows:
+            first -= 1
+            covered += self.chunks[first]["rows"]
+        array = self._read_chunks(range(first, len(self.chunks)))
+        return array[max(0, len(array) - rows) :]
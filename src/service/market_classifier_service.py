@@ -1,15 +1,26 @@
 import logging
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Optional, Union
 
 import numpy as np
-from joblib import dump, load
+import pandas as pd
+from joblib import load
+from sklearn.calibration import CalibratedClassifierCV
 from sklearn.ensemble import RandomForestClassifier
-from sklearn.metrics import classification_report, confusion_matrix
+from sklearn.metrics import classification_report, confusion_matrix, log_loss
 from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import StandardScaler
 
+try:
+    from sklearn.frozen import FrozenEstimator
+except ImportError:  # scikit-learn < 1.6 only supports cv="prefit"
+    FrozenEstimator = None
+
+from .feature_pipeline import FeaturePipeline
+from .file_store import GenerationCache, atomic_dump
+from .intervals import INTERVAL_MS, to_epoch_ms
+from .profiler_service import ProfilerService
 from .market_state_service import (
     MarketStateService,
     MarketModelNotFoundError,
@@ -17,6 +28,18 @@ from .market_state_service import (
 )
 
 
+# A warm-start update needs at least this many new labeled candles.
+MIN_WARM_START_SAMPLES = 50
+CALIBRATION_METHODS = ["none", "sigmoid", "isotonic"]
+# Share of the training split held out from the forest to fit the calibrator.
+CALIBRATION_FRACTION = 0.25
+# Forecasts featurize only this many trailing candles (plus warm-up); the newest has no label yet.
+# Window features come out exactly as on the full series. EMA features keep a residual of their seed
+# (relative differences around 1e-5 on 1m data), which is an approximation. Pipelines with cumulative
+# features featurize the full series instead.
+FORECAST_TAIL_ROWS = 8
+
+
 class ClassifierTrainingError(Exception):
     """Raised when the supervised classifier cannot be trained."""
 
@@ -31,6 +54,8 @@ class MarketClassifierService:
     def __init__(self):
         self.logger = logging.getLogger(__name__)
         self.state_service = MarketStateService()
+        self.profiler = ProfilerService()
+        self.model_cache = GenerationCache()
         self.models_dir = Path("models")
         self.models_dir.mkdir(parents=True, exist_ok=True)
 
@@ -44,37 +69,45 @@ class MarketClassifierService:
         random_state: int = 42,
         n_estimators: int = 200,
         max_depth: Optional[int] = None,
+        calibration: str = "none",
+        dtype: str = "float64",
     ) -> Dict[str, Any]:
+        if calibration not in CALIBRATION_METHODS:
+            raise ClassifierTrainingError(f"Unknown calibration method {calibration}; use one of {', '.join(CALIBRATION_METHODS)}")
         labeled_dataset = self.state_service.get_labeled_feature_dataset(crypto_name)
-        frame = labeled_dataset["frame"].copy()
+        frame = self._next_state_frame(labeled_dataset)
         feature_cols = labeled_dataset["feature_columns"]
         meta = labeled_dataset["meta"]
 
-        if frame["state"].isna().all():
-            raise ModelTrainingError("No market-state labels available. Train the clustering model first.")
-
-        frame["next_state"] = frame["state"].shift(-1)
-        frame = frame.dropna(subset=["next_state"])
         if frame.empty:
             raise ClassifierTrainingError("Not enough labeled samples to train the classifier.")
 
-        X = frame[feature_cols].values
+        # Scaled in place; the forest trains in float32 internally, so a float32 matrix also spares it a copy.
+        X_scaled = self.state_service.column_matrix(frame, feature_cols, dtype)
         y = frame["next_state"].astype(str).values
 
-        scaler = StandardScaler()
-        X_scaled = scaler.fit_transform(X)
+        scaler = StandardScaler(copy=False)
+        scaler.fit_transform(X_scaled)
+        scaler.set_params(copy=True)  # later callers' arrays must not be scaled in place
 
         stratify = y if len(np.unique(y)) > 1 else None
-        X_train, X_test, y_train, y_test = train_test_split(
-            X_scaled, y, test_size=test_size, random_state=random_state, stratify=stratify
-        )
+        X_train, X_test, y_train, y_test = train_test_split(X_scaled, y, test_size=test_size, random_state=random_state, stratify=stratify)
 
-        classifier = RandomForestClassifier(
-            n_estimators=n_estimators, max_depth=max_depth, random_state=random_state
-        )
-        classifier.fit(X_train, y_train)
+        X_fit, y_fit = X_train, y_train
+        if calibration != "none":
+            X_fit, X_cal, y_fit, y_cal = train_test_split(X_train, y_train, test_size=CALIBRATION_FRACTION, random_state=random_state, stratify=self._stratify(y_train))
+
+        classifier = RandomForestClassifier(n_estimators=n_estimators, max_depth=max_depth, random_state=random_state)
+        with self.profiler.stage("classifier.fit"):
+            classifier.fit(X_fit, y_fit)
 
-        train_accuracy = classifier.score(X_train, y_train)
+        calibrator = None
+        if calibration != "none":
+            with self.profiler.stage("classifier.calibrate"):
+                calibrator = self._calibrate(classifier, X_cal, y_cal, calibration)
+        calibration_report = self._calibration_report(classifier, calibrator, calibration, X_test, y_test)
+
+        train_accuracy = classifier.score(X_fit, y_fit)
         test_accuracy = classifier.score(X_test, y_test)
         y_pred = classifier.predict(X_test)
 
@@ -86,66 +119,285 @@ class MarketClassifierService:
             "interval": meta["interval"],
             "trained_at": datetime.utcnow().isoformat(),
             "feature_columns": feature_cols,
+            "feature_spec_hash": labeled_dataset["feature_spec_hash"],
             "scaler": scaler,
             "classifier": classifier,
+            "calibrator": calibrator,
+            "calibration": calibration_report,
             "classes": list(classifier.classes_),
             "train_accuracy": train_accuracy,
             "test_accuracy": test_accuracy,
             "classification_report": report,
             "confusion_matrix": matrix,
             "samples": len(frame),
+            "dtype": dtype,
+            "cluster_trained_at": labeled_dataset["model_payload"]["trained_at"],
+            "last_open_time": frame["open_time"].iloc[-1].isoformat(),
+            "updates": [{"trained_at": datetime.utcnow().isoformat(), "mode": "full", "samples": len(frame), "trees": n_estimators}],
         }
 
         path = self._model_path(meta["symbol"], meta["interval"])
-        dump(payload, path)
+        with self.profiler.stage("model.save"):
+            atomic_dump(payload, path)
 
         return {
             "symbol": meta["symbol"],
             "interval": meta["interval"],
+            "mode": "full",
             "train_accuracy": train_accuracy,
             "test_accuracy": test_accuracy,
             "classification_report": report,
             "confusion_matrix": matrix,
             "model_path": str(path),
             "samples": len(frame),
+            "trees": len(classifier.estimators_),
+            "calibration": calibration_report,
         }
 
-    def forecast_next_state(self, crypto_name: str) -> Dict[str, Any]:
-        labeled_dataset = self.state_service.get_labeled_feature_dataset(crypto_name)
-        feature_cols = labeled_dataset["feature_columns"]
-        frame = labeled_dataset["frame"]
-        meta = labeled_dataset["meta"]
+    @staticmethod
+    def _stratify(y: np.ndarray) -> Optional[np.ndarray]:
+        counts = np.unique(y, return_counts=True)[1]
+        return y if len(counts) > 1 and counts.min() >= 2 else None
+
+    @staticmethod
+    def _calibrate(classifier: RandomForestClassifier, X: np.ndarray, y: np.ndarray, method: str) -> CalibratedClassifierCV:
+        if set(y) != set(classifier.classes_):
+            raise ClassifierTrainingError(f"Calibration split has classes {sorted(set(y))}, forest has {list(classifier.classes_)}")
+        if FrozenEstimator is not None:
+            return CalibratedClassifierCV(FrozenEstimator(classifier), method=method).fit(X, y)
+        return CalibratedClassifierCV(classifier, method=method, cv="prefit").fit(X, y)
+
+    @staticmethod
+    def _calibration_report(
+        classifier: RandomForestClassifier,
+        calibrator: Optional[CalibratedClassifierCV],
+        method: str,
+        X_test: np.ndarray,
+        y_test: np.ndarray,
+    ) -> Dict[str, Any]:
+        """Log loss and multi-class Brier score on the test split, raw and (when fitted) calibrated."""
+        classes = classifier.classes_
+        onehot = (np.asarray(y_test, dtype=str)[:, None] == np.asarray(classes, dtype=str)[None, :]).astype(np.float64)
+        report: Dict[str, Any] = {"method": method}
+        for name, model in (("raw", classifier), ("calibrated", calibrator)):
+            if model is None:
+                continue
+            proba = model.predict_proba(X_test)
+            report[f"log_loss_{name}"] = float(log_loss(y_test, proba, labels=classes))
+            report[f"brier_{name}"] = float(np.mean(np.sum((proba - onehot) ** 2, axis=1)))
+        return report
+
+    @staticmethod
+    def _next_state_frame(labeled_dataset: Dict[str, Any]) -> pd.DataFrame:
+        frame = labeled_dataset["frame"].copy()
+        if frame["state"].isna().all():
+            raise ModelTrainingError("No market-state labels available. Train the clustering model first.")
 
+        frame["next_state"] = frame["state"].shift(-1)
+        return frame.dropna(subset=["next_state"])
+
+    def _full_retrain_reason(self, payload: Optional[Dict[str, Any]], labeled_dataset: Dict[str, Any]) -> Optional[str]:
+        if payload is None:
+            return "no classifier trained yet"
+        if "last_open_time" not in payload:
+            return "classifier predates warm-start training"
+        if payload.get("feature_spec_hash") != labeled_dataset["feature_spec_hash"]:
+            return "feature spec changed"
+        if payload.get("cluster_trained_at") != labeled_dataset["model_payload"]["trained_at"]:
+            return "clustering model was retrained, so state labels changed"
+        return None
+
+    def warm_start_classifier(
+        self,
+        crypto_name: str,
+        test_size: float = 0.2,
+        random_state: int = 42,
+        new_trees: int = 50,
+        max_trees: int = 200,
+        max_depth: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """Sliding-forest refresh: grow ``new_trees`` trees on candles labeled since the last update and retire the oldest.
+
+        Only the new window is featurized (with its warm-up history) and fitted, so the cost follows the
+        amount of new data. The stored scaler is reused, and the reported test accuracy is the previous
+        forest's accuracy on the new window. Falls back to ``train_classifier`` (with ``max_trees`` trees)
+        when the new window's classes differ from the forest's, or when labels or features changed.
+        """
+        meta = self.state_service.kline_service.get_kline_meta(crypto_name)
         path = self._model_path(meta["symbol"], meta["interval"])
+        payload = None
+        if path.exists():
+            with self.profiler.stage("model.load"):
+                payload = load(path)
+
+        start = to_epoch_ms(payload["last_open_time"]) + 1 if payload and "last_open_time" in payload else None
+        labeled_dataset = self.state_service.get_labeled_feature_dataset(crypto_name, start)
+        reason = self._full_retrain_reason(payload, labeled_dataset)
+        frame = self._next_state_frame(labeled_dataset) if reason is None else None
+
+        classifier: RandomForestClassifier = payload["classifier"] if payload else None
+        if reason is None and set(frame["next_state"].astype(str)) != set(classifier.classes_) and len(frame) >= MIN_WARM_START_SAMPLES:
+            reason = f"new window has classes {sorted(set(frame['next_state'].astype(str)))}, forest has {list(classifier.classes_)}"
+        if reason is not None:
+            self.logger.info(f"Full classifier retrain: {reason}")
+            calibration = (payload.get("calibration") or {}).get("method", "none") if payload else "none"
+            dtype = payload.get("dtype", "float64") if payload else "float64"
+            return self.train_classifier(crypto_name, test_size, random_state, max_trees, max_depth, calibration, dtype)
+
+        base = {"symbol": meta["symbol"], "interval": meta["interval"], "model_path": str(path), "trees": len(classifier.estimators_)}
+        if len(frame) < MIN_WARM_START_SAMPLES:
+            return {**base, "mode": "skipped", "samples": len(frame)}
+
+        X_scaled = payload["scaler"].transform(self.state_service.column_matrix(frame, payload["feature_columns"], payload.get("dtype", "float64")), copy=False)
+        y = frame["next_state"].astype(str).values
+
+        # Score the current forest on the window before it sees it: an honest out-of-sample check.
+        with self.profiler.stage("model.predict"):
+            y_pred = classifier.predict(X_scaled)
+        test_accuracy = float(np.mean(y_pred == y))
+        report = classification_report(y, y_pred, zero_division=0)
+        matrix = confusion_matrix(y, y_pred, labels=classifier.classes_).tolist()
+
+        # A calibrated forest is recalibrated on a stratified slice of the window the new trees do not see.
+        X_fit, y_fit, X_cal = X_scaled, y, None
+        if payload.get("calibrator") is not None and self._stratify(y) is not None:
+            X_fit, X_cal, y_fit, y_cal = train_test_split(X_scaled, y, test_size=CALIBRATION_FRACTION, random_state=random_state, stratify=y)
+
+        # Reseed per update so the new trees do not replay the bootstrap draws of retired ones.
+        classifier.set_params(warm_start=True, n_estimators=len(classifier.estimators_) + new_trees, random_state=random_state + len(payload["updates"]))
+        with self.profiler.stage("classifier.fit"):
+            classifier.fit(X_fit, y_fit)
+        classifier.estimators_ = classifier.estimators_[-max_trees:]
+        classifier.set_params(n_estimators=len(classifier.estimators_), warm_start=False)
+        if X_cal is not None:
+            with self.profiler.stage("classifier.calibrate"):
+                payload["calibrator"] = self._calibrate(classifier, X_cal, y_cal, payload["calibration"]["method"])
+
+        payload.update(
+            {
+                "trained_at": datetime.utcnow().isoformat(),
+                "classifier": classifier,
+                "train_accuracy": classifier.score(X_fit, y_fit),
+                "test_accuracy": test_accuracy,
+                "classification_report": report,
+                "confusion_matrix": matrix,
+                "samples": payload["samples"] + len(frame),
+                "last_open_time": frame["open_time"].iloc[-1].isoformat(),
+                "updates": payload["updates"] + [{"trained_at": datetime.utcnow().isoformat(), "mode": "warm_start", "samples": len(frame), "trees": new_trees}],
+            }
+        )
+        with self.profiler.stage("model.save"):
+            atomic_dump(payload, path)
+
+        return {
+            **base,
+            "mode": "warm_start",
+            "train_accuracy": payload["train_accuracy"],
+            "test_accuracy": test_accuracy,
+            "classification_report": report,
+            "confusion_matrix": matrix,
+            "samples": len(frame),
+            "trees": len(classifier.estimators_),
+        }
+
+    def _load_payload(self, symbol: str, interval: str) -> Dict[str, Any]:
+        path = self._model_path(symbol, interval)
         if not path.exists():
-            raise ClassifierModelNotFoundError(
-                f"No trained classifier model found for {meta['symbol']} ({meta['interval']})."
-            )
+            raise ClassifierModelNotFoundError(f"No trained classifier model found for {symbol} ({interval}).")
+        with self.profiler.stage("model.load"):
+            return self.model_cache.get(path, load)
 
-        if frame.empty:
-            raise ClassifierTrainingError("No feature data available for forecasting.")
+    def predict_proba_batch(self, payload: Dict[str, Any], features: Union[np.ndarray, pd.DataFrame], calibrated: bool = True) -> Dict[str, Any]:
+        """Score many feature rows in one vectorized call.
+
+        ``features`` is an (n, n_features) array in ``payload["feature_columns"]`` order, or a frame holding
+        those columns. Returns ``classes``, the (n, n_classes) ``probabilities`` array and the ``predicted``
+        label per row; calibrated probabilities are used when the model has a calibrator.
+        """
+        if isinstance(features, pd.DataFrame):
+            features = features[payload["feature_columns"]].to_numpy(dtype=np.float64)
+        X = np.atleast_2d(np.asarray(features, dtype=np.float64))
+        if X.shape[1] != len(payload["feature_columns"]):
+            raise ValueError(f"Expected {len(payload['feature_columns'])} feature columns, got {X.shape[1]}")
+
+        model = payload.get("calibrator") if calibrated else None
+        model = model if model is not None else payload["classifier"]
+        with self.profiler.stage("model.predict"):
+            probabilities = model.predict_proba(payload["scaler"].transform(X))
+        classes = np.asarray(model.classes_)
+        return {
+            "classes": classes,
+            "probabilities": probabilities,
+            "predicted": classes[probabilities.argmax(axis=1)],
+            "calibrated": model is not payload["classifier"],
+        }
 
-        payload = load(path)
-        scaler: StandardScaler = payload["scaler"]
-        classifier: RandomForestClassifier = payload["classifier"]
+    def latest_features(self, crypto_name: str) -> Dict[str, Any]:
+        """Dataset meta, classifier payload and the latest labeled feature row; reusable across forecasts."""
+        meta = self.state_service.kline_service.get_kline_meta(crypto_name)
+        start = None
+        state_payload = self.state_service.load_model(meta["symbol"], meta["interval"])
+        pipeline = FeaturePipeline(self.state_service._payload_feature_specs(state_payload))
+        if meta["interval"] in INTERVAL_MS and pipeline.history_dependence != "cumulative":
+            bounds = self.state_service.kline_service.get_open_time_bounds(crypto_name)
+            start = bounds[1] - FORECAST_TAIL_ROWS * INTERVAL_MS[meta["interval"]] if bounds else None
+        labeled_dataset = self.state_service.get_labeled_feature_dataset(crypto_name, start)
+        if start is not None and labeled_dataset["frame"].empty:
+            # A gap swallowed the tail window; fall back to the whole series.
+            labeled_dataset = self.state_service.get_labeled_feature_dataset(crypto_name)
+        payload = self._load_payload(meta["symbol"], meta["interval"])
 
-        latest = frame.iloc[-1]
-        latest_features = latest[feature_cols].values.reshape(1, -1)
-        latest_scaled = scaler.transform(latest_features)
+        if labeled_dataset["frame"].empty:
+            raise ClassifierTrainingError("No feature data available for forecasting.")
+        if payload.get("feature_spec_hash", labeled_dataset["feature_spec_hash"]) != labeled_dataset["feature_spec_hash"]:
+            raise ClassifierTrainingError("The clustering model now uses a different feature spec. Retrain the classifier.")
+        return {"meta": meta, "payload": payload, "latest": labeled_dataset["frame"].iloc[-1]}
 
-        prediction = classifier.predict(latest_scaled)[0]
+    def forecast_next_state(self, crypto_name: str, calibrated: bool = True, context: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        context = context or self.latest_features(crypto_name)
+        meta, payload, latest = context["meta"], context["payload"], context["latest"]
+        feature_cols = payload["feature_columns"]
 
-        proba = {}
-        if hasattr(classifier, "predict_proba"):
-            probabilities = classifier.predict_proba(latest_scaled)[0]
-            proba = {label: float(prob) for label, prob in zip(payload["classes"], probabilities)}
+        batch = self.predict_proba_batch(payload, latest[feature_cols].to_numpy(dtype=np.float64), calibrated)
+        proba = {str(label): float(prob) for label, prob in zip(batch["classes"], batch["probabilities"][0])}
 
         return {
             "symbol": meta["symbol"],
             "interval": meta["interval"],
             "prediction_timestamp": latest["open_time"].isoformat(),
-            "predicted_state": prediction,
+            "predicted_state": str(batch["predicted"][0]),
             "state_probabilities": proba,
-            "model_path": str(path),
+            "calibrated": batch["calibrated"],
+            "model_path": str(self._model_path(meta["symbol"], meta["interval"])),
             "latest_features": {col: float(latest[col]) for col in feature_cols},
         }
+
+    def scenario_forecast(
+        self,
+        crypto_name: str,
+        shocks: np.ndarray,
+        relative: bool = True,
+        calibrated: bool = True,
+        context: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        """Forecast N what-if variants of the latest feature vector in one batch.
+
+        ``shocks`` is (n, n_features): each scenario is ``latest * (1 + shock)`` when ``relative``, else
+        ``latest + shock``. Pass the ``context`` from ``latest_features`` (as used for ``forecast_next_state``)
+        to skip recomputing features; the scenarios then cost a single forest pass.
+        """
+        context = context or self.latest_features(crypto_name)
+        payload, latest = context["payload"], context["latest"]
+        base = latest[payload["feature_columns"]].to_numpy(dtype=np.float64)
+
+        shocks = np.atleast_2d(np.asarray(shocks, dtype=np.float64))
+        scenarios = base * (1 + shocks) if relative else base + shocks
+        batch = self.predict_proba_batch(payload, scenarios, calibrated)
+        return {
+            "symbol": context["meta"]["symbol"],
+            "interval": context["meta"]["interval"],
+            "prediction_timestamp": latest["open_time"].isoformat(),
+            "base_features": base,
+            "scenarios": scenarios,
+            **batch,
+        }
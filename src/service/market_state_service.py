@@ -1,16 +1,28 @@
+import json
 import logging
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Mapping, Optional
 
 import numpy as np
 import pandas as pd
-from joblib import dump, load
+from joblib import load
 from sklearn.cluster import KMeans
 from sklearn.metrics import silhouette_score
 from sklearn.preprocessing import StandardScaler
 
+
+from .feature_pipeline import DEFAULT_FEATURE_SPECS, FeaturePipeline
+from .cluster_drift import OnlineClusterStats
+from .file_store import GenerationCache, atomic_dump, atomic_write_json, file_lock
+from .gap_service import GapService
+from .intervals import INTERVAL_MS, TimeBound, to_epoch_ms
 from .kline_service import KlineService, KlineNotFoundError
+from .profiler_service import ProfilerService
+
+
+# Training matrices can be built in float32 to halve their memory; indicators are still computed in float64.
+TRAINING_DTYPES = {"float64": np.float64, "float32": np.float32}
 
 
 class ModelTrainingError(Exception):
@@ -27,100 +39,177 @@ class MarketStateService:
     def __init__(self):
         self.logger = logging.getLogger(__name__)
         self.kline_service = KlineService()
+        self.profiler = ProfilerService()
+        self.model_cache = GenerationCache()
         self.models_dir = Path("models")
         self.models_dir.mkdir(parents=True, exist_ok=True)
 
     def _model_path(self, symbol: str, interval: str) -> Path:
         return self.models_dir / f"{symbol.lower()}_{interval}.joblib"
 
-    def _load_dataframe(self, crypto_name: str) -> Dict[str, Any]:
-        data = self.kline_service.get_kline_data(crypto_name)
-        columns = [
-            "open_time",
-            "open",
-            "high",
-            "low",
-            "close",
-            "volume",
-            "close_time",
-            "quote_asset_volume",
-            "trade_count",
-            "taker_buy_base",
-            "taker_buy_quote",
-            "ignore",
-        ]
-        frame = pd.DataFrame(data["klines"], columns=columns)
-        numeric_cols = [
-            "open",
-            "high",
-            "low",
-            "close",
-            "volume",
-            "quote_asset_volume",
-            "taker_buy_base",
-            "taker_buy_quote",
-        ]
-        for col in numeric_cols:
-            frame[col] = frame[col].astype(float)
-
-        frame["open_time"] = pd.to_datetime(frame["open_time"], unit="ms")
-        frame["close_time"] = pd.to_datetime(frame["close_time"], unit="ms")
-        frame.sort_values("open_time", inplace=True)
-        frame.reset_index(drop=True, inplace=True)
+    def load_model(self, symbol: str, interval: str) -> Dict[str, Any]:
+        """Trained model payload, cached until the model file is rewritten."""
+        path = self._model_path(symbol, interval)
+        if not path.exists():
+            raise MarketModelNotFoundError(f"No trained model found for {symbol} ({interval}).")
+        with self.profiler.stage("model.load"):
+            return self.model_cache.get(path, load)
+
+    def _online_state_path(self, symbol: str, interval: str) -> Path:
+        return self.models_dir / f"{symbol.lower()}_{interval}_online.json"
+
+    def _load_dataframe(
+        self,
+        crypto_name: str,
+        start: TimeBound = None,
+        end: TimeBound = None,
+        feature_specs: Optional[List[Dict[str, Any]]] = None,
+    ) -> Dict[str, Any]:
+        """Load klines as a frame; with ``start`` the pipeline's warm-up history before it is loaded as well."""
+        data = self.kline_service.get_kline_meta(crypto_name)
+        load_start = to_epoch_ms(start)
+        if load_start is not None and data["interval"] in INTERVAL_MS:
+            load_start -= FeaturePipeline(feature_specs).warmup_rows(data["interval"]) * INTERVAL_MS[data["interval"]]
+        klines = self.kline_service.get_kline_array(crypto_name, load_start, end)
+        with self.profiler.stage("features.dataframe_build"):
+            frame = klines.to_frame()
+        self.profiler.count("features.rows", len(frame))
+
+        if data["interval"] in INTERVAL_MS:
+            scan = GapService().scan_open_times(frame["open_time"].to_numpy("datetime64[ms]").astype(np.int64), INTERVAL_MS[data["interval"]])
+            if scan["gaps"]:
+                self.logger.warning(f"{crypto_name.upper()} has {len(scan['gaps'])} gaps ({scan['missing']} klines); rolling features span them")
         return {"data": data, "frame": frame}
 
-    def prepare_feature_dataset(self, crypto_name: str) -> Dict[str, Any]:
-        dataset = self._load_dataframe(crypto_name)
-        feature_payload = self._compute_features(dataset["frame"])
+    def prepare_feature_dataset(
+        self,
+        crypto_name: str,
+        feature_specs: Optional[List[Dict[str, Any]]] = None,
+        start: TimeBound = None,
+        end: TimeBound = None,
+    ) -> Dict[str, Any]:
+        dataset = self._load_dataframe(crypto_name, start, end, feature_specs)
+        feature_payload = self._compute_features(dataset["frame"], dataset["data"]["interval"], feature_specs, start)
         return {
             "meta": dataset["data"],
             "frame": feature_payload["frame"],
             "columns": feature_payload["columns"],
+            "feature_specs": feature_payload["feature_specs"],
+            "feature_spec_hash": feature_payload["feature_spec_hash"],
         }
 
     @staticmethod
-    def _compute_features(frame: pd.DataFrame) -> Dict[str, Any]:
-        df = frame.copy()
-        df["return"] = df["close"].pct_change()
-        df["volatility_7"] = df["return"].rolling(7).std()
-        df["volatility_14"] = df["return"].rolling(14).std()
-        df["ma_7"] = df["close"].rolling(7).mean()
-        df["ma_14"] = df["close"].rolling(14).mean()
-        df["ma_50"] = df["close"].rolling(50).mean()
-        df["ma_slope"] = df["ma_7"] - df["ma_14"]
-
-        delta = df["close"].diff()
-        gain = delta.clip(lower=0)
-        loss = -delta.clip(upper=0)
-        avg_gain = gain.rolling(14).mean()
-        avg_loss = loss.rolling(14).mean()
-        rs = avg_gain / avg_loss
-        df["rsi_14"] = 100 - (100 / (1 + rs))
-
-        ema12 = df["close"].ewm(span=12, adjust=False).mean()
-        ema26 = df["close"].ewm(span=26, adjust=False).mean()
-        df["macd"] = ema12 - ema26
-        df["macd_signal"] = df["macd"].ewm(span=9, adjust=False).mean()
-
-        df["volume_change"] = df["volume"].pct_change()
-        df["future_return_1"] = df["close"].shift(-1) / df["close"] - 1
-
-        feature_cols = [
-            "return",
-            "volatility_7",
-            "volatility_14",
-            "ma_7",
-            "ma_14",
-            "ma_50",
-            "ma_slope",
-            "rsi_14",
-            "macd",
-            "macd_signal",
-            "volume_change",
-        ]
-
-        feature_frame = df[["open_time", "close", "future_return_1"] + feature_cols].dropna()
-        return {"frame": feature_frame, "columns": feature_cols}
+    def column_matrix(columns: Mapping[str, Any], names: List[str], dtype: str = "float64", mask: Optional[np.ndarray] = None) -> np.ndarray:
+        """Stack ``columns[name]`` for ``names`` (rows selected by ``mask``) into one C-ordered ``dtype`` matrix.
+
+        Columns are cast one at a time into the preallocated result, so the selection never exists as a
+        float64 block first.
+        """
+        if dtype not in TRAINING_DTYPES:
+            raise ModelTrainingError(f"Unsupported training dtype {dtype}; use one of {', '.join(TRAINING_DTYPES)}")
+        rows = len(columns[names[0]]) if mask is None else int(np.count_nonzero(mask))
+        matrix = np.empty((rows, len(names)), dtype=TRAINING_DTYPES[dtype])
+        for position, name in enumerate(names):
+            values = np.asarray(columns[name])
+            matrix[:, position] = values if mask is None else values[mask]
+        return matrix
+
+    def predict_clusters(self, model_payload: Dict[str, Any], columns: Mapping[str, Any], mask: np.ndarray) -> np.ndarray:
+        """KMeans cluster of each row selected by ``mask`` (from ``_select_feature_rows``), in row order."""
+        if not mask.any():
+            return np.empty(0, dtype=np.int64)
+        X = self.column_matrix(columns, model_payload["feature_columns"], mask=mask)
+        with self.profiler.stage("model.predict"):
+            return model_payload["model"].predict(model_payload["scaler"].transform(X))
+
+    def prepare_training_matrix(
+        self,
+        crypto_name: str,
+        feature_specs: Optional[List[Dict[str, Any]]] = None,
+        start: TimeBound = None,
+        end: TimeBound = None,
+        dtype: str = "float64",
+    ) -> Dict[str, Any]:
+        """The rows of ``prepare_feature_dataset`` as a ``dtype`` feature matrix plus open times and future returns.
+
+        Feature columns go straight from the pipeline into the matrix, skipping the concatenated frame
+        and the ``.values`` copy of it.
+        """
+        dataset = self._load_dataframe(crypto_name, start, end, feature_specs)
+        rows = self._select_feature_rows(dataset["frame"], dataset["data"]["interval"], feature_specs, start)
+        pipeline, valid = rows["pipeline"], rows["valid"]
+
+        with self.profiler.stage("features.matrix"):
+            X = self.column_matrix(rows["columns"], pipeline.columns, dtype, valid)
+        return {
+            "meta": dataset["data"],
+            "X": X,
+            "open_time": rows["open_time"][valid],
+            "future_return_1": rows["future_return"][valid],
+            "columns": pipeline.columns,
+            "feature_specs": pipeline.specs,
+            "feature_spec_hash": pipeline.spec_hash,
+        }
+
+    def _select_feature_rows(
+        self,
+        frame: pd.DataFrame,
+        source_interval: Optional[str],
+        feature_specs: Optional[List[Dict[str, Any]]],
+        start: TimeBound = None,
+        require_future_return: bool = True,
+    ) -> Dict[str, Any]:
+        """Compute the feature columns of ``frame`` and the mask of rows usable from ``start`` on.
+
+        A row is valid when every feature is present and, with ``require_future_return``, the next
+        candle's return is known; rows before ``start`` are warm-up history. Training, the labeled
+        dataset and state assignment all select their rows here.
+        """
+        pipeline = FeaturePipeline(feature_specs)
+        with self.profiler.stage("features.compute"):
+            columns = pipeline.compute_columns(frame, source_interval)
+
+        close = frame["close"].to_numpy()
+        future_return = np.full(len(close), np.nan)
+        future_return[:-1] = close[1:] / close[:-1] - 1
+        open_time = frame["open_time"].to_numpy("datetime64[ms]").astype(np.int64)
+
+        valid = ~np.isnan(future_return) if require_future_return else np.ones(len(frame), dtype=bool)
+        for values in columns.values():
+            valid &= values.notna().to_numpy()
+        start_ms = to_epoch_ms(start)
+        if start_ms is not None:
+            valid &= open_time >= start_ms
+        return {"pipeline": pipeline, "columns": columns, "valid": valid, "open_time": open_time, "future_return": future_return}
+
+    def _compute_features(
+        self,
+        frame: pd.DataFrame,
+        source_interval: Optional[str] = None,
+        feature_specs: Optional[List[Dict[str, Any]]] = None,
+        start: TimeBound = None,
+    ) -> Dict[str, Any]:
+        rows = self._select_feature_rows(frame, source_interval, feature_specs, start)
+        pipeline, valid = rows["pipeline"], rows["valid"]
+        feature_frame = pd.concat(
+            [
+                frame.loc[valid, ["open_time", "close"]],
+                pd.Series(rows["future_return"][valid], index=frame.index[valid], name="future_return_1"),
+                pd.DataFrame({name: values[valid] for name, values in rows["columns"].items()}),
+            ],
+            axis=1,
+        )
+        return {
+            "frame": feature_frame,
+            "columns": pipeline.columns,
+            "feature_specs": pipeline.specs,
+            "feature_spec_hash": pipeline.spec_hash,
+        }
+
+    @staticmethod
+    def _payload_feature_specs(model_payload: Dict[str, Any]) -> List[Dict[str, Any]]:
+        # Models saved before feature specs were configurable used the default set.
+        return model_payload.get("feature_specs", DEFAULT_FEATURE_SPECS)
 
     @staticmethod
     def _assign_labels(cluster_returns: Dict[int, float]) -> Dict[int, str]:
@@ -146,9 +235,7 @@ class MarketStateService:
 
         return labels
 
-    def _resolve_cluster_count(
-        self, X: np.ndarray, forced_clusters: Optional[int], min_clusters: int, max_clusters: int
-    ) -> int:
+    def _resolve_cluster_count(self, X: np.ndarray, forced_clusters: Optional[int], min_clusters: int, max_clusters: int) -> int:
         sample_count = len(X)
         if sample_count < 2:
             raise ModelTrainingError("Need at least two samples to train KMeans.")
@@ -185,26 +272,37 @@ class MarketStateService:
         n_clusters: Optional[int] = None,
         min_clusters: int = 2,
         max_clusters: int = 6,
+        feature_specs: Optional[List[Dict[str, Any]]] = None,
+        start: TimeBound = None,
+        end: TimeBound = None,
+        dtype: str = "float64",
     ) -> Dict[str, Any]:
-        feature_dataset = self.prepare_feature_dataset(crypto_name)
+        """Fit the scaler and KMeans; ``dtype="float32"`` halves the training matrix (scaled in place either way)."""
+        feature_dataset = self.prepare_training_matrix(crypto_name, feature_specs, start, end, dtype)
         meta = feature_dataset["meta"]
-        feature_frame = feature_dataset["frame"]
         feature_cols = feature_dataset["columns"]
+        X_scaled = feature_dataset["X"]
 
-        if feature_frame.empty:
+        if not len(X_scaled):
             raise ModelTrainingError("Not enough data to compute features for training.")
 
-        X = feature_frame[feature_cols].values
-        scaler = StandardScaler()
-        X_scaled = scaler.fit_transform(X)
-        cluster_count = self._resolve_cluster_count(X_scaled, n_clusters, min_clusters, max_clusters)
+        scaler = StandardScaler(copy=False)
+        scaler.fit_transform(X_scaled)
+        scaler.set_params(copy=True)  # later callers' arrays must not be scaled in place
+        with self.profiler.stage("train.cluster_search"):
+            cluster_count = self._resolve_cluster_count(X_scaled, n_clusters, min_clusters, max_clusters)
 
         model = KMeans(n_clusters=cluster_count, n_init=10, random_state=42)
-        labels = model.fit_predict(X_scaled)
-        feature_frame = feature_frame.assign(cluster=labels)
+        with self.profiler.stage("train.kmeans_fit"):
+            labels = model.fit_predict(X_scaled)
+        distances = model.transform(X_scaled)[np.arange(len(labels)), labels]
+        # Served in float64: KMeans cannot predict float64 features with float32 centroids.
+        model.cluster_centers_ = model.cluster_centers_.astype(np.float64)
 
-        cluster_returns = feature_frame.groupby("cluster")["future_return_1"].mean().to_dict()
+        cluster_returns = pd.Series(feature_dataset["future_return_1"]).groupby(labels).mean().to_dict()
         cluster_labels = self._assign_labels(cluster_returns)
+        open_time = feature_dataset["open_time"]
+        training_range = {"start": pd.Timestamp(open_time[0], unit="ms").isoformat(), "end": pd.Timestamp(open_time[-1], unit="ms").isoformat()}
 
         model_payload = {
             "symbol": meta["symbol"],
@@ -212,15 +310,24 @@ class MarketStateService:
             "trained_at": datetime.utcnow().isoformat(),
             "n_clusters": cluster_count,
             "feature_columns": feature_cols,
+            "feature_specs": feature_dataset["feature_specs"],
+            "feature_spec_hash": feature_dataset["feature_spec_hash"],
             "scaler": scaler,
             "model": model,
             "cluster_returns": cluster_returns,
             "cluster_labels": cluster_labels,
-            "samples": len(feature_frame),
+            "samples": len(X_scaled),
+            "dtype": dtype,
+            "training_range": training_range,
+            "training_stats": {
+                "cluster_counts": np.bincount(labels, minlength=cluster_count).tolist(),
+                "mean_distance": float(distances.mean()),
+            },
         }
 
         path = self._model_path(meta["symbol"], meta["interval"])
-        dump(model_payload, path)
+        with self.profiler.stage("model.save"):
+            atomic_dump(model_payload, path)
 
         return {
             "symbol": meta["symbol"],
@@ -228,22 +335,23 @@ class MarketStateService:
             "n_clusters": cluster_count,
             "cluster_labels": cluster_labels,
             "cluster_returns": cluster_returns,
+            "feature_columns": feature_cols,
+            "feature_spec_hash": feature_dataset["feature_spec_hash"],
             "model_path": str(path),
-            "samples": len(feature_frame),
+            "samples": len(X_scaled),
+            "dtype": dtype,
+            "training_range": training_range,
         }
 
-    def get_labeled_feature_dataset(self, crypto_name: str) -> Dict[str, Any]:
-        feature_dataset = self.prepare_feature_dataset(crypto_name)
-        meta = feature_dataset["meta"]
-        feature_frame = feature_dataset["frame"]
-        feature_cols = feature_dataset["columns"]
-
+    def get_labeled_feature_dataset(self, crypto_name: str, start: TimeBound = None, end: TimeBound = None) -> Dict[str, Any]:
+        meta = self.kline_service.get_kline_meta(crypto_name)
         path = self._model_path(meta["symbol"], meta["interval"])
-
-        if not path.exists():
-            raise MarketModelNotFoundError(f"No trained model found for {meta['symbol']} ({meta['interval']}).")
-
-        model_payload = load(path)
+        model_payload = self.load_model(meta["symbol"], meta["interval"])
+        feature_specs = self._payload_feature_specs(model_payload)
+        dataset = self._load_dataframe(crypto_name, start, end, feature_specs)
+        feature_payload = self._compute_features(dataset["frame"], meta["interval"], feature_specs, start)
+        feature_frame = feature_payload["frame"]
+        feature_cols = feature_payload["columns"]
 
         if feature_frame.empty:
             raise ModelTrainingError("Not enough data to compute features for prediction.")
@@ -251,8 +359,9 @@ class MarketStateService:
         scaler: StandardScaler = model_payload["scaler"]
         model: KMeans = model_payload["model"]
 
-        X_scaled = scaler.transform(feature_frame[feature_cols].values)
-        predictions = model.predict(X_scaled)
+        with self.profiler.stage("model.predict"):
+            X_scaled = scaler.transform(feature_frame[feature_cols].values)
+            predictions = model.predict(X_scaled)
         feature_frame = feature_frame.assign(cluster=predictions)
 
         cluster_labels = model_payload.get("cluster_labels", {})
@@ -262,13 +371,33 @@ class MarketStateService:
             "meta": meta,
             "frame": feature_frame,
             "feature_columns": feature_cols,
+            "feature_spec_hash": feature_payload["feature_spec_hash"],
             "cluster_labels": cluster_labels,
             "model_payload": model_payload,
             "model_path": str(path),
         }
 
-    def predict_market_state(self, crypto_name: str) -> Dict[str, Any]:
-        labeled_dataset = self.get_labeled_feature_dataset(crypto_name)
+    def assign_states(self, crypto_name: str, start: TimeBound = None, end: TimeBound = None) -> Dict[str, Any]:
+        """State of every candle with complete features, the latest included (it needs no future return)."""
+        meta = self.kline_service.get_kline_meta(crypto_name)
+        model_payload = self.load_model(meta["symbol"], meta["interval"])
+        feature_specs = self._payload_feature_specs(model_payload)
+        dataset = self._load_dataframe(crypto_name, start, end, feature_specs)
+        rows = self._select_feature_rows(dataset["frame"], meta["interval"], feature_specs, start, require_future_return=False)
+        valid = rows["valid"]
+
+        clusters = self.predict_clusters(model_payload, rows["columns"], valid)
+        cluster_labels = model_payload.get("cluster_labels", {})
+        return {
+            "meta": meta,
+            "open_time": rows["open_time"][valid],
+            "cluster": clusters,
+            "state": np.array([cluster_labels.get(int(cluster), "Unknown") for cluster in clusters], dtype=object),
+            "trained_at": model_payload["trained_at"],
+        }
+
+    def predict_market_state(self, crypto_name: str, start: TimeBound = None, end: TimeBound = None) -> Dict[str, Any]:
+        labeled_dataset = self.get_labeled_feature_dataset(crypto_name, start, end)
         feature_frame = labeled_dataset["frame"]
         feature_cols = labeled_dataset["feature_columns"]
         meta = labeled_dataset["meta"]
@@ -293,3 +422,81 @@ class MarketStateService:
             "state_distribution": state_counts,
             "model_path": labeled_dataset["model_path"],
         }
+
+    def _load_online_stats(self, path: Path, model_payload: Dict[str, Any]) -> OnlineClusterStats:
+        if path.exists():
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("trained_at") == model_payload["trained_at"]:
+                return OnlineClusterStats.from_dict(data)
+            self.logger.info("Model was retrained; resetting online statistics")
+        return OnlineClusterStats.from_model(model_payload)
+
+    def update_online_state(self, crypto_name: str) -> Dict[str, Any]:
+        """Assign only the candles that arrived since the last call and update running drift statistics.
+
+        Features are computed for the new candles plus the pipeline's warm-up history, so the cost
+        follows the number of new candles rather than the length of the stored series. The first call
+        after training starts right after the training window.
+        """
+        meta = self.kline_service.get_kline_meta(crypto_name)
+        model_payload = self.load_model(meta["symbol"], meta["interval"])
+        state_path = self._online_state_path(meta["symbol"], meta["interval"])
+
+        with file_lock(state_path):
+            stats = self._load_online_stats(state_path, model_payload)
+            if stats.last_open_time is not None:
+                start = stats.last_open_time + 1
+            elif model_payload.get("training_range"):
+                start = to_epoch_ms(model_payload["training_range"]["end"]) + 1
+            else:
+                start = int(self.kline_service.tail(crypto_name, 1).open_time[0])
+
+            feature_specs = self._payload_feature_specs(model_payload)
+            dataset = self._load_dataframe(crypto_name, start, None, feature_specs)
+            frame = dataset["frame"]
+            rows = self._select_feature_rows(frame, meta["interval"], feature_specs, start, require_future_return=False)
+            new_rows = int(np.count_nonzero(rows["valid"]))
+
+            if new_rows:
+                X = self.column_matrix(rows["columns"], model_payload["feature_columns"], mask=rows["valid"])
+                with self.profiler.stage("model.predict"):
+                    X_scaled = model_payload["scaler"].transform(X)
+                    distances = model_payload["model"].transform(X_scaled)
+                labels = distances.argmin(axis=1)
+                stats.update(X_scaled, labels, distances[np.arange(len(labels)), labels], rows["open_time"][rows["valid"]])
+
+                latest = frame.loc[rows["valid"]].iloc[-1]
+                cluster = int(labels[-1])
+                stats.latest = {
+                    "timestamp": latest["open_time"].isoformat(),
+                    "close": float(latest["close"]),
+                    "cluster": cluster,
+                    "state": model_payload.get("cluster_labels", {}).get(cluster, "Unknown"),
+                }
+                atomic_write_json(state_path, stats.to_dict())
+
+        report = stats.report()
+        cluster_labels = model_payload.get("cluster_labels", {})
+        state_counts: Dict[str, int] = {}
+        for cluster, count in report["cluster_counts"].items():
+            label = cluster_labels.get(cluster, "Unknown")
+            state_counts[label] = state_counts.get(label, 0) + count
+
+        return {
+            "symbol": meta["symbol"],
+            "interval": meta["interval"],
+            "new_candles": new_rows,
+            "latest_state": stats.latest,
+            "state_distribution": state_counts,
+            "drift": report,
+            "state_path": str(state_path),
+        }
+
+    def check_drift(self, crypto_name: str) -> Dict[str, Any]:
+        """Update the online statistics and report whether the clustering model should be retrained."""
+        meta = self.kline_service.get_kline_meta(crypto_name)
+        if not self._model_path(meta["symbol"], meta["interval"]).exists():
+            return {"retrain": True, "reasons": ["no trained model"]}
+        online = self.update_online_state(crypto_name)
+        return {"retrain": online["drift"]["drifted"], "reasons": online["drift"]["reasons"], "online": online}
@@ -0,0 +1,131 @@
+import cProfile
+import logging
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+from decorator.singleton import singleton
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def peak_rss_mb() -> Optional[float]:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS reports bytes.
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+class _NullStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    __slots__ = ("profiler", "name", "start", "rss_before")
+
+    def __init__(self, profiler: "ProfilerService", name: str):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.rss_before = peak_rss_mb()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        rss_after = peak_rss_mb()
+        self.profiler._record(self.name, elapsed, self.rss_before, rss_after)
+        return False
+
+
+@singleton
+class ProfilerService:
+    """Stage timers, counters and peak-RSS sampling; a no-op until enabled."""
+
+    def __init__(self):
+        self.enabled = False
+        self.logger = logging.getLogger(__name__)
+        self._stages: Dict[str, Dict[str, Any]] = {}
+        self._counters: Dict[str, int] = {}
+        self._cprofile: Optional[cProfile.Profile] = None
+        self._started_at = 0.0
+
+    def enable(self, cprofile: bool = False) -> "ProfilerService":
+        self.enabled = True
+        self._started_at = time.perf_counter()
+        if cprofile:
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+        return self
+
+    def stage(self, name: str):
+        if not self.enabled:
+            return _NULL_STAGE
+        return _Stage(self, name)
+
+    def count(self, name: str, value: int = 1) -> None:
+        if self.enabled:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def _record(self, name: str, elapsed: float, rss_before: Optional[float], rss_after: Optional[float]) -> None:
+        stats = self._stages.setdefault(name, {"calls": 0, "total": 0.0, "max": 0.0, "peak_rss_mb": None, "rss_growth_mb": 0.0})
+        stats["calls"] += 1
+        stats["total"] += elapsed
+        stats["max"] = max(stats["max"], elapsed)
+        if rss_after is not None:
+            stats["peak_rss_mb"] = max(stats["peak_rss_mb"] or 0.0, rss_after)
+            stats["rss_growth_mb"] += rss_after - rss_before
+
+    def report(self) -> Dict[str, Any]:
+        wall = time.perf_counter() - self._started_at if self.enabled else 0.0
+        stages: List[Dict[str, Any]] = [
+            {"stage": name, **stats, "mean": stats["total"] / stats["calls"]} for name, stats in sorted(self._stages.items(), key=lambda item: item[1]["total"], reverse=True)
+        ]
+        return {"wall_time": wall, "peak_rss_mb": peak_rss_mb(), "stages": stages, "counters": dict(self._counters)}
+
+    def finish(self, stats_path: Optional[str] = None) -> Dict[str, Any]:
+        """Stop collection, log the per-stage breakdown and optionally dump cProfile stats (pstats format)."""
+        if self._cprofile is not None:
+            self._cprofile.disable()
+            if stats_path:
+                self._cprofile.dump_stats(stats_path)
+
+        report = self.report()
+        self.logger.info("Profile (wall %.3fs, peak RSS %s MB)", report["wall_time"], _fmt(report["peak_rss_mb"]))
+        self.logger.info("  %-32s %6s %10s %10s %10s %12s", "stage", "calls", "total s", "mean s", "max s", "RSS +MB")
+        for stage in report["stages"]:
+            self.logger.info(
+                "  %-32s %6d %10.4f %10.4f %10.4f %12s",
+                stage["stage"],
+                stage["calls"],
+                stage["total"],
+                stage["mean"],
+                stage["max"],
+                _fmt(stage["rss_growth_mb"] if stage["peak_rss_mb"] is not None else None),
+            )
+        for name, value in sorted(report["counters"].items()):
+            self.logger.info("  counter %-24s %d", name, value)
+        if stats_path and self._cprofile is not None:
+            self.logger.info("cProfile stats written to %s (open with snakeviz, flameprof or pstats)", stats_path)
+
+        self.enabled = False
+        self._cprofile = None
+        return report
+
+
+def _fmt(value: Optional[float]) -> str:
+    return "n/a" if value is None else f"{value:,.1f}"
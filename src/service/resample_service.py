@@ -0,0 +1,175 @@
+import logging
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from decorator.singleton import singleton
+from service.intervals import RESAMPLE_INTERVALS, interval_to_ms
+from service.kline_array import KlineArray
+from service.kline_service import KlineService
+
+# Column positions inside a Binance kline row.
+OPEN_TIME, OPEN, HIGH, LOW, CLOSE, VOLUME, CLOSE_TIME, QUOTE_VOLUME, TRADES, TAKER_BASE, TAKER_QUOTE = range(11)
+SUM_COLUMNS = [VOLUME, QUOTE_VOLUME, TRADES, TAKER_BASE, TAKER_QUOTE]
+
+
+class ResampleError(Exception):
+    """Raised when klines cannot be resampled to the requested interval."""
+
+
+@singleton
+class ResampleService:
+    """Derive higher-interval candles from finer stored klines."""
+
+    def __init__(self):
+        self.data_dir = Path("data/kline")
+        self.kline_service = KlineService()
+        self.logger = logging.getLogger(__name__)
+        self.chunk_size = 200_000
+
+    @staticmethod
+    def _check_intervals(source_interval: str, target_interval: str) -> int:
+        if target_interval not in RESAMPLE_INTERVALS:
+            raise ResampleError(f"Cannot resample to {target_interval}; supported targets: {', '.join(RESAMPLE_INTERVALS)}")
+        source_ms = interval_to_ms(source_interval)
+        target_ms = interval_to_ms(target_interval)
+        if target_ms <= source_ms or target_ms % source_ms != 0:
+            raise ResampleError(f"Interval {target_interval} is not a multiple of {source_interval}")
+        return target_ms // source_ms
+
+    @staticmethod
+    def _to_matrix(rows: List[List[Any]]) -> np.ndarray:
+        return np.asarray([row[:11] for row in rows], dtype=object).astype(np.float64).reshape(-1, 11)
+
+    @staticmethod
+    def aggregate(matrix: np.ndarray, target_ms: int) -> Dict[str, np.ndarray]:
+        """Aggregate a sorted (n, 11) kline matrix into target-interval buckets."""
+        open_time = matrix[:, OPEN_TIME].astype(np.int64)
+        bucket = open_time - open_time % target_ms
+        starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+        ends = np.r_[starts[1:], len(bucket)] - 1
+
+        out = np.empty((len(starts), 11), dtype=np.float64)
+        out[:, OPEN_TIME] = bucket[starts]
+        out[:, OPEN] = matrix[starts, OPEN]
+        out[:, HIGH] = np.maximum.reduceat(matrix[:, HIGH], starts)
+        out[:, LOW] = np.minimum.reduceat(matrix[:, LOW], starts)
+        out[:, CLOSE] = matrix[ends, CLOSE]
+        out[:, CLOSE_TIME] = bucket[starts] + target_ms - 1
+        out[:, SUM_COLUMNS] = np.add.reduceat(matrix[:, SUM_COLUMNS], starts, axis=0)
+        return {"matrix": out, "counts": np.diff(np.r_[starts, len(bucket)])}
+
+    def iter_resampled(
+        self,
+        klines: List[List[Any]],
+        source_interval: str,
+        target_interval: str,
+        include_partial: bool = False,
+        chunk_size: Optional[int] = None,
+    ) -> Iterator[np.ndarray]:
+        """Yield aggregated (m, 11) matrices chunk by chunk.
+
+        The last bucket of every chunk is carried into the next one so buckets that straddle
+        a chunk boundary are aggregated once. The final bucket is dropped unless it is complete
+        or ``include_partial`` is set.
+        """
+        expected = self._check_intervals(source_interval, target_interval)
+        target_ms = interval_to_ms(target_interval)
+        chunk_size = chunk_size or self.chunk_size
+        carry = np.empty((0, 11), dtype=np.float64)
+        incomplete = 0
+
+        for offset in range(0, len(klines), chunk_size):
+            matrix = self._to_matrix(klines[offset : offset + chunk_size])
+            if len(carry):
+                matrix = np.concatenate([carry, matrix])
+            result = self.aggregate(matrix, target_ms)
+            last_start = len(matrix) - result["counts"][-1]
+            carry = matrix[last_start:]
+            incomplete += int(np.count_nonzero(result["counts"][:-1] != expected))
+            if len(result["matrix"]) > 1:
+                yield result["matrix"][:-1]
+
+        if len(carry):
+            result = self.aggregate(carry, target_ms)
+            if include_partial or result["counts"][-1] == expected:
+                yield result["matrix"]
+
+        if incomplete:
+            self.logger.warning(f"{incomplete} {target_interval} buckets were built from incomplete {source_interval} data")
+
+    def resample_klines(
+        self,
+        klines: List[List[Any]],
+        source_interval: str,
+        target_interval: str,
+        include_partial: bool = False,
+    ) -> List[List[Any]]:
+        rows: List[List[Any]] = []
+        for matrix in self.iter_resampled(klines, source_interval, target_interval, include_partial):
+            rows.extend(KlineArray.from_matrix(matrix).to_rows())
+        return rows
+
+    def resample_frame(self, frame: pd.DataFrame, source_interval: str, target_interval: str) -> pd.DataFrame:
+        """Resample a frame built by ``MarketStateService._load_dataframe``; partial trailing buckets are dropped."""
+        self._check_intervals(source_interval, target_interval)
+        target_ms = interval_to_ms(target_interval)
+        expected = target_ms // interval_to_ms(source_interval)
+
+        matrix = np.zeros((len(frame), 11), dtype=np.float64)
+        matrix[:, OPEN_TIME] = frame["open_time"].to_numpy("datetime64[ms]").astype(np.int64)
+        for position, column in [
+            (OPEN, "open"),
+            (HIGH, "high"),
+            (LOW, "low"),
+            (CLOSE, "close"),
+            (VOLUME, "volume"),
+            (QUOTE_VOLUME, "quote_asset_volume"),
+            (TRADES, "trade_count"),
+            (TAKER_BASE, "taker_buy_base"),
+            (TAKER_QUOTE, "taker_buy_quote"),
+        ]:
+            matrix[:, position] = frame[column].to_numpy(dtype=np.float64)
+
+        if not len(matrix):
+            return pd.DataFrame(columns=["open_time", "close_time", "open", "high", "low", "close", "volume"])
+
+        result = self.aggregate(matrix, target_ms)
+        out = result["matrix"]
+        if result["counts"][-1] != expected:
+            out = out[:-1]
+
+        return pd.DataFrame(
+            {
+                "open_time": pd.to_datetime(out[:, OPEN_TIME].astype(np.int64), unit="ms"),
+                "close_time": pd.to_datetime(out[:, CLOSE_TIME].astype(np.int64), unit="ms"),
+                "open": out[:, OPEN],
+                "high": out[:, HIGH],
+                "low": out[:, LOW],
+                "close": out[:, CLOSE],
+                "volume": out[:, VOLUME],
+            }
+        )
+
+    def resample_crypto(self, crypto_name: str, target_interval: str, include_partial: bool = False) -> Dict[str, Any]:
+        data = self.kline_service.get_kline_data(crypto_name)
+        klines = self.resample_klines(data["klines"], data["interval"], target_interval, include_partial)
+
+        result = {
+            "symbol": data["symbol"],
+            "interval": target_interval,
+            "limit": len(klines),
+            "days_ago": data.get("days_ago"),
+            "timestamp": datetime.now().isoformat(),
+            "source": {"crypto": crypto_name.lower(), "interval": data["interval"], "klines": len(data["klines"])},
+            "klines": klines,
+        }
+
+        self.data_dir.mkdir(parents=True, exist_ok=True)
+        filepath = self.kline_service.save_kline_data(f"{crypto_name.lower()}_{target_interval}", result)
+
+        self.logger.info(f"Resampled {len(data['klines'])} {data['interval']} klines into {len(klines)} {target_interval} klines: {filepath}")
+        return {**result, "path": str(filepath)}
@@ -1,8 +1,11 @@
 import requests
 import json
 import logging
-from typing import Optional, Dict, Any, Union
+from typing import Callable, Optional, Dict, Any, Union
+from requests.structures import CaseInsensitiveDict
 from decorator.singleton import singleton
+from service.http_cache import CacheMissError, ResponseCache
+from service.profiler_service import ProfilerService
 
 
 @singleton
@@ -10,6 +13,12 @@ class RestfulService:
     def __init__(self):
         self.default_timeout = 30
         self.logger = logging.getLogger(__name__)
+        self.profiler = ProfilerService()
+        self.cache = ResponseCache()
+
+    def configure_cache(self, mode: str = "on", max_bytes: Optional[int] = None, cache_dir: Optional[str] = None):
+        self.cache = ResponseCache(cache_dir or str(self.cache.cache_dir), max_bytes or self.cache.max_bytes, mode)
+        return self
 
     def set_default_timeout(self, timeout: int):
         self.default_timeout = timeout
@@ -37,16 +46,18 @@ class RestfulService:
         try:
             self.logger.info(f"Making {method} request to {url}")
 
-            if method.upper() == "GET":
-                response = requests.get(url, timeout=timeout, headers=headers)
-            elif method.upper() == "POST":
-                response = requests.post(url, data=payload, timeout=timeout, headers=headers)
-            elif method.upper() == "PUT":
-                response = requests.put(url, data=payload, timeout=timeout, headers=headers)
-            elif method.upper() == "DELETE":
-                response = requests.delete(url, timeout=timeout, headers=headers)
-            else:
-                raise ValueError(f"Unsupported HTTP method: {method}")
+            with self.profiler.stage("http.request"):
+                if method.upper() == "GET":
+                    response = requests.get(url, timeout=timeout, headers=headers)
+                elif method.upper() == "POST":
+                    response = requests.post(url, data=payload, timeout=timeout, headers=headers)
+                elif method.upper() == "PUT":
+                    response = requests.put(url, data=payload, timeout=timeout, headers=headers)
+                elif method.upper() == "DELETE":
+                    response = requests.delete(url, timeout=timeout, headers=headers)
+                else:
+                    raise ValueError(f"Unsupported HTTP method: {method}")
+            self.profiler.count("http.requests")
 
             self.logger.info(f"Response status: {response.status_code}")
             return response
@@ -63,8 +74,41 @@ class RestfulService:
         url: str,
         timeout: Optional[int] = None,
         headers: Optional[Dict[str, str]] = None,
+        cache_ttl: Union[float, Callable[[requests.Response], float], None] = None,
     ) -> requests.Response:
-        return self._make_request("GET", url, timeout=timeout, headers=headers)
+        """GET ``url``; with ``cache_ttl`` (seconds, or ``http_cache.FOREVER``) a 200 response is cached that long.
+
+        ``None`` or ``0`` bypasses the cache. A callable receives the fresh response and returns the TTL,
+        for requests whose cacheability depends on the content.
+        """
+        if not cache_ttl:
+            if self.cache.mode == "replay":
+                raise CacheMissError(f"Replay mode: {url} is not cacheable")
+            return self._make_request("GET", url, timeout=timeout, headers=headers)
+
+        cached = self.cache.get("GET", url)
+        if cached is not None:
+            self.profiler.count("http.cache_hits")
+            self.logger.info(f"Cache hit for {url}")
+            return self._cached_response(cached)
+        if self.cache.mode == "replay":
+            raise CacheMissError(f"Replay mode: no recorded response for {url}")
+
+        response = self._make_request("GET", url, timeout=timeout, headers=headers)
+        if response.status_code == 200:
+            ttl = cache_ttl(response) if callable(cache_ttl) else cache_ttl
+            self.cache.put("GET", url, response.status_code, dict(response.headers), response.content, ttl)
+        return response
+
+    @staticmethod
+    def _cached_response(cached: Dict[str, Any]) -> requests.Response:
+        response = requests.Response()
+        response.status_code = cached["status"]
+        response.headers = CaseInsensitiveDict(cached["headers"])
+        response.url = cached["url"]
+        response._content = cached["body"]
+        response.encoding = "utf-8"
+        return response
 
     def post(
         self,
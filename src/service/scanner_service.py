@@ -0,0 +1,306 @@
+import json
+import logging
+import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from service.feature_batch_service import FeatureBatchService
+from service.file_store import atomic_replace, file_lock
+from service.kline_service import KlineService
+from service.market_state_service import MarketModelNotFoundError, MarketStateService
+from service.profiler_service import ProfilerService
+
+DEFAULT_WINDOW = 96
+DEFAULT_SCAN_DIR = "data/scanner"
+# State codes in the breadth matrix; NaN marks candles a symbol has no state for.
+STATE_CODES = {"Bullish": 1.0, "Bearish": -1.0}
+# Stored arrays indexed by correlation snapshot; the others have one entry per candle.
+SNAPSHOT_FIELDS = ("correlation_time", "mean_correlation")
+# Batched correlation blocks hold about this many (time, symbol, symbol) elements per array.
+CORRELATION_BLOCK_ELEMENTS = 4_000_000
+
+
+class ScannerError(Exception):
+    """Raised when the cross-symbol scan cannot be computed."""
+
+
+def _symbol_states(task: Dict[str, Any]) -> Dict[str, Any]:
+    """Worker: one symbol's per-candle states as open times and state codes."""
+    result = MarketStateService().assign_states(task["crypto"], task["start"])
+    codes = np.array([STATE_CODES.get(state, 0.0) for state in result["state"]], dtype=np.float64)
+    return {"crypto": task["crypto"], "open_time": result["open_time"], "codes": codes}
+
+
+class ScannerService:
+    """Cross-symbol view of the stored universe: rolling return correlations and market-state breadth.
+
+    Log returns of every symbol are aligned on one time grid. Correlation matrices over the trailing
+    ``window`` candles are computed in batched matrix products at every ``step``-th candle (aligned to
+    the epoch) and at the latest candle, and reduced to the mean pairwise correlation. Breadth is the
+    share of symbols whose KMeans state is Bullish or Bearish at each candle. Results are kept in
+    ``<scan_dir>/<interval>.npz``; later runs only compute the candles added since, and start over when
+    the universe, window, step or any model changes.
+    """
+
+    def __init__(self, scan_dir: str = DEFAULT_SCAN_DIR):
+        self.kline_service = KlineService()
+        self.state_service = MarketStateService()
+        self.batch_service = FeatureBatchService()
+        self.profiler = ProfilerService()
+        self.logger = logging.getLogger(__name__)
+        self.scan_dir = Path(scan_dir)
+
+    def resolve_universe(self, cryptos: Optional[List[str]] = None, interval: Optional[str] = None) -> Dict[str, Any]:
+        """Symbols to scan: ``cryptos`` (default: every stored dataset) limited to one interval.
+
+        Without ``interval`` the most common interval among them is used and the others are skipped.
+        """
+        names = [crypto.lower() for crypto in (cryptos or self.kline_service.list_available_cryptos())]
+        intervals = {crypto: self.kline_service.get_interval(crypto) for crypto in names}
+        if not intervals:
+            raise ScannerError("No datasets to scan; fetch some with the dataset command first")
+        interval = interval or Counter(intervals.values()).most_common(1)[0][0]
+        selected = [crypto for crypto in names if intervals[crypto] == interval]
+        skipped = sorted(crypto.upper() for crypto in names if intervals[crypto] != interval)
+        if skipped:
+            self.logger.warning(f"Skipping {len(skipped)} datasets not on {interval}: {', '.join(skipped)}")
+        if len(selected) < 2:
+            raise ScannerError(f"Need at least two {interval} datasets to scan, found {len(selected)}")
+        return {"cryptos": selected, "interval": interval}
+
+    def _model_versions(self, cryptos: List[str], interval: str) -> Dict[str, Optional[str]]:
+        versions = {}
+        for crypto in cryptos:
+            try:
+                versions[crypto] = self.state_service.load_model(self.kline_service.get_symbol(crypto), interval)["trained_at"]
+            except MarketModelNotFoundError:
+                versions[crypto] = None
+        return versions
+
+    def _scan_path(self, interval: str) -> Path:
+        return self.scan_dir / f"{interval}.npz"
+
+    def _load_scan(self, path: Path, signature: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        if not path.exists():
+            return None
+        with np.load(path, allow_pickle=False) as stored:
+            scan = {name: stored[name] for name in stored.files}
+        meta = json.loads(str(scan.pop("meta")))
+        if meta["signature"] != signature:
+            self.logger.info("Universe, window or models changed since the last scan; rescanning from the start")
+            return None
+        scan["meta"] = meta
+        return scan
+
+    def _save_scan(self, path: Path, scan: Dict[str, Any]) -> None:
+        arrays = {name: value for name, value in scan.items() if name != "meta"}
+        arrays["meta"] = np.array(json.dumps(scan["meta"]))
+
+        def write(tmp_name: str) -> None:
+            # Pass a file object: given a name without ".npz", NumPy would append the suffix.
+            with open(tmp_name, "wb") as f:
+                np.savez(f, **arrays)
+
+        atomic_replace(path, write)
+
+    def _close_matrix(self, cryptos: List[str], grid: Dict[str, Any]) -> np.ndarray:
+        """``(time, symbol)`` closes on the grid; NaN where a symbol has no candle."""
+        closes = np.full((grid["rows"], len(cryptos)), np.nan)
+        for index, crypto in enumerate(cryptos):
+            klines = self.kline_service.get_kline_array(crypto, grid["origin"])
+            offsets = klines.open_time.astype(np.int64) - grid["origin"]
+            rows = offsets // grid["interval_ms"]
+            aligned = (offsets % grid["interval_ms"] == 0) & (rows < grid["rows"])
+            closes[rows[aligned], index] = klines.close[aligned]
+        return closes
+
+    def _state_matrix(self, cryptos: List[str], versions: Dict[str, Optional[str]], open_time: np.ndarray, interval_ms: int, workers: Optional[int]) -> np.ndarray:
+        """``(time, symbol)`` state codes for the candles in ``open_time``; NaN for symbols without a model."""
+        codes = np.full((len(open_time), len(cryptos)), np.nan)
+        tasks = [{"crypto": crypto, "start": int(open_time[0])} for crypto in cryptos if versions[crypto] is not None]
+        workers = min(len(tasks), workers or os.cpu_count() or 1)
+        if workers <= 1:
+            results = [_symbol_states(task) for task in tasks]
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                results = list(pool.map(_symbol_states, tasks))
+
+        for result in results:
+            offsets = result["open_time"] - open_time[0]
+            rows = offsets // interval_ms
+            aligned = (offsets % interval_ms == 0) & (rows < len(open_time))
+            codes[rows[aligned], cryptos.index(result["crypto"])] = result["codes"][aligned]
+        return codes
+
+    @staticmethod
+    def correlation_blocks(returns: np.ndarray, ends: np.ndarray, window: int, min_periods: int) -> Iterator[np.ndarray]:
+        """Correlation matrices of the ``window`` rows of ``returns`` (time, symbol) ending at each row in ``ends``.
+
+        Yields them a block at a time, shaped ``(block, symbol, symbol)``, so long histories never hold every
+        matrix at once. Pairs use the rows where both symbols have a return; pairs with fewer than
+        ``min_periods`` of them are NaN. Each block is computed with batched matrix products.
+        """
+        symbols = returns.shape[1]
+        padded = np.concatenate([np.full((window - 1, symbols), np.nan), returns])
+        windows = sliding_window_view(padded, window, axis=0)  # (time, symbol, window), a view
+        block_size = max(1, CORRELATION_BLOCK_ELEMENTS // (symbols * max(symbols, window)))
+
+        for lo in range(0, len(ends), block_size):
+            block = windows[ends[lo : lo + block_size]]
+            present = ~np.isnan(block)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                if present.all():
+                    centered = block - block.mean(axis=2, keepdims=True)
+                    scaled = centered / np.sqrt((centered**2).sum(axis=2, keepdims=True))
+                    corr = scaled @ scaled.transpose(0, 2, 1)
+                else:
+                    mask = present.astype(np.float64)
+                    values = np.where(present, block, 0.0)
+                    mask_t = mask.transpose(0, 2, 1)
+                    counts = mask @ mask_t
+                    sums = values @ mask_t  # sums[i, j]: sum of x_i over rows where j is present too
+                    squares = (values**2) @ mask_t
+                    products = values @ values.transpose(0, 2, 1)
+                    covariance = counts * products - sums * sums.transpose(0, 2, 1)
+                    variance = counts * squares - sums**2
+                    corr = covariance / np.sqrt(variance * variance.transpose(0, 2, 1))
+                    corr[counts < min_periods] = np.nan
+            yield np.clip(corr, -1.0, 1.0, out=corr)
+
+    @staticmethod
+    def mean_pairwise(matrices: np.ndarray) -> np.ndarray:
+        """Mean off-diagonal correlation of each matrix, ignoring NaN pairs."""
+        valid = ~np.isnan(matrices)
+        diagonal = np.diagonal(valid, axis1=1, axis2=2)
+        counts = valid.sum(axis=(1, 2)) - diagonal.sum(axis=1)
+        totals = np.where(valid, matrices, 0.0).sum(axis=(1, 2)) - np.where(diagonal, np.diagonal(matrices, axis1=1, axis2=2), 0.0).sum(axis=1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(counts > 0, totals / counts, np.nan)
+
+    @staticmethod
+    def top_pairs(matrix: np.ndarray, cryptos: List[str], count: int) -> Dict[str, List[Dict[str, Any]]]:
+        """The ``count`` most and least correlated symbol pairs of one matrix."""
+        upper = np.triu_indices(len(cryptos), k=1)
+        values = matrix[upper]
+        valid = np.flatnonzero(~np.isnan(values))
+        ordered = valid[np.argsort(values[valid], kind="stable")]
+
+        def describe(positions: np.ndarray) -> List[Dict[str, Any]]:
+            return [{"pair": [cryptos[upper[0][p]].upper(), cryptos[upper[1][p]].upper()], "correlation": float(values[p])} for p in positions]
+
+        return {"most": describe(ordered[::-1][:count]), "least": describe(ordered[:count])}
+
+    def scan(
+        self,
+        cryptos: Optional[List[str]] = None,
+        interval: Optional[str] = None,
+        window: int = DEFAULT_WINDOW,
+        step: Optional[int] = None,
+        workers: Optional[int] = None,
+        rebuild: bool = False,
+        top: int = 5,
+    ) -> Dict[str, Any]:
+        """Bring the stored scan up to date with the datasets and summarize its latest candle."""
+        if window < 3:
+            raise ScannerError("The correlation window must span at least 3 candles")
+        step = step or window
+        universe = self.resolve_universe(cryptos, interval)
+        cryptos, interval = universe["cryptos"], universe["interval"]
+        versions = self._model_versions(cryptos, interval)
+        signature = {"cryptos": cryptos, "interval": interval, "window": window, "step": step, "models": versions}
+        path = self._scan_path(interval)
+
+        with file_lock(path):
+            bounds = {crypto: self.kline_service.get_open_time_bounds(crypto) for crypto in cryptos}
+            last_open_time = {crypto: bounds[crypto][1] if bounds[crypto] else None for crypto in cryptos}
+            previous = None if rebuild else self._load_scan(path, signature)
+            grid = self.batch_service.time_grid(cryptos)
+            resume = grid["origin"] - 1
+            if previous is not None:
+                # Candles after the earliest previous end among symbols that have grown since are recomputed, so a
+                # symbol that lagged at the last scan is counted once its candles arrive.
+                seen = previous["meta"]["last_open_time"]
+                grown = [seen.get(crypto) for crypto in cryptos if last_open_time[crypto] != seen.get(crypto)]
+                if not grown:
+                    resume = int(previous["open_time"][-1])
+                elif None not in grown:
+                    resume = min(grown)
+                # Reload one window before that so the recomputed windows have their full history.
+                grid = self.batch_service.time_grid(cryptos, max(grid["origin"], resume - window * grid["interval_ms"]))
+            open_time = grid["origin"] + np.arange(grid["rows"], dtype=np.int64) * grid["interval_ms"]
+            new = open_time > resume
+            recomputed = int(new.sum())
+
+            if recomputed:
+                with self.profiler.stage("scanner.returns"):
+                    closes = self._close_matrix(cryptos, grid)
+                    returns = np.full_like(closes, np.nan)
+                    with np.errstate(invalid="ignore", divide="ignore"):
+                        returns[1:] = np.log(closes[1:] / closes[:-1])
+
+                with self.profiler.stage("scanner.states"):
+                    codes = self._state_matrix(cryptos, versions, open_time[new], grid["interval_ms"], workers)
+                covered = (~np.isnan(codes)).sum(axis=1)
+                with np.errstate(invalid="ignore"):
+                    bullish = np.where(covered > 0, (codes == 1.0).sum(axis=1) / covered, np.nan)
+                    bearish = np.where(covered > 0, (codes == -1.0).sum(axis=1) / covered, np.nan)
+
+                with self.profiler.stage("scanner.correlation"):
+                    ends = np.flatnonzero(new & ((open_time // grid["interval_ms"]) % step == 0))
+                    min_periods = max(3, window // 2)
+                    mean_correlation = np.concatenate([np.empty(0)] + [self.mean_pairwise(block) for block in self.correlation_blocks(returns, ends, window, min_periods)])
+                    latest_matrix = next(self.correlation_blocks(returns, np.array([grid["rows"] - 1]), window, min_periods))[0]
+
+                scan = {
+                    "open_time": open_time[new],
+                    "bullish": bullish,
+                    "bearish": bearish,
+                    "covered": covered,
+                    "correlation_time": open_time[ends],
+                    "mean_correlation": mean_correlation,
+                }
+                if previous is not None:
+                    kept_rows = previous["open_time"] <= resume
+                    kept_snapshots = previous["correlation_time"] <= resume
+                    scan = {name: np.concatenate([previous[name][kept_snapshots if name in SNAPSHOT_FIELDS else kept_rows], values]) for name, values in scan.items()}
+                scan["latest_correlation"] = latest_matrix
+                scan["meta"] = {"signature": signature, "last_open_time": last_open_time, "updated_at": datetime.now().isoformat()}
+                self._save_scan(path, scan)
+            else:
+                scan = previous
+
+        latest_matrix = scan["latest_correlation"]
+        with_models = sum(1 for version in versions.values() if version is not None)
+        if with_models < len(cryptos):
+            self.logger.warning(f"{len(cryptos) - with_models} of {len(cryptos)} symbols have no trained model and are left out of the breadth")
+        added = len(scan["open_time"]) - (len(previous["open_time"]) if previous is not None else 0)
+        self.logger.info(f"Scanned {len(cryptos)} {interval} symbols: {added:,} new candles ({recomputed:,} computed), {len(scan['open_time']):,} in the scan")
+        return {
+            "interval": interval,
+            "symbols": [crypto.upper() for crypto in cryptos],
+            "window": window,
+            "step": step,
+            "added": added,
+            "recomputed": recomputed,
+            "incremental": previous is not None,
+            "rows": len(scan["open_time"]),
+            "latest": {
+                "open_time": datetime.utcfromtimestamp(int(scan["open_time"][-1]) / 1000).isoformat(),
+                "bullish_share": float(scan["bullish"][-1]),
+                "bearish_share": float(scan["bearish"][-1]),
+                "covered": int(scan["covered"][-1]),
+                "mean_correlation": float(self.mean_pairwise(latest_matrix[np.newaxis])[0]),
+            },
+            "mean_correlation_history": {
+                "open_time": scan["correlation_time"],
+                "value": scan["mean_correlation"],
+            },
+            "pairs": self.top_pairs(latest_matrix, cryptos, top),
+            "scan_path": str(path),
+        }
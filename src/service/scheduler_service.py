@@ -0,0 +1,260 @@
+import logging
+import multiprocessing
+import os
+import signal
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from service.binance_service import BinanceService
+from service.gap_service import GapService
+from service.intervals import INTERVAL_MS
+from service.kline_service import KlineService
+from service.market_classifier_service import ClassifierModelNotFoundError, MarketClassifierService
+from service.market_state_service import MarketModelNotFoundError, MarketStateService
+
+# Binance finalizes a candle shortly after its close time; waking this much later avoids fetching it half-built.
+DEFAULT_SETTLE_SECONDS = 1.5
+DEFAULT_FETCH_WORKERS = 8
+
+# Services are created once per worker process so loaded models and datasets stay cached between ticks.
+_worker_services: Dict[str, Any] = {}
+
+
+class SchedulerError(Exception):
+    """Raised when the daemon cannot be configured."""
+
+
+def _now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+def _init_services() -> None:
+    if not _worker_services:
+        _worker_services["state"] = MarketStateService()
+        _worker_services["classifier"] = MarketClassifierService()
+
+
+def _init_pool_worker() -> None:
+    # Ctrl+C is handled by the scheduler, which shuts the pool down cleanly.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    _init_services()
+
+
+def _process_job(crypto_name: str, forecast: bool, calibrated: bool) -> Dict[str, Any]:
+    """Worker: fold the new candles into the online market state, then forecast the next state."""
+    _init_services()
+
+    result: Dict[str, Any] = {"crypto": crypto_name, "online": None, "forecast": None}
+    try:
+        result["online"] = _worker_services["state"].update_online_state(crypto_name)
+    except MarketModelNotFoundError:
+        pass
+    if forecast and result["online"] is not None:
+        try:
+            result["forecast"] = _worker_services["classifier"].forecast_next_state(crypto_name, calibrated)
+        except ClassifierModelNotFoundError:
+            pass
+    result["finished_at"] = time.time()
+    return result
+
+
+class SchedulerService:
+    """Long-running loop that wakes at each interval's candle close and refreshes every symbol due then.
+
+    Each wake-up fetches all due symbols in one threaded burst, appends the closed candles to the stored
+    datasets and hands each updated symbol to a persistent process pool for incremental online state and
+    forecasting. A symbol has at most one computation in flight: closes that arrive while it is still busy
+    are coalesced into its next run (which reads everything stored by then), and a scheduler that wakes
+    late skips straight to the latest close, so a slow tick delays work instead of queueing it.
+    """
+
+    def __init__(
+        self,
+        cryptos: List[str],
+        settle_seconds: float = DEFAULT_SETTLE_SECONDS,
+        fetch_workers: int = DEFAULT_FETCH_WORKERS,
+        workers: Optional[int] = None,
+        forecast: bool = True,
+        calibrated: bool = True,
+    ):
+        self.kline_service = KlineService()
+        self.binance_service = BinanceService()
+        self.gap_service = GapService()
+        self.logger = logging.getLogger(__name__)
+        self.settle_ms = int(settle_seconds * 1000)
+        self.fetch_workers = fetch_workers
+        self.forecast = forecast
+        self.calibrated = calibrated
+        self.jobs = self._build_jobs(cryptos)
+        self.workers = min(len(self.jobs), workers if workers is not None else os.cpu_count() or 1)
+        self.stop_event = threading.Event()
+        self.lock = threading.Lock()
+        self.fetch_pool: Optional[ThreadPoolExecutor] = None
+        self.pool: Optional[ProcessPoolExecutor] = None
+        self.inflight: Dict[str, Future] = {}
+        self.pending: Dict[str, int] = {}
+        self.stats: Dict[str, int] = {"ticks": 0, "fetched": 0, "processed": 0, "coalesced": 0, "late_wakeups": 0, "errors": 0}
+
+    def _build_jobs(self, cryptos: List[str]) -> List[Dict[str, Any]]:
+        jobs = []
+        for crypto in [crypto.lower() for crypto in cryptos]:
+            meta = self.kline_service.get_kline_meta(crypto)
+            if self.binance_service.crypto_name(meta["symbol"]) != crypto:
+                self.logger.warning(f"Skipping {crypto.upper()}: derived dataset; schedule its source and resample instead")
+                continue
+            if meta["interval"] not in INTERVAL_MS:
+                self.logger.warning(f"Skipping {crypto.upper()}: {meta['interval']} candles have no fixed close schedule")
+                continue
+            jobs.append({"crypto": crypto, "symbol": meta["symbol"], "interval": meta["interval"], "interval_ms": INTERVAL_MS[meta["interval"]]})
+        if not jobs:
+            raise SchedulerError("No schedulable datasets; fetch one with the dataset command first")
+        return jobs
+
+    def _next_due(self, job: Dict[str, Any], now_ms: int) -> int:
+        """Wake-up time for the next candle close after ``now_ms``."""
+        interval_ms = job["interval_ms"]
+        return ((now_ms - self.settle_ms) // interval_ms + 1) * interval_ms + self.settle_ms
+
+    def _sync(self, job: Dict[str, Any], now_ms: int) -> int:
+        """Fetch closed candles from the last stored one on and append them; returns how many are new."""
+        bounds = self.kline_service.get_open_time_bounds(job["crypto"])
+        start = bounds[1] if bounds else now_ms - 1000 * job["interval_ms"]
+        fetched = self.binance_service.fetch_klines_range(job["symbol"], job["interval"], start, now_ms)
+        closed = fetched[: int(np.searchsorted(fetched.close_time, now_ms))]
+        if not len(closed):
+            return 0
+        meta = self.kline_service.append_klines(job["crypto"], closed)
+        self.gap_service.extend_index(job["crypto"], meta, closed)
+        return len(closed) if bounds is None else int(np.count_nonzero(closed.open_time > bounds[1]))
+
+    def _fetch_burst(self, jobs: List[Dict[str, Any]], pool: ThreadPoolExecutor) -> Dict[str, int]:
+        now_ms = _now_ms()
+        futures = {job["crypto"]: pool.submit(self._sync, job, now_ms) for job in jobs}
+        added: Dict[str, int] = {}
+        for crypto, future in futures.items():
+            try:
+                added[crypto] = future.result()
+            except Exception as exc:
+                self._count("errors")
+                self.logger.error(f"Fetch failed for {crypto.upper()}: {exc}")
+        return added
+
+    def _count(self, key: str, amount: int = 1) -> None:
+        # Called from the main loop, fetch threads and executor callbacks alike.
+        with self.lock:
+            self.stats[key] += amount
+
+    def _submit(self, crypto: str, close_ms: int) -> None:
+        with self.lock:
+            running = self.inflight.get(crypto)
+            if running is not None and not running.done():
+                if crypto not in self.pending:
+                    self.logger.warning(f"{crypto.upper()} is still processing an earlier candle; the new close runs when it finishes")
+                self.stats["coalesced"] += 1
+                self.pending[crypto] = close_ms
+                return
+
+            if self.pool is None:
+                future: Future = Future()
+                try:
+                    future.set_result(_process_job(crypto, self.forecast, self.calibrated))
+                except Exception as exc:
+                    future.set_exception(exc)
+            else:
+                future = self.pool.submit(_process_job, crypto, self.forecast, self.calibrated)
+            self.inflight[crypto] = future
+        future.add_done_callback(lambda done: self._finished(done, crypto, close_ms))
+
+    def _finished(self, future: Future, crypto: str, close_ms: int) -> None:
+        self._report(future, crypto, close_ms)
+        with self.lock:
+            close_ms = self.pending.pop(crypto, None)
+        if close_ms is not None and not self.stop_event.is_set():
+            self._submit(crypto, close_ms)
+
+    def _report(self, future: Future, crypto: str, close_ms: int) -> None:
+        try:
+            result = future.result()
+        except Exception as exc:
+            self._count("errors")
+            self.logger.error(f"Processing failed for {crypto.upper()}: {exc}")
+            return
+
+        self._count("processed")
+        latency = result["finished_at"] - close_ms / 1000
+        online, forecast = result["online"], result["forecast"]
+        parts = [crypto.upper()]
+        if online is None:
+            parts.append("no market-state model")
+        elif online["latest_state"]:
+            parts.append(f"state={online['latest_state']['state']} close={online['latest_state']['close']:,.2f}")
+            if online["drift"]["drifted"]:
+                parts.append("DRIFT: " + "; ".join(online["drift"]["reasons"]))
+        if forecast is not None:
+            parts.append(f"next={forecast['predicted_state']} p={forecast['state_probabilities'].get(forecast['predicted_state'], 0.0):.2f}")
+        parts.append(f"latency={latency:.2f}s")
+        self.logger.info(" | ".join(parts))
+
+    def run_once(self, jobs: Optional[List[Dict[str, Any]]] = None) -> Dict[str, int]:
+        """Fetch ``jobs`` (default: all) now and process every symbol that received new candles."""
+        close_ms = _now_ms() - self.settle_ms
+        fetch_pool = self.fetch_pool or ThreadPoolExecutor(max_workers=self.fetch_workers)
+        try:
+            added = self._fetch_burst(jobs or self.jobs, fetch_pool)
+        finally:
+            if fetch_pool is not self.fetch_pool:
+                fetch_pool.shutdown()
+
+        self._count("ticks")
+        self._count("fetched", sum(added.values()))
+        for crypto, count in added.items():
+            if count:
+                self._submit(crypto, close_ms)
+        return added
+
+    def run(self, max_ticks: Optional[int] = None) -> Dict[str, int]:
+        """Catch up, then wake at every candle close until ``stop()``, Ctrl+C or ``max_ticks`` scheduled wake-ups."""
+        intervals = sorted({job["interval"] for job in self.jobs}, key=lambda interval: INTERVAL_MS[interval])
+        self.logger.info(f"Scheduling {len(self.jobs)} symbols ({', '.join(intervals)}) with {self.workers} worker(s); catching up first")
+
+        self.fetch_pool = ThreadPoolExecutor(max_workers=self.fetch_workers)
+        if self.workers > 1:
+            # Spawned rather than forked: the fetch threads already exist, and forking a threaded process is unsafe.
+            self.pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"), initializer=_init_pool_worker)
+        try:
+            self.run_once()
+            due = {job["crypto"]: self._next_due(job, _now_ms()) for job in self.jobs}
+            ticks = 0
+            while max_ticks is None or ticks < max_ticks:
+                if self.stop_event.wait(max(0.0, (min(due.values()) - _now_ms()) / 1000)):
+                    break
+
+                now_ms = _now_ms()
+                batch = [job for job in self.jobs if due[job["crypto"]] <= now_ms]
+                for job in batch:
+                    missed = (now_ms - due[job["crypto"]]) // job["interval_ms"]
+                    if missed:
+                        self._count("late_wakeups")
+                        self.logger.warning(f"{job['crypto'].upper()}: woke {missed} close(s) late; catching up in one fetch")
+                    due[job["crypto"]] = self._next_due(job, now_ms)
+                self.run_once(batch)
+                ticks += 1
+        except KeyboardInterrupt:
+            self.logger.info("Interrupted; finishing in-flight work")
+        finally:
+            self.stop_event.set()
+            self.fetch_pool.shutdown()
+            if self.pool is not None:
+                self.pool.shutdown(wait=True)
+            self.fetch_pool = self.pool = None
+        with self.lock:
+            stats = dict(self.stats)
+        self.logger.info(f"Daemon stopped: {', '.join(f'{key}={value}' for key, value in stats.items())}")
+        return stats
+
+    def stop(self) -> None:
+        self.stop_event.set()
@@ -0,0 +1,51 @@
+import os
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from service.feature_export_service import FeatureExportService  # noqa: E402
+from service.market_state_service import MarketStateService  # noqa: E402
+from service.synthetic_service import SyntheticKlineGenerator  # noqa: E402
+
+OBV_SPECS = [
+    {"name": "return", "indicator": "return"},
+    {"name": "volatility_7", "indicator": "volatility", "params": {"window": 7}},
+    {"name": "obv", "indicator": "obv"},
+]
+
+
+class FeatureExportTest(unittest.TestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.workspace = tempfile.TemporaryDirectory()
+        os.chdir(self.workspace.name)
+        SyntheticKlineGenerator().write_dataset(Path("data/kline/tst.json"), "TSTUSDT", 3000)
+        MarketStateService().train_model("tst", n_clusters=3, feature_specs=OBV_SPECS)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.workspace.cleanup()
+
+    def test_cumulative_export_matches_labeled_dataset(self):
+        result = FeatureExportService().export(["tst"], "data/features", shard_rows=1000)
+        self.assertGreater(result["symbols"][0]["shards"], 1)
+
+        exported = FeatureExportService().read("tst", "data/features")
+        labeled = MarketStateService().get_labeled_feature_dataset("tst")["frame"].reset_index(drop=True)
+
+        self.assertEqual(len(exported), len(labeled))
+        np.testing.assert_array_equal(exported["open_time"].to_numpy(), labeled["open_time"].to_numpy())
+        for name in ["close", "future_return_1"] + [spec["name"] for spec in OBV_SPECS]:
+            np.testing.assert_allclose(exported[name].to_numpy(), labeled[name].to_numpy(), rtol=1e-9, err_msg=name)
+        np.testing.assert_array_equal(exported["cluster"].to_numpy(), labeled["cluster"].to_numpy())
+        np.testing.assert_array_equal(exported["state"].to_numpy(), labeled["state"].to_numpy().astype(str))
+        np.testing.assert_array_equal(exported["next_state"].to_numpy()[:-1], labeled["state"].to_numpy()[1:].astype(str))
+
+
+if __name__ == "__main__":
+    unittest.main()